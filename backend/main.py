@@ -1,8 +1,12 @@
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 # Import routers
-from routers import auth, profile, match, company, docgen, upload
+from routers import auth, profile, match, company, docgen, upload, jobs
+from services.embedding_cache import get_cache_stats
+from services.model_registry import warm_up, get_registry_stats
+from services.job_queue import resume_pending_jobs
 
 app = FastAPI(
     title="Tendorix API", 
@@ -26,6 +30,20 @@ app.include_router(match.router, prefix="/api", tags=["Matching"])
 app.include_router(company.router, prefix="/api", tags=["Company"])
 app.include_router(docgen.router, prefix="/api/docgen", tags=["Document Generation"])
 app.include_router(upload.router, prefix="/api/upload", tags=["Upload & File Management"])
+app.include_router(jobs.router, prefix="/api", tags=["Jobs"])
+
+@app.on_event("startup")
+def warm_up_models():
+    # Off by default so workers that only serve auth/profile stay light
+    if os.getenv("EMBEDDING_WARMUP", "false").lower() in ("1", "true", "yes"):
+        warm_up()
+
+@app.on_event("startup")
+def resume_jobs():
+    # Pick up jobs a previous worker left queued or abandoned mid-run
+    resumed = resume_pending_jobs()
+    if resumed:
+        print(f"🧾 Resumed {resumed} pending job(s)")
 
 @app.get("/")
 def root():
@@ -37,4 +55,12 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/health/embeddings")
+def embedding_cache_stats():
+    return get_cache_stats()
+
+@app.get("/health/models")
+def model_registry_stats():
+    return get_registry_stats()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Encoder Parity Check
+Confirms the quantized ONNX backend makes the same similarity decisions as torch
+"""
+
+import sys
+import json
+from pathlib import Path
+
+# Add the backend directory to the Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from core.database import db
+from services.model_registry import check_backend_parity
+
+SAMPLE_TEXTS = [
+    "works", "similar works", "it services", "civil construction", "software development",
+    "maintenance of greenery", "electrical works", "pan card", "gst registration certificate",
+    "experience certificate", "iso 9001", "esi registration certificate", "epf registration certificate",
+    "labour license", "caste certificate", "emd", "tender title", "submission deadline", "emd amount"
+]
+
+
+def main():
+    tolerance = float(sys.argv[1]) if len(sys.argv) > 1 else 0.02
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    texts = list(SAMPLE_TEXTS)
+    for doc in db["category_vocabulary"].find({}, {"term": 1}).limit(limit):
+        if doc["term"] not in texts:
+            texts.append(doc["term"])
+
+    print(f"🔬 Comparing torch vs onnx-int8 on {len(texts)} texts (tolerance: {tolerance})")
+    report = check_backend_parity(texts, tolerance=tolerance)
+    print(json.dumps(report, indent=2))
+
+    if report["passed"]:
+        print("\n✅ Similarity decisions match the torch backend")
+    else:
+        print("\n❌ Decision mismatches beyond tolerance")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,10 @@ Runs the AI-powered tender matching process for all users
 
 import sys
 import os
+import multiprocessing
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
 
@@ -14,12 +18,27 @@ backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
 from core.database import db
-from services.basic_filter import filter_tenders
-from services.tender_matcher import compute_tender_match_score
-from services.eligibility_extractor import extract_eligibility_text_from_url
-from services.eligibility_parser import extract_eligibility_json_general
+from services.basic_filter import get_company_categories
+from services.match_pipeline import iter_tender_matches
+from services.category_vocabulary import rebuild_vocabulary
+from services.tender_index import tender_index
+from services.tender_inserter import backfill_deadline_dates
+from services.company_features import build_company_features
+from services.match_store import purge_legacy_matches
+from services.match_runs import (
+    create_run, get_run, prepare_run, work_on_run, reset_failed_units, release_dead_leases,
+    run_progress, finish_run, catalog_dir, latest_running_run, worker_name
+)
+from services.incremental_matcher import run_incremental_matching
+from services.layout_cache import layout_cache
+from services.eligibility_preprocessor import (
+    preprocess_tenders, eligibility_status_counts, reslice_cached_layouts,
+    ELIGIBILITY_CONCURRENCY, ELIGIBILITY_RETRIES, ELIGIBILITY_RATE_PER_MINUTE
+)
 import traceback
 
+MATCH_RUN_POLL_SECONDS = float(os.getenv("MATCH_RUN_POLL_SECONDS", "30"))
+
 def run_matching_for_user(user_id: str, threshold: float = 60.0) -> dict:
     """
     Run tender matching for a specific user
@@ -33,7 +52,6 @@ def run_matching_for_user(user_id: str, threshold: float = 60.0) -> dict:
     """
     try:
         companies = db["companies"]
-        tenders = db["filtered_tenders"]
         
         # Get user's company profile
         company = companies.find_one({"user_id": user_id})
@@ -46,83 +64,22 @@ def run_matching_for_user(user_id: str, threshold: float = 60.0) -> dict:
         
         print(f"🏢 Processing user: {user_id} - {company.get('companyDetails', {}).get('companyName', 'Unknown')}")
         
-        # Filter tenders based on company profile
-        filtered_tenders = filter_tenders(company)
-        print(f"📋 Found {len(filtered_tenders)} filtered tenders")
+        # Stream filtered tenders straight into eligibility scoring
+        stats = {}
+        matches = list(iter_tender_matches(company, threshold, id_field="tender_id", stats=stats, store=True))
+        print(f"📋 Found {stats['filtered']} filtered tenders")
         
-        if not filtered_tenders:
+        if not stats["filtered"]:
             return {
                 "success": True,
                 "user_id": user_id,
                 "company_name": company.get('companyDetails', {}).get('companyName', 'Unknown'),
                 "total_filtered": 0,
+                "total_matches": 0,
                 "matches": [],
                 "message": "No tenders match company profile"
             }
         
-        matches = []
-        processed = 0
-        
-        for tender in filtered_tenders:
-            try:
-                processed += 1
-                print(f"  Processing tender {processed}/{len(filtered_tenders)}: {tender.get('title', 'Unknown')}")
-                
-                form_url = tender.get("form_url")
-                if not form_url:
-                    continue
-                
-                # Extract eligibility if not already done
-                raw_eligibility = tender.get("raw_eligibility")
-                if not raw_eligibility:
-                    print(f"    Extracting eligibility from {form_url}")
-                    raw_eligibility = extract_eligibility_text_from_url(form_url)
-                    if raw_eligibility:
-                        tenders.update_one(
-                            {"_id": tender["_id"]},
-                            {"$set": {"raw_eligibility": raw_eligibility, "last_updated": datetime.utcnow()}}
-                        )
-                
-                # Parse structured eligibility if not already done
-                structured_eligibility = tender.get("structured_eligibility")
-                if not structured_eligibility and raw_eligibility:
-                    print(f"    Parsing structured eligibility")
-                    structured_eligibility = extract_eligibility_json_general(raw_eligibility)
-                    if structured_eligibility:
-                        tenders.update_one(
-                            {"_id": tender["_id"]},
-                            {"$set": {"structured_eligibility": structured_eligibility, "last_updated": datetime.utcnow()}}
-                        )
-                
-                # Compute matching score
-                if structured_eligibility:
-                    result = compute_tender_match_score(structured_eligibility, company)
-                    
-                    if result["matching_score"] >= threshold:
-                        match_data = {
-                            "tender_id": str(tender["_id"]),
-                            "title": tender.get("title"),
-                            "reference_number": tender.get("reference_number"),
-                            "location": tender.get("location"),
-                            "business_category": tender.get("business_category", []),
-                            "deadline": tender.get("deadline"),
-                            "form_url": form_url,
-                            "matching_score": result["matching_score"],
-                            "field_scores": result["field_scores"],
-                            "eligible": result["eligible"],
-                            "missing_fields": result["missing_fields"],
-                            "emd": tender.get("emd"),
-                            "estimated_budget": tender.get("estimated_budget")
-                        }
-                        matches.append(match_data)
-                        print(f"    ✅ Match found: {result['matching_score']:.1f}% score")
-                    else:
-                        print(f"    ❌ Below threshold: {result['matching_score']:.1f}% score")
-                
-            except Exception as tender_error:
-                print(f"    ⚠️ Error processing tender: {str(tender_error)}")
-                continue
-        
         # Sort matches by score
         matches.sort(key=lambda x: x["matching_score"], reverse=True)
         
@@ -130,7 +87,7 @@ def run_matching_for_user(user_id: str, threshold: float = 60.0) -> dict:
             "success": True,
             "user_id": user_id,
             "company_name": company.get('companyDetails', {}).get('companyName', 'Unknown'),
-            "total_filtered": len(filtered_tenders),
+            "total_filtered": stats["filtered"],
             "total_matches": len(matches),
             "matches": matches,
             "threshold": threshold
@@ -145,53 +102,83 @@ def run_matching_for_user(user_id: str, threshold: float = 60.0) -> dict:
             "user_id": user_id
         }
 
-def run_matching_for_all_users(threshold: float = 60.0) -> dict:
+def work_locally(run_id: str, processes: int = None) -> int:
+    """Claim and process units of a run on this host until none are left"""
+    run = get_run(run_id)
+    processes = min(processes or os.cpu_count() or 1, max(run.get("total_units", 0), 1))
+    started = time.perf_counter()
+    processed = 0
+    # spawn: each worker opens its own MongoClient instead of inheriting a forked one
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(work_on_run, run_id) for _ in range(processes)]
+        for future in as_completed(futures):
+            try:
+                processed += future.result()
+            except Exception as e:
+                print(f"❌ Worker process failed: {str(e)}")
+    print(f"⏱️ Phase two: {processed} units in {time.perf_counter() - started:.1f}s on {processes} processes")
+    
+    # Every local process has exited, so this host no longer needs its copy of the catalog
+    shutil.rmtree(catalog_dir(run_id), ignore_errors=True)
+    return processed
+
+def batch_results(run: dict, outcome: dict) -> dict:
+    """Shape a finished run's outcome for print_batch_results"""
+    user_results = outcome["user_results"]
+    successful = sum(1 for r in user_results if r["success"])
+    return {
+        "run_id": run["_id"],
+        "total_companies": run.get("total_companies", 0),
+        "processed": len(user_results),
+        "successful": successful,
+        "failed": len(user_results) - successful,
+        "user_results": user_results,
+        "errors": outcome["errors"]
+    }
+
+def run_matching_for_all_users(threshold: float = 60.0, processes: int = None, run_id: str = None) -> dict:
     """
-    Run tender matching for all users with complete profiles
+    Run tender matching for all users in two phases
+    
+    Phase one compiles the tender catalog once; phase two scores units of
+    company shards x tender shards in a process pool that maps the compiled
+    vectors read-only. Progress is checkpointed in Mongo, so an interrupted
+    run can be resumed and other hosts can join with the worker command.
     
     Args:
         threshold: Minimum matching score threshold
+        processes: Worker processes (defaults to the CPU count)
+        run_id: Existing run to resume instead of starting a new one
         
     Returns:
         dict: Overall results
     """
     try:
-        companies = db["companies"]
+        if run_id:
+            existing = get_run(run_id)
+            if not existing:
+                return {"success": False, "error": f"Run {run_id} not found"}
+            if existing["status"] == "completed":
+                return {"success": False, "error": f"Run {run_id} already completed; start a new run instead"}
+            retried = reset_failed_units(run_id)
+            released = release_dead_leases(run_id)
+            print(f"♻️ Resuming run {run_id}: {run_progress(run_id)['done']} units already done, "
+                  f"{retried} failed units retried, {released} abandoned leases released")
+        else:
+            run_id = create_run(threshold)
+            print(f"🆔 Run id: {run_id} (resume with: python run_tender_matching.py resume {run_id})")
         
-        # Get all companies with complete profiles
-        all_companies = list(companies.find({}))
-        print(f"🏢 Found {len(all_companies)} companies in database")
-        
-        results = {
-            "total_companies": len(all_companies),
-            "processed": 0,
-            "successful": 0,
-            "failed": 0,
-            "user_results": [],
-            "errors": []
-        }
+        # Phase one: load and compile the catalog once per run, then plan the units
+        started = time.perf_counter()
+        run = prepare_run(run_id)
+        print(f"⏱️ Phase one: {time.perf_counter() - started:.1f}s, {run['total_companies']} companies")
         
-        for company in all_companies:
-            user_id = company.get("user_id")
-            if not user_id:
-                continue
-            
-            print(f"\n{'='*60}")
-            result = run_matching_for_user(user_id, threshold)
-            
-            results["processed"] += 1
-            
-            if result["success"]:
-                results["successful"] += 1
-                print(f"✅ Success: {result['total_matches']} matches found")
-            else:
-                results["failed"] += 1
-                results["errors"].append(result)
-                print(f"❌ Failed: {result.get('error', 'Unknown error')}")
-            
-            results["user_results"].append(result)
+        work_locally(run_id, processes)
         
-        return results
+        outcome = finish_run(run_id)
+        if outcome["status"] == "running":
+            return {"success": False, "run_id": run_id, "error": f"Run still has outstanding units: {outcome['progress']}"}
+        return batch_results(run, outcome)
         
     except Exception as e:
         print(f"❌ Error in batch processing: {str(e)}")
@@ -201,6 +188,91 @@ def run_matching_for_all_users(threshold: float = 60.0) -> dict:
             "error": str(e)
         }
 
+def run_worker(run_id: str = None, processes: int = None):
+    """Join a run started by the coordinator (or all) from any host"""
+    run = get_run(run_id) if run_id else latest_running_run()
+    if not run or not run.get("units_planned"):
+        print("❌ No planned matching run to work on")
+        sys.exit(1)
+    
+    print(f"👷 Worker {worker_name()} joining run {run['_id']}")
+    processed = work_locally(run["_id"], processes)
+    print(f"\n✅ Worker finished: {processed} units processed, run progress {run_progress(run['_id'])}")
+
+def print_progress(run_id: str, progress: dict):
+    total = sum(progress[status] for status in ("pending", "leased", "done", "failed"))
+    print(f"📈 Run {run_id}: {progress['done']}/{total} units done, {progress['leased']} leased, "
+          f"{progress['pending']} pending, {progress['failed']} failed, "
+          f"{len(progress['workers'])} active workers")
+
+def coordinate_run(threshold: float = 60.0, poll_seconds: float = 30.0) -> dict:
+    """
+    Prepare a run for workers on other hosts and report aggregate progress
+    until every unit is settled, then finalize it
+    """
+    try:
+        run_id = create_run(threshold)
+        print(f"🆔 Run id: {run_id}")
+        run = prepare_run(run_id)
+        print(f"👷 Start workers with: python run_tender_matching.py worker {run_id} [processes]")
+        
+        while True:
+            progress = run_progress(run_id)
+            print_progress(run_id, progress)
+            if not progress["pending"] and not progress["leased"]:
+                break
+            time.sleep(poll_seconds)
+        
+        shutil.rmtree(catalog_dir(run_id), ignore_errors=True)
+        return batch_results(run, finish_run(run_id))
+        
+    except Exception as e:
+        print(f"❌ Error coordinating run: {str(e)}")
+        print(traceback.format_exc())
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+def run_incremental():
+    """Recompute only pairs whose company or tender changed since the last successful run"""
+    try:
+        result = run_incremental_matching()
+        print(f"\n📊 Incremental Matching Results (run {result['run_id']}):")
+        print(f"   Changes Since: {result['since'] or 'beginning (no earlier successful run)'}")
+        print(f"   Expired Matches Removed: {result['expired_removed']}")
+        print(f"   Companies Recomputed: {result['companies']}")
+        print(f"   Tenders Recomputed: {result['tenders']}")
+        print(f"   Errors: {result['errors']}")
+        if not result["success"]:
+            print("\n⚠️ High-water mark not advanced; the next run retries these changes")
+            sys.exit(1)
+    except Exception as e:
+        print(f"❌ Error in incremental matching: {e}")
+        print(traceback.format_exc())
+        sys.exit(1)
+
+def print_batch_results(results: dict):
+    """Print the outcome of an all/resume run"""
+    if "total_companies" not in results:
+        print(f"\n❌ Batch matching failed: {results.get('error')}")
+        sys.exit(1)
+    
+    print(f"\n📊 Batch Processing Results (run {results['run_id']}):")
+    print(f"   Total Companies: {results['total_companies']}")
+    print(f"   Processed: {results['processed']}")
+    print(f"   Successful: {results['successful']}")
+    print(f"   Failed: {results['failed']}")
+    
+    if results["errors"]:
+        print(f"\n❌ Errors:")
+        for error in results["errors"]:
+            print(f"   - {error.get('user_id') or error.get('company_id')}: {error['error']}")
+    
+    # Show summary of matches
+    total_matches = sum(r.get('total_matches', 0) for r in results['user_results'] if r.get('success'))
+    print(f"\n🎯 Total Matches Found: {total_matches}")
+
 def get_matching_statistics():
     """Display matching statistics"""
     try:
@@ -220,10 +292,99 @@ def get_matching_statistics():
         print(f"  Tenders with Raw Eligibility: {tenders_with_raw}")
         print(f"  Tenders with Structured Eligibility: {tenders_with_structured}")
         print(f"  Processing Coverage: {(tenders_with_structured/total_tenders*100):.1f}%" if total_tenders > 0 else "  Processing Coverage: 0%")
+        print("  Eligibility Status:")
+        for status, count in sorted(eligibility_status_counts().items()):
+            print(f"    {status}: {count}")
         
     except Exception as e:
         print(f"❌ Error getting statistics: {e}")
 
+def preprocess_eligibility(concurrency: int, retries: int, rate_per_minute: float, retry_failed: bool = False):
+    """Extract and parse eligibility for every tender that still lacks it"""
+    try:
+        counts = preprocess_tenders(concurrency, retries, rate_per_minute, retry_failed)
+        print(f"\n🧾 Eligibility preprocessing: {counts['total']} tenders")
+        print(f"   Done: {counts['done']}")
+        print(f"   No eligibility found: {counts['no_eligibility']}")
+        print(f"   Failed: {counts['failed']}")
+        print(f"   Skipped (claimed elsewhere): {counts['skipped']}")
+    except Exception as e:
+        print(f"❌ Error preprocessing eligibility: {e}")
+        print(traceback.format_exc())
+
+def reslice_eligibility(apply: bool = False):
+    """Re-run eligibility heading detection over cached document layouts"""
+    try:
+        started = time.monotonic()
+        counts = reslice_cached_layouts(apply)
+        print(f"\n✂️ Re-sliced {counts['cached']} cached layouts in {time.monotonic() - started:.2f}s")
+        print(f"   Unchanged: {counts['unchanged']}")
+        print(f"   Changed: {counts['changed']} (newly found: {counts['found']}, lost: {counts['lost']})")
+        print(f"   Not cached: {counts['uncached']}")
+        cache = layout_cache.stats()
+        print(f"   Cache: {cache['layouts']} layouts, {cache['compressed_bytes'] / 1e6:.1f} MB at {cache['disk_path']}")
+        if counts["changed"] and not apply:
+            print("   Dry run; pass --apply to store the new sections and re-parse them")
+    except Exception as e:
+        print(f"❌ Error re-slicing eligibility: {e}")
+        print(traceback.format_exc())
+
+def build_category_vocabulary():
+    """Backfill the category vocabulary and similarity table"""
+    try:
+        added = rebuild_vocabulary(db["filtered_tenders"], db["companies"], get_company_categories)
+        print(f"\n📚 Category vocabulary rebuilt: {added} new entries")
+    except Exception as e:
+        print(f"❌ Error building vocabulary: {e}")
+
+def build_tender_index():
+    """Rebuild the tender vector index from the whole collection"""
+    try:
+        indexed = tender_index.rebuild(db["filtered_tenders"])
+        print(f"\n🗂️ Tender index rebuilt: {indexed} tenders")
+    except Exception as e:
+        print(f"❌ Error building tender index: {e}")
+
+def backfill_deadlines():
+    """Parse tender deadlines into deadline_at for query pushdown"""
+    try:
+        updated = backfill_deadline_dates()
+        print(f"\n📅 Parsed deadlines for {updated} tenders")
+    except Exception as e:
+        print(f"❌ Error backfilling deadlines: {e}")
+
+def rebuild_company_features():
+    """Rebuild stored feature records for every company profile"""
+    try:
+        companies = db["companies"]
+        rebuilt = 0
+        for company in companies.find({}):
+            companies.update_one(
+                {"_id": company["_id"]},
+                {"$set": {"features": build_company_features(company)}}
+            )
+            rebuilt += 1
+        print(f"\n🧾 Rebuilt feature records for {rebuilt} companies")
+    except Exception as e:
+        print(f"❌ Error rebuilding company features: {e}")
+
+def migrate_database():
+    """
+    One-off deploy step for databases that predate the matches table and the
+    category vocabulary: drop legacy match documents, rebuild feature records
+    with normalized keywords, and backfill the vocabulary so every existing
+    company can be reached by reverse matching at tender ingest.
+    """
+    try:
+        removed = purge_legacy_matches()
+        print(f"\n🧹 Removed {removed} legacy match documents")
+    except Exception as e:
+        print(f"❌ Error migrating matches: {e}")
+        return
+    rebuild_company_features()
+    build_category_vocabulary()
+    print("   Re-run mongo-init.js index creation, then 'all' to rebuild the matches table")
+
 def main():
     """Main function for command-line usage"""
     if len(sys.argv) < 2:
@@ -232,12 +393,27 @@ def main():
         print("  python run_tender_matching.py <command> [args]")
         print("\nCommands:")
         print("  user <user_id> [threshold]  - Run matching for specific user")
-        print("  all [threshold]             - Run matching for all users")
+        print("  all [threshold] [processes] - Run matching for all users")
+        print("  resume <run_id> [processes] - Resume an interrupted all run")
+        print("  incremental                 - Recompute only pairs changed since the last run")
+        print("  coordinate [threshold]      - Plan a run for multi-host workers and track it")
+        print("  worker [run_id] [processes] - Work on a planned run from this host")
+        print("  progress <run_id>           - Show a run's progress")
         print("  stats                       - Show matching statistics")
+        print("  preprocess [concurrency] [retries] [rate_per_minute] [--retry-failed]")
+        print("                              - Extract eligibility for unprocessed tenders")
+        print("  reslice [--apply]           - Re-detect eligibility sections from cached layouts")
+        print("  vocabulary                  - Rebuild category vocabulary")
+        print("  index                       - Rebuild tender vector index")
+        print("  deadlines                   - Backfill parsed tender deadlines")
+        print("  features                    - Rebuild company feature records")
+        print("  migrate                     - Required once on existing databases: drop legacy matches,")
+        print("                                rebuild features and backfill the vocabulary")
         print("\nExamples:")
         print("  python run_tender_matching.py user 12345 70.0")
         print("  python run_tender_matching.py all 60.0")
         print("  python run_tender_matching.py stats")
+        print("  python run_tender_matching.py preprocess 8 3 60")
         return
     
     command = sys.argv[1].lower()
@@ -270,31 +446,89 @@ def main():
         
     elif command == "all":
         threshold = float(sys.argv[2]) if len(sys.argv) > 2 else 60.0
+        processes = int(sys.argv[3]) if len(sys.argv) > 3 else None
         
         print(f"🎯 Running matching for all users (threshold: {threshold}%)")
-        results = run_matching_for_all_users(threshold)
+        results = run_matching_for_all_users(threshold, processes)
+        print_batch_results(results)
+        
+    elif command == "resume":
+        if len(sys.argv) < 3:
+            print("❌ Please provide run ID")
+            print("Usage: python run_tender_matching.py resume <run_id> [processes]")
+            return
         
-        print(f"\n📊 Batch Processing Results:")
-        print(f"   Total Companies: {results['total_companies']}")
-        print(f"   Processed: {results['processed']}")
-        print(f"   Successful: {results['successful']}")
-        print(f"   Failed: {results['failed']}")
+        run_id = sys.argv[2]
+        processes = int(sys.argv[3]) if len(sys.argv) > 3 else None
         
-        if results["errors"]:
-            print(f"\n❌ Errors:")
-            for error in results["errors"]:
-                print(f"   - {error['user_id']}: {error['error']}")
+        print(f"🎯 Resuming matching run: {run_id}")
+        results = run_matching_for_all_users(processes=processes, run_id=run_id)
+        print_batch_results(results)
         
-        # Show summary of matches
-        total_matches = sum(r.get('total_matches', 0) for r in results['user_results'] if r.get('success'))
-        print(f"\n🎯 Total Matches Found: {total_matches}")
+    elif command == "coordinate":
+        threshold = float(sys.argv[2]) if len(sys.argv) > 2 else 60.0
+        
+        print(f"🎯 Coordinating matching run (threshold: {threshold}%)")
+        results = coordinate_run(threshold, MATCH_RUN_POLL_SECONDS)
+        print_batch_results(results)
+        
+    elif command == "worker":
+        run_id = sys.argv[2] if len(sys.argv) > 2 else None
+        processes = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        run_worker(run_id, processes)
+        
+    elif command == "progress":
+        if len(sys.argv) < 3:
+            print("❌ Please provide run ID")
+            print("Usage: python run_tender_matching.py progress <run_id>")
+            return
+        
+        run_id = sys.argv[2]
+        run = get_run(run_id)
+        if not run:
+            print(f"❌ Run {run_id} not found")
+            sys.exit(1)
+        print(f"   Status: {run['status']}")
+        print_progress(run_id, run_progress(run_id))
+        
+    elif command == "incremental":
+        print("🎯 Running incremental matching")
+        run_incremental()
         
     elif command == "stats":
         get_matching_statistics()
         
+    elif command == "preprocess":
+        args = [a for a in sys.argv[2:] if not a.startswith("--")]
+        concurrency = int(args[0]) if len(args) > 0 else ELIGIBILITY_CONCURRENCY
+        retries = int(args[1]) if len(args) > 1 else ELIGIBILITY_RETRIES
+        rate_per_minute = float(args[2]) if len(args) > 2 else ELIGIBILITY_RATE_PER_MINUTE
+        retry_failed = "--retry-failed" in sys.argv
+
+        print(f"🧾 Preprocessing eligibility (concurrency: {concurrency}, retries: {retries}, rate: {rate_per_minute}/min)")
+        preprocess_eligibility(concurrency, retries, rate_per_minute, retry_failed)
+        
+    elif command == "reslice":
+        reslice_eligibility("--apply" in sys.argv)
+        
+    elif command == "vocabulary":
+        build_category_vocabulary()
+        
+    elif command == "index":
+        build_tender_index()
+        
+    elif command == "deadlines":
+        backfill_deadlines()
+        
+    elif command == "features":
+        rebuild_company_features()
+        
+    elif command == "migrate":
+        migrate_database()
+        
     else:
         print(f"❌ Unknown command: {command}")
-        print("Available commands: user, all, stats")
+        print("Available commands: user, all, resume, incremental, coordinate, worker, progress, stats, preprocess, reslice, vocabulary, index, deadlines, features, migrate")
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from bson import ObjectId
+from pydantic import BaseModel
+from core.database import db
+from services.job_queue import submit_job, get_job, list_jobs, cancel_job
+from routers.auth import get_current_user
+import traceback
+
+router = APIRouter()
+
+companies = db["companies"]
+
+class MatchJobRequest(BaseModel):
+    threshold: float = 60.0
+
+def _require_job_id(job_id: str):
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+@router.post("/jobs/match")
+def create_match_job(payload: MatchJobRequest = MatchJobRequest(), current_user: dict = Depends(get_current_user)):
+    """Queue a full matching run for the current user's company and return its job id"""
+    try:
+        company = companies.find_one({"user_id": current_user["id"]}, {"_id": 1, "user_id": 1})
+        if not company:
+            raise HTTPException(status_code=404, detail="Company profile not found. Please complete your profile first.")
+
+        job_id = submit_job("match", company, {"threshold": payload.threshold})
+        return {"job_id": job_id, "status_url": f"/api/jobs/{job_id}"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Job submit error: {str(e)}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Failed to submit job: {str(e)}")
+
+@router.get("/jobs")
+def get_jobs(limit: int = Query(20, ge=1, le=100), current_user: dict = Depends(get_current_user)):
+    """Recent jobs for the current user, without their partial results"""
+    return {"jobs": list_jobs(current_user["id"], limit)}
+
+@router.get("/jobs/{job_id}")
+def get_job_status(
+    job_id: str,
+    results_skip: int = Query(0, ge=0),
+    results_limit: int = Query(100, ge=0, le=1000),
+    current_user: dict = Depends(get_current_user)
+):
+    """Status, progress counters and a page of the partial results collected so far"""
+    _require_job_id(job_id)
+    job = get_job(job_id, current_user["id"], results_skip, results_limit)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job_run(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Ask a queued or running job to stop after the tenders already in flight"""
+    _require_job_id(job_id)
+    if not cancel_job(job_id, current_user["id"]):
+        raise HTTPException(status_code=404, detail="No active job with that id")
+    return {"job_id": job_id, "cancel_requested": True}
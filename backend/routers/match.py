@@ -1,16 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
 from core.database import db
-from services.basic_filter import filter_tenders
-from services.eligibility_extractor import extract_eligibility_text_from_url
-from services.eligibility_parser import extract_eligibility_json_general
-from services.tender_matcher import compute_tender_match_score
+from services.basic_filter import filtered_tender_ids
+from services.job_queue import submit_job
+from services.match_pipeline import iter_tender_matches, finish_refresh
+from services.match_store import matches
 from services.summarizer import PDFSummaryService
 from routers.auth import get_current_user
 from datetime import datetime
 from tempfile import NamedTemporaryFile
 import traceback
 import requests
+import json
+import time
 import os
 from urllib.parse import urlparse
 router = APIRouter()
@@ -19,6 +22,7 @@ companies = db["companies"]
 tenders = db["filtered_tenders"]
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "your_gemini_api_key_here")
+MATCH_STREAM_CONCURRENCY = int(os.getenv("MATCH_STREAM_CONCURRENCY", "8"))
 
 def serialize_tender(tender):
     """Convert ObjectId to string for JSON serialization"""
@@ -26,110 +30,194 @@ def serialize_tender(tender):
         tender["_id"] = str(tender["_id"])
     return tender
 
+# Fields a dashboard tender card shows; eligibility text and structures stay out
+SUMMARY_PROJECTION = {
+    "title": 1,
+    "reference_number": 1,
+    "institute": 1,
+    "location": 1,
+    "business_category": 1,
+    "deadline": 1,
+    "form_url": 1,
+    "emd": 1,
+    "estimated_budget": 1
+}
+
+SUMMARY_PAGE_SIZE = 20
+
 @router.get("/tenders/summary")
-def get_tenders_summary(current_user: dict = Depends(get_current_user)):
-    """Get total and filtered tender counts"""
+def get_tenders_summary(
+    counts_only: bool = Query(False),
+    limit: int = Query(None, ge=1, le=100, description="Page size; omit with cursor to get the whole list"),
+    cursor: str = Query(None, description="next_cursor from the previous page"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get total and filtered tender counts plus the filtered tenders: the whole
+    list by default, as the dashboard expects, or one page when limit or
+    cursor is given
+    """
     try:
-        company = companies.find_one({"user_id": current_user["id"]})
-        print("📄 Loaded company profile:", company)
-
+        company = companies.find_one({"user_id": current_user["id"]}, {"features": 0})
         if not company:
             raise HTTPException(status_code=404, detail="Company profile not found. Please complete your profile first.")
+        print(f"📄 Loaded company profile for user {current_user['id']}")
+
+        if cursor is not None and not ObjectId.is_valid(cursor):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
 
-        total_tenders = tenders.count_documents({})
-        filtered = filter_tenders(company)
-        serialized_filtered = [serialize_tender(t) for t in filtered]
+        total_tenders = tenders.estimated_document_count()
+        query = {
+            "_id": {"$in": filtered_tender_ids(company)},
+            "$or": [{"deadline_at": {"$gte": datetime.utcnow()}}, {"deadline_at": None}]
+        }
+        filtered_count = tenders.count_documents(query)
+
+        if counts_only:
+            return {"total_tenders": total_tenders, "filtered_tenders": filtered_count}
+
+        paginated = limit is not None or cursor is not None
+        if cursor is not None:
+            query["_id"]["$gt"] = ObjectId(cursor)
+        results = tenders.find(query, SUMMARY_PROJECTION).sort("_id", 1)
+        if paginated:
+            limit = limit or SUMMARY_PAGE_SIZE
+            results = results.limit(limit)
+        page = [serialize_tender(t) for t in results]
+        next_cursor = page[-1]["_id"] if paginated and len(page) == limit else None
 
         return {
             "total_tenders": total_tenders,
-            "filtered_tenders": len(serialized_filtered),
-            "filtered_list": serialized_filtered
+            "filtered_tenders": filtered_count,
+            "filtered_list": page,
+            "next_cursor": next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Summary error: {str(e)}")
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Failed to get tender summary: {str(e)}")
 
-@router.post("/tenders/match")
-def match_tenders(current_user: dict = Depends(get_current_user)):
-    """Run tender matching pipeline"""
+MATCH_SORT_FIELDS = {
+    "score": ("matching_score", -1),
+    "deadline": ("deadline_at", 1),
+    "budget": ("estimated_budget", -1),
+}
+
+def serialize_match(match):
+    """Shape a materialized match row like the tender cards the dashboard renders"""
+    match["_id"] = match.pop("tender_id")
+    for key in ("company_id", "user_id", "deadline_at"):
+        match.pop(key, None)
+    return match
+
+@router.api_route("/tenders/match", methods=["GET", "POST"])
+def match_tenders(
+    threshold: float = Query(60.0, ge=0, le=100),
+    sort: str = Query("score", pattern="^(score|deadline|budget)$"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    current_user: dict = Depends(get_current_user)
+):
+    """Read the company's materialized matches from the matches table"""
     try:
-        company = companies.find_one({"user_id": current_user["id"]})
+        company = companies.find_one(
+            {"user_id": current_user["id"]},
+            {"_id": 1, "user_id": 1, "matches_stale_since": 1, "matches_refreshed_at": 1, "created_at": 1}
+        )
         if not company:
             raise HTTPException(status_code=404, detail="Company profile not found. Please complete your profile first.")
 
-        filtered_tenders_list = filter_tenders(company)
-
-        if not filtered_tenders_list:
-            return {
-                "message": "No tenders match your company profile",
-                "matches": []
-            }
-
-        threshold = 60.0
-        results = []
-
-        for tender in filtered_tenders_list:
-            form_url = tender.get("form_url")
-            if not form_url:
-                continue
-
-            try:
-                raw_eligibility = tender.get("raw_eligibility")
-                if not raw_eligibility:
-                    raw_eligibility = extract_eligibility_text_from_url(form_url)
-                    if raw_eligibility:
-                        tenders.update_one(
-                            {"_id": tender["_id"]},
-                            {"$set": {"raw_eligibility": raw_eligibility, "last_updated": datetime.utcnow()}}
-                        )
-
-                structured_eligibility = tender.get("structured_eligibility")
-                if not structured_eligibility:
-                    structured_eligibility = extract_eligibility_json_general(raw_eligibility)
-                    
-                    if structured_eligibility:
-                        tenders.update_one(
-                            {"_id": tender["_id"]},
-                            {"$set": {"structured_eligibility": structured_eligibility, "last_updated": datetime.utcnow()}}
-                        )
-
-                result = compute_tender_match_score(structured_eligibility, company)
-
-                if result["matching_score"] >= threshold:
-                    match_data = {
-                        "_id": str(tender["_id"]),
-                        "title": tender.get("title"),
-                        "reference_number": tender.get("reference_number"),
-                        "location": tender.get("location"),
-                        "business_category": tender.get("business_category", []),
-                        "deadline": tender.get("deadline"),
-                        "form_url": form_url,
-                        "matching_score": result["matching_score"],
-                        "field_scores": result["field_scores"],
-                        "eligible": result["eligible"],
-                        "missing_fields": result["missing_fields"],
-                        "emd": tender.get("emd"),
-                        "estimated_budget": tender.get("estimated_budget")
-                    }
-                    results.append(match_data)
-
-            except Exception as tender_error:
-                print(f"Error processing tender {tender.get('title')}: {str(tender_error)}")
-                continue
-
-        results.sort(key=lambda x: x["matching_score"], reverse=True)
+        stale_since = company.get("matches_stale_since")
+        job_id = None
+        if not stale_since and not company.get("matches_refreshed_at"):
+            # Never materialized for this company: run a matching job and let the client poll it
+            stale_since = company.get("created_at") or datetime.utcnow()
+            job_id = submit_job("match", company, {"threshold": threshold})
+
+        query = {
+            "company_id": str(company["_id"]),
+            "matching_score": {"$gte": threshold},
+            "$or": [{"deadline_at": {"$gte": datetime.utcnow()}}, {"deadline_at": None}]
+        }
+        sort_field, direction = MATCH_SORT_FIELDS[sort]
+        total = matches.count_documents(query)
+        cursor = (
+            matches.find(query, {"_id": 0, "updated_at": 0})
+            .sort([(sort_field, direction), ("matching_score", -1)])
+            .skip(skip)
+            .limit(limit)
+        )
+        results = [serialize_match(m) for m in cursor]
 
         return {
-            "message": f"Found {len(results)} matching tenders",
-            "matches": results
+            "message": f"Found {total} matching tenders" if total else "No tenders match your company profile",
+            "matches": results,
+            "total": total,
+            "skip": skip,
+            "limit": limit,
+            "threshold": threshold,
+            "stale_since": stale_since,
+            "job_id": job_id
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Matching error: {str(e)}")
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Failed to match tenders: {str(e)}")
 
+def _stream_event(event: str, data: dict, fmt: str) -> str:
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+    return json.dumps({"event": event, "data": data}, default=str) + "\n"
+
+@router.get("/tenders/match/stream")
+def stream_match_tenders(
+    threshold: float = Query(60.0, ge=0, le=100),
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Score tenders live and send each match as soon as it is ready, as NDJSON
+    lines or Server-Sent Events, followed by a final summary event
+    """
+    company = companies.find_one({"user_id": current_user["id"]})
+    if not company:
+        raise HTTPException(status_code=404, detail="Company profile not found. Please complete your profile first.")
+
+    def events():
+        started = time.perf_counter()
+        started_at = datetime.utcnow()
+        stats = {}
+        filtered_ids = []
+        first_result = None
+        try:
+            for match in iter_tender_matches(company, threshold=threshold, stats=stats, store=True,
+                                             concurrency=MATCH_STREAM_CONCURRENCY, rank=True,
+                                             filtered_ids=filtered_ids):
+                if first_result is None:
+                    first_result = round(time.perf_counter() - started, 3)
+                yield _stream_event("match", match, fmt)
+            # Every filtered tender was stored, so the matches table is now current
+            stats["removed"] = finish_refresh(company, filtered_ids, started_at)
+        except Exception as e:
+            print(f"Streaming match error: {str(e)}")
+            print(traceback.format_exc())
+            yield _stream_event("error", {"detail": f"Failed to match tenders: {str(e)}"}, fmt)
+
+        yield _stream_event("summary", {
+            **stats,
+            "threshold": threshold,
+            "first_result_seconds": first_result,
+            "elapsed_seconds": round(time.perf_counter() - started, 3)
+        }, fmt)
+
+    media_type = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
 @router.get("/tenders/{tender_id}/summarize")
 def summarize_tender(tender_id: str, current_user: dict = Depends(get_current_user)):
     """Generate Gemini AI summary for a specific tender PDF"""
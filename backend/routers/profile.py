@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from models.registration_models import RegistrationRequest
 from core.database import db
 from routers.auth import get_current_user
+from services.basic_filter import get_company_categories
+from services.category_vocabulary import add_terms
+from services.filter_cache import bump_profile_version
+from services.company_features import build_company_features
+from services.match_pipeline import refresh_company_matches
 from datetime import datetime
 import traceback
 
@@ -9,7 +14,7 @@ router = APIRouter()
 companies_collection = db["companies"]
 
 @router.post("/register")
-def register_company(payload: RegistrationRequest, current_user: dict = Depends(get_current_user)):
+def register_company(payload: RegistrationRequest, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
     try:
         # Convert the payload to a dictionary and add user info
         profile_data = {
@@ -23,19 +28,36 @@ def register_company(payload: RegistrationRequest, current_user: dict = Depends(
             "termsAndConditions": payload.termsAndConditions.dict(),
             "declarationsUploads": payload.declarationsUploads.dict(),
             "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "updated_at": datetime.utcnow(),
+            # Materialized matches are recomputed after every profile save
+            "matches_stale_since": datetime.utcnow()
         }
 
+        # Typed feature record (parsed amounts, flags, pre-embedded lists) read by the matcher
+        try:
+            profile_data["features"] = build_company_features(profile_data)
+        except Exception as feature_error:
+            print(f"⚠️ Failed to build company features: {feature_error}")
+
+        # Keep the category similarity table warm for this profile's keywords
+        try:
+            add_terms(keywords=get_company_categories(profile_data))
+        except Exception as vocab_error:
+            print(f"⚠️ Failed to update category vocabulary: {vocab_error}")
+
         # Check if company profile already exists for this user
         existing_profile = companies_collection.find_one({"user_id": current_user["id"]})
         
         if existing_profile:
             # Update existing profile
             profile_data["updated_at"] = datetime.utcnow()
-            companies_collection.update_one(
-                {"user_id": current_user["id"]},
-                {"$set": profile_data}
-            )
+            update = {"$set": profile_data}
+            if "features" not in profile_data:
+                # A record built from the previous profile must not be scored against this one
+                update["$unset"] = {"features": ""}
+            companies_collection.update_one({"user_id": current_user["id"]}, update)
+            bump_profile_version(current_user["id"])
+            background_tasks.add_task(refresh_company_matches, existing_profile["_id"])
             return {
                 "message": "Company profile updated successfully",
                 "id": str(existing_profile["_id"]),
@@ -44,6 +66,7 @@ def register_company(payload: RegistrationRequest, current_user: dict = Depends(
         else:
             # Create new profile
             result = companies_collection.insert_one(profile_data)
+            background_tasks.add_task(refresh_company_matches, result.inserted_id)
             return {
                 "message": "Company profile registered successfully",
                 "id": str(result.inserted_id),
@@ -58,7 +81,7 @@ def register_company(payload: RegistrationRequest, current_user: dict = Depends(
 @router.get("/profile")
 def get_company_profile(current_user: dict = Depends(get_current_user)):
     try:
-        profile = companies_collection.find_one({"user_id": current_user["id"]})
+        profile = companies_collection.find_one({"user_id": current_user["id"]}, {"features": 0})
         if not profile:
             raise HTTPException(status_code=404, detail="Company profile not found")
         
@@ -1,24 +1,19 @@
 from fastapi import APIRouter, Form, Request
 from fastapi.responses import JSONResponse, HTMLResponse
-from pymongo import MongoClient
 from bson import ObjectId
 import traceback
 
+from core.database import db
 from services.eligibility_extractor import extract_eligibility_text_from_url
 from services.eligibility_parser import extract_eligibility_json_general
 from services.tender_matcher import compute_tender_match_score
+from services.match_store import find_match, upsert_match, result_from_match
+from services.job_queue import submit_job
 
 router = APIRouter()
-from dotenv import load_dotenv
-import os
 
-load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
-client = MongoClient(MONGO_URI)
-db = client["tender_system"]
 companies = db["companies"]
 filtered_tenders = db["filtered_tenders"]
-matches = db["matches"]
 
 # ✅ Single Tender Matching
 @router.post("/process-tender", response_class=HTMLResponse)
@@ -28,20 +23,17 @@ async def process_tender(form_url: str = Form(...), company_id: str = Form(...))
         if not company_doc:
             return HTMLResponse(content="Company not found", status_code=404)
 
-        cached = matches.find_one({"company_id": company_id, "form_url": form_url})
+        cached = find_match(company_id, form_url)
         if cached:
-            return HTMLResponse(content=f"<pre>{cached['result_json']}</pre>", status_code=200)
+            return HTMLResponse(content=f"<pre>{result_from_match(cached)}</pre>", status_code=200)
 
         raw_text = extract_eligibility_text_from_url(form_url)
         structured = extract_eligibility_json_general(raw_text)
         result = compute_tender_match_score(structured, company_doc)
 
-        matches.insert_one({
-            "company_id": company_id,
-            "form_url": form_url,
-            "result_json": result,
-            "structured": structured
-        })
+        tender = filtered_tenders.find_one({"form_url": form_url}, {"raw_eligibility": 0})
+        if tender:
+            upsert_match(company_doc, tender, result)
 
         return HTMLResponse(content=f"<pre>{result}</pre>", status_code=200)
 
@@ -50,53 +42,19 @@ async def process_tender(form_url: str = Form(...), company_id: str = Form(...))
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 # ✅ Batch Tender Matching
-@router.post("/batch-process-tenders", response_class=HTMLResponse)
+@router.post("/batch-process-tenders")
 def batch_process_tenders(company_id: str = Form(...)):
+    """
+    Queue matching of every tender for the company; poll /api/jobs/{job_id} for
+    progress. Tenders not yet preprocessed are extracted within the job.
+    """
     try:
-        company_doc = companies.find_one({"_id": ObjectId(company_id)})
+        company_doc = companies.find_one({"_id": ObjectId(company_id)}, {"_id": 1, "user_id": 1})
         if not company_doc:
             return HTMLResponse(content="Company not found", status_code=404)
 
-        processed = []
-        tenders = filtered_tenders.find()
-
-        for tender in tenders:
-            form_url = tender.get("form_url")
-            if not form_url:
-                continue
-
-            cached = matches.find_one({"company_id": company_id, "form_url": form_url})
-            if cached:
-                processed.append({"form_url": form_url, "status": "cached"})
-                continue
-
-            try:
-                raw_text = extract_eligibility_text_from_url(form_url)
-                structured = extract_eligibility_json_general(raw_text)
-                result = compute_tender_match_score(structured, company_doc)
-
-                matches.insert_one({
-                    "company_id": company_id,
-                    "form_url": form_url,
-                    "tender_id": str(tender["_id"]),
-                    "structured": structured,
-                    "result_json": result,
-                })
-
-                processed.append({
-                    "form_url": form_url,
-                    "status": "processed",
-                    "score": result.get("matching_score", None)
-                })
-
-            except Exception as tender_error:
-                processed.append({
-                    "form_url": form_url,
-                    "status": "error",
-                    "error": str(tender_error)
-                })
-
-        return JSONResponse(content={"results": processed}, status_code=200)
+        job_id = submit_job("batch_process", company_doc, {"threshold": 0})
+        return JSONResponse(content={"job_id": job_id, "status_url": f"/api/jobs/{job_id}"}, status_code=202)
 
     except Exception as e:
         traceback.print_exc()
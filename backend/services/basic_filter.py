@@ -1,14 +1,31 @@
 from pymongo import MongoClient
-from sentence_transformers import SentenceTransformer, util
 from datetime import datetime
+import os
 from core.database import db  # assumes your db is initialized here
-
-# Load model
-model = SentenceTransformer("all-MiniLM-L6-v2")
+from services.category_vocabulary import similar_categories, normalize_term, category_variants
+from services.tender_index import tender_index, search_tenders, TENDER_INDEX_TOP_K
+from services.filter_cache import filter_cache_key, get_cached_tender_ids, store_cached_tender_ids
+from bson import ObjectId
 
 # Collection
 filtered_tenders = db.get_collection("filtered_tenders")
 
+FILTER_BATCH_SIZE = int(os.getenv("FILTER_BATCH_SIZE", "200"))
+
+# Everything the matcher and the dashboard read; raw_eligibility can be huge
+TENDER_FILTER_PROJECTION = {
+    "title": 1,
+    "reference_number": 1,
+    "institute": 1,
+    "location": 1,
+    "business_category": 1,
+    "deadline": 1,
+    "form_url": 1,
+    "emd": 1,
+    "estimated_budget": 1,
+    "structured_eligibility": 1
+}
+
 
 def get_company_categories(company_profile: dict):
     """
@@ -33,7 +50,8 @@ def get_company_categories(company_profile: dict):
         print("⚠️ No tenderTypesHandled provided.")
 
     # Normalize and deduplicate
-    clean_categories = list({kw.strip().lower() for kw in capability_keywords if kw.strip()})
+    # Same normalization as vocabulary terms, so stored keywords match them exactly
+    clean_categories = list({normalize_term(kw) for kw in capability_keywords if normalize_term(kw)})
     
     if not clean_categories:
         print("🚫 No valid company categories found. Aborting filtering.")
@@ -43,46 +61,152 @@ def get_company_categories(company_profile: dict):
     return clean_categories
 
 
-def is_category_similar(list1, list2, threshold=0.6):
+def build_tender_query(matched_categories, now=None):
     """
-    Semantic similarity between categories using SentenceTransformer.
+    Mongo predicates pushed down to the indexes from mongo-init.js:
+    open deadline and category.
     """
-    for a in list1:
-        for b in list2:
-            a_enc = model.encode(a, convert_to_tensor=True)
-            b_enc = model.encode(b, convert_to_tensor=True)
-            score = util.cos_sim(a_enc, b_enc).item()
-            if score >= threshold:
-                return True
-    return False
+    return {
+        # Tenders whose deadline could not be parsed are kept
+        "$or": [{"deadline_at": {"$gte": now or datetime.utcnow()}}, {"deadline_at": None}],
+        "business_category": {"$in": category_variants(matched_categories)}
+    }
 
 
-def filter_tenders(company_profile: dict):
+def load_raw_eligibility(tender_id):
+    """raw_eligibility is projected out of filter results; fetch it only when needed."""
+    tender = filtered_tenders.find_one({"_id": tender_id}, {"raw_eligibility": 1})
+    return (tender or {}).get("raw_eligibility")
+
+
+def iter_filtered_tenders(company_profile: dict, batch_size: int = FILTER_BATCH_SIZE, use_cache: bool = True,
+                          rank: bool = False):
     """
-    Main function to filter tenders based on company profile match.
+    Stream tenders that match the company profile.
+
+    Results are cached per (profile version, catalog version); a hit is one
+    lookup plus an _id fetch that re-checks the deadline. On a miss the
+    filter runs and the ids it yielded are stored once the stream completes.
+
+    With `rank`, the same complete set is streamed with the tenders most
+    similar to the profile first, for callers that show results as they come.
     """
-    company_categories = get_company_categories(company_profile)
-    if not company_categories:
-        print("🚫 No valid company categories found. Aborting filtering.\n")
-        return []
+    if rank:
+        yield from _iter_ranked(company_profile, filtered_tender_ids(company_profile), batch_size)
+        return
 
-    # Fetch tenders
-    tenders = list(filtered_tenders.find())
-    print(f"\n📦 Total Tenders Fetched from DB: {len(tenders)}\n")
+    cache_key = None
+    if use_cache and company_profile.get("_id") is not None:
+        cache_key = filter_cache_key(company_profile)
+        cached_ids = get_cached_tender_ids(cache_key)
+        if cached_ids is not None:
+            print(f"⚡ Filter cache hit: {len(cached_ids)} tenders")
+            yield from _iter_tenders_by_id(cached_ids, batch_size)
+            return
 
-    results = []
-    for tender in tenders:
-        title = tender.get("title", "Untitled Tender")
-        print("➡️ Tender Title:", title)
+    tender_ids = []
+    for tender in _iter_filtered_uncached(company_profile, batch_size):
+        tender_ids.append(tender["_id"])
+        yield tender
 
-        tender_categories = [cat.strip().lower() for cat in tender.get("business_category", []) if cat.strip()]
-        print("   Tender Categories:", tender_categories)
+    if cache_key:
+        store_cached_tender_ids(cache_key, company_profile["_id"], tender_ids)
 
-        if is_category_similar(company_categories, tender_categories):
-            print("   ✅ Category matched!\n")
-            results.append(tender)
-        else:
-            print("   ❌ No match.\n")
 
-    print(f"🧮 Tenders after filtering: {len(results)}\n")
-    return results
+def filtered_tender_ids(company_profile: dict) -> list:
+    """
+    Ids of the tenders matching the profile, from the filter cache when warm.
+    On a miss the filter runs once (filling the cache) and only ids are kept.
+    """
+    if company_profile.get("_id") is not None:
+        cached_ids = get_cached_tender_ids(filter_cache_key(company_profile))
+        if cached_ids is not None:
+            return cached_ids
+    return [t["_id"] for t in iter_filtered_tenders(company_profile)]
+
+
+def _iter_ranked(company_profile: dict, tender_ids, batch_size: int):
+    """
+    Order tender_ids by vector similarity to the profile. Only the order
+    changes: the top-K from the index come first and every other id follows.
+    """
+    if len(tender_ids) > TENDER_INDEX_TOP_K and len(tender_index) > TENDER_INDEX_TOP_K:
+        query_text = ", ".join(get_company_categories(company_profile))
+        top_ids = [ObjectId(i) for i in search_tenders(query_text, TENDER_INDEX_TOP_K, allowed_ids=tender_ids)]
+        top = set(top_ids)
+        tender_ids = top_ids + [i for i in tender_ids if i not in top]
+
+    for start in range(0, len(tender_ids), batch_size):
+        chunk = tender_ids[start:start + batch_size]
+        position = {tender_id: i for i, tender_id in enumerate(chunk)}
+        yield from sorted(_iter_tenders_by_id(chunk, batch_size), key=lambda t: position[t["_id"]])
+
+
+def _iter_tenders_by_id(tender_ids, batch_size: int):
+    if not tender_ids:
+        return
+    query = {
+        "_id": {"$in": tender_ids},
+        "$or": [{"deadline_at": {"$gte": datetime.utcnow()}}, {"deadline_at": None}]
+    }
+    yield from filtered_tenders.find(query, TENDER_FILTER_PROJECTION).batch_size(batch_size)
+
+
+def _iter_filtered_uncached(company_profile: dict, batch_size: int):
+    """
+    Reads a batched Mongo cursor and runs the category check one batch at a
+    time, yielding each qualifying tender as soon as its batch is checked, so
+    memory stays flat however large the catalog is.
+    """
+    company_categories = get_company_categories(company_profile)
+    if not company_categories:
+        print("🚫 No valid company categories found. Aborting filtering.\n")
+        return
+
+    # Tender categories are added to the vocabulary at ingest; this is a table lookup
+    matched_categories = similar_categories(company_categories, threshold=0.6)
+    print("📌 Matched Tender Categories:", sorted(matched_categories))
+
+    if not matched_categories:
+        print("🧮 Tenders after filtering: 0\n")
+        return
+
+    query = build_tender_query(matched_categories)
+    cursor = filtered_tenders.find(query, TENDER_FILTER_PROJECTION).batch_size(batch_size)
+
+    fetched = 0
+    matched = 0
+    batch = []
+    for tender in cursor:
+        batch.append(tender)
+        if len(batch) < batch_size:
+            continue
+        fetched += len(batch)
+        for hit in _matching_in_batch(batch, matched_categories):
+            matched += 1
+            yield hit
+        batch = []
+
+    if batch:
+        fetched += len(batch)
+        for hit in _matching_in_batch(batch, matched_categories):
+            matched += 1
+            yield hit
+
+    print(f"\n📦 Candidate Tenders Fetched from DB: {fetched}")
+    print(f"🧮 Tenders after filtering: {matched}\n")
+
+
+def _matching_in_batch(batch, matched_categories):
+    for tender in batch:
+        categories = [normalize_term(cat) for cat in tender.get("business_category", []) if cat.strip()]
+        if any(cat in matched_categories for cat in categories):
+            print(f"   ✅ Category matched: {tender.get('title', 'Untitled Tender')}")
+            yield tender
+
+
+def filter_tenders(company_profile: dict):
+    """
+    Main function to filter tenders based on company profile match.
+    """
+    return list(iter_filtered_tenders(company_profile))
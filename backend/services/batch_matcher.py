@@ -0,0 +1,201 @@
+"""
+Two-phase batch matching for every company.
+
+Phase one (prepare_catalog) loads the open tender catalog once, compiles each
+tender's eligibility into a predicate program, and writes the program vectors
+to one .npy file plus a small pickled manifest.
+
+Phase two (match_company_shard) runs in worker processes, possibly on many
+hosts. Each worker maps the vectors read-only, builds a company table for its
+company shard, and evaluates every program in its tender range against the
+whole shard at once.
+"""
+
+import os
+import pickle
+from datetime import datetime
+import numpy as np
+from bson import ObjectId
+from core.database import db
+from services.category_vocabulary import add_terms, similar_categories, normalize_term
+from services.company_features import company_keywords
+from services.embedding_cache import get_embeddings
+from services.eligibility_rules import build_company_table, compile_eligibility, evaluate, result_for
+from services.match_store import match_document, upsert_matches
+
+companies = db["companies"]
+tenders = db["filtered_tenders"]
+
+MATCH_CATALOG_DIR = os.getenv("MATCH_CATALOG_DIR", "storage/catalog")
+MATCH_SHARD_SIZE = int(os.getenv("MATCH_SHARD_SIZE", "200"))
+MATCH_TENDER_SHARD_SIZE = int(os.getenv("MATCH_TENDER_SHARD_SIZE", "5000"))
+HEARTBEAT_EVERY = 200
+CATEGORY_THRESHOLD = 0.6
+WRITE_BATCH_SIZE = 1000
+
+# Card fields written into each match row
+CATALOG_PROJECTION = {
+    "title": 1,
+    "reference_number": 1,
+    "location": 1,
+    "business_category": 1,
+    "deadline": 1,
+    "deadline_at": 1,
+    "form_url": 1,
+    "emd": 1,
+    "estimated_budget": 1,
+    "structured_eligibility": 1
+}
+
+VECTOR_KEYS = ("documents_vectors", "certifications_vectors")
+
+
+def _open_tenders_query(now=None) -> dict:
+    return {
+        "$or": [{"deadline_at": {"$gte": now or datetime.utcnow()}}, {"deadline_at": None}],
+        "structured_eligibility": {"$nin": [None, {}]},
+        "form_url": {"$nin": [None, ""]}
+    }
+
+
+def prepare_catalog(directory: str) -> dict:
+    """
+    Phase one: compile every open, preprocessed tender once and persist the
+    programs for the worker processes. Returns the manifest summary.
+    """
+    os.makedirs(directory, exist_ok=True)
+    # Sorted so tender shards (index ranges into the catalog) mean the same thing on every host
+    catalog = list(tenders.find(_open_tenders_query(), CATALOG_PROJECTION).sort("_id", 1))
+
+    # Register categories and company keywords up front so workers only read the similarity table
+    keywords = set()
+    for company in companies.find({}, {"features.keywords": 1, "businessCapabilities": 1, "tenderExperience": 1}):
+        keywords.update(company_keywords(company))
+    add_terms(
+        categories=sorted({c for t in catalog for c in t.get("business_category", [])}),
+        keywords=sorted(keywords)
+    )
+
+    # One encode pass over every eligibility text warms the embedding cache for compile_eligibility
+    texts = set()
+    for tender in catalog:
+        structured = tender["structured_eligibility"]
+        texts.update(d.lower() for d in structured.get("required_documents", []))
+        texts.update(c.lower() for c in structured.get("certifications", []))
+    if texts:
+        get_embeddings(sorted(texts))
+
+    entries = []
+    blocks = []
+    rows = 0
+    for tender in catalog:
+        program = compile_eligibility(tender.pop("structured_eligibility"))
+        for key in VECTOR_KEYS + ("criteria_vector",):
+            vectors = program.pop(key)
+            if vectors is None:
+                program[key] = None
+                continue
+            vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+            program[key] = (rows, rows + len(vectors))
+            blocks.append(vectors)
+            rows += len(vectors)
+
+        entries.append({
+            "tender": tender,
+            "categories": {normalize_term(c) for c in tender.get("business_category", []) if normalize_term(c)},
+            "program": program,
+        })
+
+    vectors_path = os.path.join(directory, "program_vectors.npy")
+    np.save(vectors_path, np.vstack(blocks) if blocks else np.zeros((0, 0), dtype=np.float32))
+    with open(os.path.join(directory, "catalog.pkl"), "wb") as f:
+        pickle.dump({"entries": entries, "rows": rows, "built_at": datetime.utcnow()}, f)
+
+    print(f"📦 Catalog prepared: {len(entries)} tenders, {rows} eligibility vectors")
+    return {"tenders": len(entries), "vectors": rows, "directory": directory}
+
+
+def load_catalog(directory: str):
+    """Manifest plus the program vectors mapped read-only, shared by every worker on the box."""
+    with open(os.path.join(directory, "catalog.pkl"), "rb") as f:
+        manifest = pickle.load(f)
+    vectors_path = os.path.join(directory, "program_vectors.npy")
+    vectors = np.load(vectors_path, mmap_mode="r") if manifest["rows"] else np.zeros((0, 0), dtype=np.float32)
+    return manifest["entries"], vectors
+
+
+def _program(entry: dict, vectors) -> dict:
+    program = dict(entry["program"])
+    for key in VECTOR_KEYS:
+        if program[key] is not None:
+            start, end = program[key]
+            program[key] = vectors[start:end]
+    if program["criteria_vector"] is not None:
+        start, _ = program["criteria_vector"]
+        program["criteria_vector"] = vectors[start]
+    return program
+
+
+def shard_company_ids(company_ids, shard_size: int = MATCH_SHARD_SIZE):
+    company_ids = list(company_ids)
+    return [company_ids[i:i + shard_size] for i in range(0, len(company_ids), shard_size)]
+
+
+def shard_tender_ranges(tender_count: int, shard_size: int = MATCH_TENDER_SHARD_SIZE):
+    """[start, end) index ranges into the catalog; a single range when it fits one shard."""
+    return [[i, min(i + shard_size, tender_count)] for i in range(0, tender_count, shard_size)] or [[0, 0]]
+
+
+def match_company_shard(directory: str, company_ids, threshold: float = 60.0, heartbeat=None,
+                        tender_range=None) -> list:
+    """
+    Phase two for one shard of companies against one range of the catalog:
+    category filter, batched eligibility evaluation, and idempotent upserts
+    into the matches table. Returns per-company counts for that range.
+
+    `heartbeat`, when given, is called with tender progress periodically;
+    returning False aborts the shard because its lease was lost.
+    """
+    entries, vectors = load_catalog(directory)
+    if tender_range:
+        entries = entries[tender_range[0]:tender_range[1]]
+    shard = list(companies.find({"_id": {"$in": [ObjectId(str(i)) for i in company_ids]}}))
+    if not shard:
+        return []
+
+    table = build_company_table(shard)
+    matched_categories = [similar_categories(company_keywords(c), CATEGORY_THRESHOLD) for c in shard]
+    filtered = np.zeros(len(shard), dtype=np.int64)
+    matched = np.zeros(len(shard), dtype=np.int64)
+    documents = []
+
+    for position, entry in enumerate(entries, 1):
+        candidates = np.array([bool(entry["categories"] & cats) for cats in matched_categories])
+        if candidates.any():
+            evaluation = evaluate(_program(entry, vectors), table)
+            for i in np.flatnonzero(candidates):
+                result = result_for(evaluation, i)
+                filtered[i] += 1
+                matched[i] += result["matching_score"] >= threshold
+                documents.append(match_document(shard[i], entry["tender"], result))
+
+        if len(documents) >= WRITE_BATCH_SIZE:
+            upsert_matches(documents)
+            documents = []
+        if heartbeat and position % HEARTBEAT_EVERY == 0:
+            if heartbeat({"tenders_done": position, "tenders_total": len(entries)}) is False:
+                raise RuntimeError("Lease lost to another worker")
+    upsert_matches(documents)
+
+    print(f"✅ Shard of {len(shard)} companies x {len(entries)} tenders: "
+          f"{int(filtered.sum())} pairs scored, {int(matched.sum())} matches")
+    return [
+        {
+            "company_id": str(company["_id"]),
+            "user_id": company.get("user_id"),
+            "company_name": company.get("companyDetails", {}).get("companyName", "Unknown"),
+            "total_filtered": int(filtered[i]),
+            "total_matches": int(matched[i]),
+        }
+        for i, company in enumerate(shard)
+    ]
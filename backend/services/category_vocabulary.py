@@ -0,0 +1,222 @@
+from datetime import datetime
+from pymongo import UpdateOne
+import numpy as np
+from core.database import db
+from services.embedding_cache import get_embeddings
+
+# Collections
+vocabulary = db.get_collection("category_vocabulary")
+similarity_table = db.get_collection("category_similarity")
+vocabulary_meta = db.get_collection("category_vocabulary_meta")
+
+# keyword -> {category: score}, valid for the vocabulary version it was read at
+_similarity_cache = {}
+_cache_version = None
+
+
+def normalize_term(term: str) -> str:
+    """Lowercase and collapse whitespace so the same category is stored once."""
+    return " ".join(str(term).strip().lower().split())
+
+
+def get_vocabulary_version() -> int:
+    meta = vocabulary_meta.find_one({"_id": "version"})
+    return meta["value"] if meta else 0
+
+
+def _encode(terms):
+    embeddings = get_embeddings(terms)
+    return embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+
+def _load_embeddings(kind: str, terms=None):
+    query = {"kinds": kind}
+    if terms is not None:
+        query["term"] = {"$in": list(terms)}
+    terms, vectors = [], []
+    for doc in vocabulary.find(query, {"term": 1, "embedding": 1}):
+        terms.append(doc["term"])
+        vectors.append(doc["embedding"])
+    return terms, np.asarray(vectors, dtype=np.float32)
+
+
+def _similarity_updates(keywords, keyword_vectors, categories, category_vectors):
+    if not keywords or not categories:
+        return []
+    scores = keyword_vectors @ category_vectors.T
+    return [
+        UpdateOne(
+            {"keyword": keyword, "category": category},
+            {"$set": {"score": float(scores[i, j])}},
+            upsert=True
+        )
+        for i, keyword in enumerate(keywords)
+        for j, category in enumerate(categories)
+    ]
+
+
+def _write_pairs(new_keywords, new_categories, vectors, keywords, keyword_vectors, categories, category_vectors):
+    """Similarity rows for new keywords x `categories` and `keywords` x new categories."""
+    updates = []
+    if new_keywords:
+        updates += _similarity_updates(
+            new_keywords, np.stack([vectors[t] for t in new_keywords]),
+            categories, category_vectors
+        )
+    if new_categories:
+        fresh = set(new_keywords)
+        old_rows = [i for i, k in enumerate(keywords) if k not in fresh]
+        updates += _similarity_updates(
+            [keywords[i] for i in old_rows], keyword_vectors[old_rows] if old_rows else None,
+            new_categories, np.stack([vectors[t] for t in new_categories])
+        )
+    if updates:
+        similarity_table.bulk_write(updates, ordered=False)
+
+
+def add_terms(categories=(), keywords=()):
+    """
+    Add tender categories and company keywords to the vocabulary.
+
+    Only terms that are new for their kind are encoded, and only the rows and
+    columns of the similarity table that involve them are computed.
+    Returns the number of new (term, kind) entries.
+    """
+    wanted = {}
+    for kind, terms in (("category", categories), ("keyword", keywords)):
+        for raw in terms or []:
+            term = normalize_term(raw)
+            if term:
+                # Variants keep the exact stored spelling so $in on business_category matches
+                wanted.setdefault((term, kind), set()).add(str(raw))
+
+    if not wanted:
+        return 0
+
+    existing = {
+        doc["term"]: doc
+        for doc in vocabulary.find(
+            {"term": {"$in": list({term for term, _ in wanted})}},
+            {"term": 1, "kinds": 1, "embedding": 1, "variants": 1}
+        )
+    }
+
+    new_entries = [(term, kind) for term, kind in wanted if kind not in existing.get(term, {}).get("kinds", [])]
+
+    # Remember raw spellings so category lookups can hit the business_category index
+    variant_updates = [
+        UpdateOne({"term": term}, {"$addToSet": {"variants": {"$each": sorted(unseen)}}})
+        for (term, kind), raws in wanted.items()
+        if kind == "category" and term in existing
+        for unseen in [raws - set(existing[term].get("variants", []))]
+        if unseen
+    ]
+    if variant_updates:
+        vocabulary.bulk_write(variant_updates, ordered=False)
+
+    if not new_entries:
+        return 0
+
+    to_encode = sorted({term for term, _ in new_entries if term not in existing})
+    vectors = dict(zip(to_encode, _encode(to_encode))) if to_encode else {}
+    for term, doc in existing.items():
+        vectors.setdefault(term, np.asarray(doc["embedding"], dtype=np.float32))
+
+    now = datetime.utcnow()
+    vocabulary.bulk_write([
+        UpdateOne(
+            {"term": term},
+            {
+                "$addToSet": {
+                    "kinds": kind,
+                    "variants": {"$each": sorted(wanted[(term, kind)]) if kind == "category" else []}
+                },
+                "$setOnInsert": {"embedding": vectors[term].tolist(), "created_at": now}
+            },
+            upsert=True
+        )
+        for term, kind in new_entries
+    ], ordered=False)
+
+    new_keywords = sorted({term for term, kind in new_entries if kind == "keyword"})
+    new_categories = sorted({term for term, kind in new_entries if kind == "category"})
+
+    all_keywords, keyword_vectors = _load_embeddings("keyword")
+    all_categories, category_vectors = _load_embeddings("category")
+    _write_pairs(new_keywords, new_categories, vectors, all_keywords, keyword_vectors, all_categories, category_vectors)
+
+    # A concurrent call may have added terms of the other kind after the reads
+    # above and, from its own snapshot, missed ours; re-read and pair any late ones
+    late_keywords = set(vocabulary.distinct("term", {"kinds": "keyword"})) - set(all_keywords) if new_categories else set()
+    late_categories = set(vocabulary.distinct("term", {"kinds": "category"})) - set(all_categories) if new_keywords else set()
+    if late_keywords or late_categories:
+        late_keyword_terms, late_keyword_vectors = _load_embeddings("keyword", late_keywords)
+        late_category_terms, late_category_vectors = _load_embeddings("category", late_categories)
+        _write_pairs(new_keywords, new_categories, vectors, late_keyword_terms, late_keyword_vectors,
+                     late_category_terms, late_category_vectors)
+
+    vocabulary_meta.update_one({"_id": "version"}, {"$inc": {"value": 1}}, upsert=True)
+    print(f"📚 Vocabulary updated: +{len(new_keywords)} keywords, +{len(new_categories)} categories")
+    return len(new_entries)
+
+
+def similar_categories(keywords, threshold=0.6):
+    """
+    Return the normalized tender categories whose similarity with any of the
+    given company keywords is at least `threshold`, using the precomputed table.
+    Nothing is encoded or written; keywords not in the vocabulary match nothing.
+    """
+    global _similarity_cache, _cache_version
+
+    terms = sorted({normalize_term(k) for k in keywords if normalize_term(k)})
+    if not terms:
+        return set()
+
+    version = get_vocabulary_version()
+    if version != _cache_version:
+        _similarity_cache = {}
+        _cache_version = version
+
+    missing = [t for t in terms if t not in _similarity_cache]
+    if missing:
+        # Read-only: keywords are added at profile save and by the `vocabulary` backfill.
+        # Terms not in the table yet match nothing rather than being encoded here.
+        for term in missing:
+            _similarity_cache[term] = {}
+        for row in similarity_table.find({"keyword": {"$in": missing}}, {"_id": 0}):
+            _similarity_cache[row["keyword"]][row["category"]] = row["score"]
+
+    return {
+        category
+        for term in terms
+        for category, score in _similarity_cache[term].items()
+        if score >= threshold
+    }
+
+
+def similar_keywords(categories, threshold=0.6):
+    """Reverse lookup: company keywords within `threshold` of any given tender category."""
+    terms = [normalize_term(c) for c in categories if normalize_term(c)]
+    if not terms:
+        return set()
+    return {
+        row["keyword"]
+        for row in similarity_table.find({"category": {"$in": terms}, "score": {"$gte": threshold}}, {"keyword": 1})
+    }
+
+
+def category_variants(categories):
+    """Raw business_category spellings stored for the given normalized categories."""
+    variants = set()
+    for doc in vocabulary.find({"term": {"$in": list(categories)}}, {"variants": 1}):
+        variants.update(doc.get("variants", []))
+    return sorted(variants)
+
+
+def rebuild_vocabulary(tenders_collection, companies_collection, get_keywords):
+    """Backfill the vocabulary from every stored tender and company profile."""
+    categories = tenders_collection.distinct("business_category")
+    keywords = []
+    for company in companies_collection.find({}, {"businessCapabilities": 1, "tenderExperience": 1}):
+        keywords.extend(get_keywords(company))
+    return add_terms(categories=categories, keywords=keywords)
@@ -0,0 +1,168 @@
+import re
+from datetime import datetime
+import numpy as np
+from services.basic_filter import get_company_categories
+from services.embedding_cache import get_embeddings
+
+FEATURES_VERSION = 3
+
+AMOUNT_UNITS = {
+    "cr": 1e7, "crore": 1e7, "crores": 1e7,
+    "l": 1e5, "lac": 1e5, "lacs": 1e5, "lakh": 1e5, "lakhs": 1e5,
+    "k": 1e3, "thousand": 1e3,
+    "m": 1e6, "mn": 1e6, "million": 1e6,
+    "b": 1e9, "bn": 1e9, "billion": 1e9,
+}
+
+# Documents a company can be assumed to hold given its declared registrations
+DECLARED_DOCUMENTS = [
+    (("financialLegalInfo", "hasPan"), "PAN card"),
+    (("financialLegalInfo", "hasGstin"), "GST registration certificate"),
+    (("financialLegalInfo", "hasMsmeUdyam"), "MSME Udyam registration certificate"),
+    (("financialLegalInfo", "hasNsic"), "NSIC registration certificate"),
+    (("geographicDigitalReach", "hasDigitalSignature"), "Digital signature certificate"),
+    (("geographicDigitalReach", "hasImportLicense"), "Import license"),
+    (("geographicDigitalReach", "hasExportLicense"), "Export license"),
+]
+
+
+def parse_amount(value) -> float:
+    """
+    Parse amounts typed into the profile form: '50,00,000', '₹ 2.5 Cr',
+    '75 lakhs', '1.2 million'. Returns 0.0 when nothing numeric is found.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value:
+        return 0.0
+
+    text = str(value).lower().replace(",", "")
+    match = re.search(r"(\d+(?:\.\d+)?)\s*([a-z]+)?", text)
+    if not match:
+        return 0.0
+
+    amount = float(match.group(1))
+    unit = match.group(2)
+    if unit in AMOUNT_UNITS:
+        amount *= AMOUNT_UNITS[unit]
+    return amount
+
+
+def _split(value) -> list:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def _parse_date(value):
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value.replace(tzinfo=None)
+
+
+def years_since(value) -> int:
+    """Whole years from a date (or ISO string) to today; 0 when it is missing."""
+    value = _parse_date(value)
+    if value is None:
+        return 0
+    today = datetime.utcnow()
+    years = today.year - value.year - ((today.month, today.day) < (value.month, value.day))
+    return max(years, 0)
+
+
+def _unit_vectors(texts) -> list:
+    if not texts:
+        return []
+    vectors = get_embeddings(texts)
+    vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    return vectors.tolist()
+
+
+def build_company_features(profile: dict) -> dict:
+    """
+    Normalized, typed feature record the matcher reads instead of the raw
+    registration payload. Built once when the profile is saved.
+    """
+    details = profile.get("companyDetails", {}) or {}
+    caps = profile.get("businessCapabilities", {}) or {}
+    financial = profile.get("financialLegalInfo", {}) or {}
+    experience = profile.get("tenderExperience", {}) or {}
+    reach = profile.get("geographicDigitalReach", {}) or {}
+
+    turnovers = [
+        {"financialYear": entry.get("financialYear"), "amount": parse_amount(entry.get("amount"))}
+        for entry in financial.get("annualTurnovers", []) or []
+    ]
+
+    certifications = [] if caps.get("hasNoCertifications") else _split(caps.get("certifications"))
+    documents = [
+        name for (section, key), name in DECLARED_DOCUMENTS
+        if (profile.get(section, {}) or {}).get(key)
+    ] + certifications
+    keywords = get_company_categories(profile)
+    description = ". ".join(
+        caps.get(key) for key in ("businessRoles", "industrySectors", "productServiceKeywords", "technicalCapabilities")
+        if caps.get(key)
+    )
+
+    return {
+        "version": FEATURES_VERSION,
+        "built_at": datetime.utcnow(),
+        "pan": bool(financial.get("hasPan")),
+        "gstin": bool(financial.get("hasGstin")),
+        "msme_udyam": bool(financial.get("hasMsmeUdyam")),
+        "nsic": bool(financial.get("hasNsic")),
+        "registration_on_gem": bool(reach.get("registeredOnPortals")),
+        "digital_signature": bool(reach.get("hasDigitalSignature")),
+        "blacklisted": bool(financial.get("isBlacklistedOrLitigation")),
+        "supplied_to_govt_psus": bool(experience.get("suppliedToGovtPsus")),
+        # Years of experience are derived from this at scoring time, so they never go stale
+        "established_on": _parse_date(details.get("dateOfEstablishment")),
+        "annual_turnover": turnovers[0]["amount"] if turnovers else 0.0,
+        "annual_turnovers": turnovers,
+        "net_worth": parse_amount(financial.get("netWorthAmount")),
+        "highest_order_value": float(experience.get("highestOrderValueFulfilled") or 0),
+        "certifications": certifications,
+        "documents_available": documents,
+        "keywords": keywords,
+        "description": description,
+        "embeddings": {
+            "certifications": _unit_vectors([c.lower() for c in certifications]),
+            "documents_available": _unit_vectors([d.lower() for d in documents]),
+            "keywords": _unit_vectors(keywords),
+            "description": _unit_vectors([description.lower()])[0] if description else None,
+        },
+    }
+
+
+def company_features(company: dict) -> dict:
+    """The stored feature record, or the raw document for profiles saved before it existed."""
+    features = company.get("features")
+    if not features:
+        return company
+    if "established_on" in features:
+        return {**features, "experience_years": years_since(features["established_on"])}
+    return features
+
+
+def company_keywords(company: dict) -> list:
+    """Category keywords from the feature record, falling back to parsing the raw profile."""
+    features = company.get("features") or {}
+    if features.get("keywords"):
+        return features["keywords"]
+    return get_company_categories(company)
+
+
+def known_vectors(features: dict) -> dict:
+    """Lowercased text -> stored unit vector, for the texts pre-embedded at registration."""
+    embeddings = features.get("embeddings") or {}
+    vectors = {}
+    for key in ("certifications", "documents_available"):
+        for text, vector in zip(features.get(key, []), embeddings.get(key, [])):
+            vectors[text.lower()] = np.asarray(vector, dtype=np.float32)
+    if embeddings.get("description") is not None:
+        vectors[features.get("description", "").lower()] = np.asarray(embeddings["description"], dtype=np.float32)
+    return vectors
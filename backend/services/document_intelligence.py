@@ -0,0 +1,111 @@
+"""
+Concurrent eligibility extraction over Azure Document Intelligence.
+
+One async client (and its aiohttp connection pool) is shared by every
+analysis in a batch. A semaphore bounds how many analyses are in flight, a
+rate limiter spaces out new submissions, and each poller checks its
+operation every DOC_INTEL_POLL_SECONDS. Documents are downloaded and hashed
+first, and only layouts missing from the layout cache are analyzed.
+
+Point AZURE_DOC_INTEL_ENDPOINT at `python -m services.fake_document_intelligence`
+to exercise it locally.
+"""
+
+import asyncio
+import os
+import time
+import httpx
+from azure.core.credentials import AzureKeyCredential
+from azure.ai.documentintelligence.aio import DocumentIntelligenceClient
+from azure.ai.documentintelligence.models import AnalyzeDocumentRequest
+from services.eligibility_extractor import (
+    endpoint, key, require_credentials, eligibility_section, DOC_INTEL_POLL_SECONDS, DOC_DOWNLOAD_TIMEOUT
+)
+from services.layout_cache import layout_cache, content_hash, paragraph_tuples
+
+DOC_INTEL_CONCURRENCY = int(os.getenv("DOC_INTEL_CONCURRENCY", "16"))
+# Azure's standard tier accepts 15 analyze requests per second
+DOC_INTEL_RATE_PER_SECOND = float(os.getenv("DOC_INTEL_RATE_PER_SECOND", "15"))
+
+
+class AsyncRateLimiter:
+    """Spaces request starts at least 1/rate seconds apart."""
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second and per_second > 0 else 0.0
+        self._lock = asyncio.Lock()
+        self._next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class LayoutExtractor:
+    """Runs many prebuilt-layout analyses concurrently through one shared client."""
+
+    def __init__(self, concurrency: int = DOC_INTEL_CONCURRENCY, rate_per_second: float = DOC_INTEL_RATE_PER_SECOND,
+                 poll_seconds: float = DOC_INTEL_POLL_SECONDS):
+        require_credentials()
+        self.client = DocumentIntelligenceClient(endpoint=endpoint, credential=AzureKeyCredential(key))
+        self.http = httpx.AsyncClient(timeout=DOC_DOWNLOAD_TIMEOUT, follow_redirects=True)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.limiter = AsyncRateLimiter(rate_per_second)
+        self.poll_seconds = poll_seconds
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.http.aclose()
+        await self.client.close()
+
+    async def analyze_url(self, url: str) -> list:
+        """Layout paragraphs for the document at `url`, as (role, content) pairs."""
+        async with self.semaphore:
+            response = await self.http.get(url)
+            response.raise_for_status()
+            data = response.content
+            digest = content_hash(data)
+
+            paragraphs = layout_cache.get(digest)
+            if paragraphs is None:
+                await self.limiter.wait()
+                poller = await self.client.begin_analyze_document(
+                    model_id="prebuilt-layout",
+                    body=AnalyzeDocumentRequest(bytes_source=data),
+                    polling_interval=self.poll_seconds
+                )
+                result = await poller.result()
+                paragraphs = paragraph_tuples(result.paragraphs)
+                layout_cache.put(digest, paragraphs)
+        layout_cache.remember_url(url, digest)
+        return paragraphs
+
+    async def extract_eligibility_text(self, url: str) -> str:
+        return eligibility_section(await self.analyze_url(url))
+
+    async def extract_many(self, urls) -> dict:
+        """url -> eligibility text, or the exception that analysis raised."""
+        urls = list(dict.fromkeys(urls))
+        results = await asyncio.gather(
+            *(self.extract_eligibility_text(url) for url in urls),
+            return_exceptions=True
+        )
+        return dict(zip(urls, results))
+
+
+def extract_eligibility_texts(urls, concurrency: int = DOC_INTEL_CONCURRENCY,
+                              rate_per_second: float = DOC_INTEL_RATE_PER_SECOND) -> dict:
+    """Blocking entry point for pipelines: extract a batch of URLs concurrently."""
+    async def run():
+        async with LayoutExtractor(concurrency, rate_per_second) as extractor:
+            return await extractor.extract_many(urls)
+
+    return asyncio.run(run())
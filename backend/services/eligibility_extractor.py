@@ -1,15 +1,24 @@
 # eligibility_extractor.py
 import re
 import os
+import requests
 from azure.core.credentials import AzureKeyCredential
 from azure.ai.documentintelligence import DocumentIntelligenceClient
 from azure.ai.documentintelligence.models import AnalyzeResult, AnalyzeDocumentRequest
 from dotenv import load_dotenv
+from services.layout_cache import layout_cache, content_hash, paragraph_tuples
 load_dotenv()
 endpoint = os.getenv("AZURE_DOC_INTEL_ENDPOINT")
 key = os.getenv("AZURE_DOC_INTEL_KEY")
-if not key or not isinstance(key, str):
-    raise ValueError("AZURE_DOC_INTEL_KEY is not set or not a string")
+# Seconds between operation status checks; layout analysis usually finishes in a few seconds
+DOC_INTEL_POLL_SECONDS = float(os.getenv("DOC_INTEL_POLL_SECONDS", "1"))
+DOC_DOWNLOAD_TIMEOUT = float(os.getenv("DOC_DOWNLOAD_TIMEOUT", "60"))
+
+def require_credentials():
+    # Checked when a client is built, so cached layouts can be re-sliced without Azure access
+    if not key or not isinstance(key, str):
+        raise ValueError("AZURE_DOC_INTEL_KEY is not set or not a string")
+
 patterns = [  # same as yours
             r"eligibility criteria",
             r"eligibility requirements",
@@ -93,30 +102,59 @@ def is_eligibility_heading(text):
             return True
     return False
 
-def extract_eligibility_text_from_url(formUrl: str) -> str:
-    client = DocumentIntelligenceClient(
-        endpoint=endpoint,
-        credential=AzureKeyCredential(key)
-    )
-    poller = client.begin_analyze_document(
-        model_id="prebuilt-layout",
-        body=AnalyzeDocumentRequest(url_source=formUrl)
-    )
-    result: AnalyzeResult = poller.result()
-    paragraphs = result.paragraphs or []
-    headings = [(i, p) for i, p in enumerate(paragraphs) if p.role in ("title", "sectionHeading")]
+_client = None
+
+def get_client() -> DocumentIntelligenceClient:
+    """One client per process, so its HTTP connection pool is reused across calls"""
+    global _client
+    if _client is None:
+        require_credentials()
+        _client = DocumentIntelligenceClient(
+            endpoint=endpoint,
+            credential=AzureKeyCredential(key)
+        )
+    return _client
+
+def eligibility_section(paragraphs) -> str:
+    """Slice the eligibility section out of layout paragraphs given as (role, content) pairs"""
+    paragraphs = paragraphs or []
+    headings = [i for i, (role, _) in enumerate(paragraphs) if role in ("title", "sectionHeading")]
 
-    for idx, (para_idx, para) in enumerate(headings):
-        if is_eligibility_heading(para.content):
-            start_idx = para_idx + 1
-            end_idx = headings[idx + 1][0] if idx + 1 < len(headings) else len(paragraphs)
-            section_text = "\n".join(p.content.strip() for p in paragraphs[start_idx:end_idx])
-            return section_text
+    for idx, para_idx in enumerate(headings):
+        if is_eligibility_heading(paragraphs[para_idx][1]):
+            end_idx = headings[idx + 1] if idx + 1 < len(headings) else len(paragraphs)
+            return "\n".join(content.strip() for _, content in paragraphs[para_idx + 1:end_idx])
 
-    for i, p in enumerate(paragraphs):
-        if is_eligibility_heading(p.content):
-            next_heading = next((h[0] for h in headings if h[0] > i), len(paragraphs))
-            section_text = "\n".join(p.content.strip() for p in paragraphs[i + 1:next_heading])
-            return section_text
+    for i, (_, text) in enumerate(paragraphs):
+        if is_eligibility_heading(text):
+            next_heading = next((h for h in headings if h > i), len(paragraphs))
+            return "\n".join(content.strip() for _, content in paragraphs[i + 1:next_heading])
 
     return ""
+
+def analyze_layout(formUrl: str) -> list:
+    """
+    Layout paragraphs of the document at formUrl as (role, content) pairs.
+    The PDF is downloaded and hashed first; only content not already in the
+    layout cache is sent to Document Intelligence.
+    """
+    response = requests.get(formUrl, timeout=DOC_DOWNLOAD_TIMEOUT)
+    response.raise_for_status()
+    data = response.content
+    digest = content_hash(data)
+
+    paragraphs = layout_cache.get(digest)
+    if paragraphs is None:
+        poller = get_client().begin_analyze_document(
+            model_id="prebuilt-layout",
+            body=AnalyzeDocumentRequest(bytes_source=data),
+            polling_interval=DOC_INTEL_POLL_SECONDS
+        )
+        result: AnalyzeResult = poller.result()
+        paragraphs = paragraph_tuples(result.paragraphs)
+        layout_cache.put(digest, paragraphs)
+    layout_cache.remember_url(formUrl, digest)
+    return paragraphs
+
+def extract_eligibility_text_from_url(formUrl: str) -> str:
+    return eligibility_section(analyze_layout(formUrl))
@@ -0,0 +1,270 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from core.database import db
+from services.basic_filter import load_raw_eligibility
+from services.match_pipeline import ensure_structured_eligibility
+from services.eligibility_extractor import eligibility_section
+from services.layout_cache import layout_cache
+
+# OCR + LLM eligibility extraction, run ahead of matching so users only read results
+tenders = db["filtered_tenders"]
+
+ELIGIBILITY_CONCURRENCY = int(os.getenv("ELIGIBILITY_CONCURRENCY", "4"))
+ELIGIBILITY_RETRIES = int(os.getenv("ELIGIBILITY_RETRIES", "3"))
+ELIGIBILITY_RATE_PER_MINUTE = float(os.getenv("ELIGIBILITY_RATE_PER_MINUTE", "30"))
+ELIGIBILITY_LEASE_SECONDS = int(os.getenv("ELIGIBILITY_LEASE_SECONDS", "900"))
+# Tenders claimed and sent through concurrent OCR together
+ELIGIBILITY_CHUNK_SIZE = int(os.getenv("ELIGIBILITY_CHUNK_SIZE", "100"))
+
+# eligibility_status values recorded on each tender
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+STATUS_EMPTY = "no_eligibility"
+STATUS_FAILED = "failed"
+
+
+class RateLimiter:
+    """Spaces calls evenly so at most `per_minute` start in any minute, across threads."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute and per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def pending_query(retry_failed: bool = False) -> dict:
+    """Tenders still lacking structured eligibility that no live worker holds."""
+    skipped = [STATUS_EMPTY] + ([] if retry_failed else [STATUS_FAILED])
+    return {
+        "$and": [
+            {"$or": [{"structured_eligibility": {"$exists": False}}, {"structured_eligibility": {}},
+                     {"structured_eligibility": None}]},
+            {"eligibility_status": {"$nin": skipped}},
+            {"$or": [
+                {"eligibility_status": {"$ne": STATUS_PROCESSING}},
+                {"eligibility_started_at": {"$lt": datetime.utcnow() - timedelta(seconds=ELIGIBILITY_LEASE_SECONDS)}}
+            ]}
+        ]
+    }
+
+
+def _claim(tender_id, retry_failed: bool):
+    query = pending_query(retry_failed)
+    query["_id"] = tender_id
+    return tenders.find_one_and_update(
+        query,
+        {"$set": {"eligibility_status": STATUS_PROCESSING, "eligibility_started_at": datetime.utcnow()}},
+        projection={"raw_eligibility": 0}
+    )
+
+
+def preprocess_tender(tender: dict, retries: int = ELIGIBILITY_RETRIES, limiter: RateLimiter = None) -> str:
+    """
+    Extract and parse one tender's eligibility with retries and exponential
+    backoff, recording the outcome in eligibility_status. Stages that already
+    succeeded are stored, so a retry resumes where the last attempt failed.
+    no_eligibility is only recorded when OCR found no eligibility section.
+    """
+    error = None
+    for attempt in range(1, retries + 1):
+        if limiter:
+            limiter.wait()
+        try:
+            structured_eligibility = ensure_structured_eligibility(tender)
+            if not structured_eligibility and load_raw_eligibility(tender["_id"]):
+                # The parser returns {} when the LLM is unreachable or answers with no JSON
+                raise ValueError("Eligibility text could not be parsed")
+            status = STATUS_DONE if structured_eligibility else STATUS_EMPTY
+            tenders.update_one({"_id": tender["_id"]}, {
+                "$set": {"eligibility_status": status, "eligibility_attempts": attempt,
+                         "eligibility_processed_at": datetime.utcnow()},
+                "$unset": {"eligibility_error": "", "eligibility_started_at": ""}
+            })
+            if structured_eligibility:
+                tender["structured_eligibility"] = structured_eligibility
+            return status
+        except Exception as e:
+            error = e
+            print(f"    ⚠️ Attempt {attempt}/{retries} failed for {tender.get('title')}: {e}")
+            if attempt < retries:
+                time.sleep(min(2 ** attempt, 60))
+
+    tenders.update_one({"_id": tender["_id"]}, {
+        "$set": {"eligibility_status": STATUS_FAILED, "eligibility_attempts": retries,
+                 "eligibility_error": str(error), "eligibility_processed_at": datetime.utcnow()},
+        "$unset": {"eligibility_started_at": ""}
+    })
+    return STATUS_FAILED
+
+
+def preprocess_if_pending(tender: dict) -> dict:
+    """
+    Preprocess one tender outside a pipeline run, under the same claim, and
+    return its structured eligibility ({} when another worker holds it or it
+    has none).
+    """
+    if tender.get("structured_eligibility"):
+        return tender["structured_eligibility"]
+
+    claimed = _claim(tender["_id"], retry_failed=False)
+    if not claimed:
+        return {}
+    preprocess_tender(claimed)
+    tender["structured_eligibility"] = claimed.get("structured_eligibility") or {}
+    return tender["structured_eligibility"]
+
+
+def _prefetch_layouts(claimed) -> set:
+    """
+    Run OCR for a chunk of claimed tenders concurrently through the async
+    extractor and store the raw eligibility text. Returns the ids of tenders
+    whose documents have no eligibility section; tenders whose extraction
+    fails here fall back to the per-tender path with its retries.
+    """
+    missing = {
+        t["_id"] for t in tenders.find(
+            {"_id": {"$in": [t["_id"] for t in claimed]},
+             "$or": [{"raw_eligibility": {"$exists": False}}, {"raw_eligibility": {"$in": [None, ""]}}]},
+            {"_id": 1}
+        )
+    }
+    by_url = {t["form_url"]: t for t in claimed if t["_id"] in missing}
+    if not by_url:
+        return set()
+
+    # Imported lazily: the async client needs aiohttp, which only preprocessing uses
+    from services.document_intelligence import extract_eligibility_texts
+    texts = extract_eligibility_texts(list(by_url))
+
+    empty = set()
+    for url, text in texts.items():
+        if isinstance(text, Exception):
+            print(f"    ⚠️ Layout extraction failed for {url}: {text}")
+        elif text:
+            tenders.update_one(
+                {"_id": by_url[url]["_id"]},
+                {"$set": {"raw_eligibility": text, "last_updated": datetime.utcnow()}}
+            )
+        else:
+            empty.add(by_url[url]["_id"])
+    print(f"📄 Extracted {len(texts)} layouts concurrently ({len(empty)} without eligibility)")
+    return empty
+
+
+def preprocess_tenders(concurrency: int = ELIGIBILITY_CONCURRENCY, retries: int = ELIGIBILITY_RETRIES,
+                       rate_per_minute: float = ELIGIBILITY_RATE_PER_MINUTE, retry_failed: bool = False,
+                       limit: int = None) -> dict:
+    """
+    Preprocess every tender missing raw or structured eligibility. Tenders are
+    claimed a chunk at a time, so several runs can share the backlog; each
+    chunk's OCR runs concurrently, then parsing runs on a thread pool.
+    """
+    cursor = tenders.find(pending_query(retry_failed), {"_id": 1}).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    tender_ids = [t["_id"] for t in cursor]
+    print(f"🧾 {len(tender_ids)} tenders need eligibility preprocessing")
+
+    limiter = RateLimiter(rate_per_minute)
+    counts = {STATUS_DONE: 0, STATUS_EMPTY: 0, STATUS_FAILED: 0, "skipped": 0}
+
+    def work(tender):
+        print(f"  Preprocessing: {tender.get('title', 'Unknown')}")
+        return preprocess_tender(tender, retries, limiter)
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        for offset in range(0, len(tender_ids), ELIGIBILITY_CHUNK_SIZE):
+            claimed = []
+            for tender_id in tender_ids[offset:offset + ELIGIBILITY_CHUNK_SIZE]:
+                tender = _claim(tender_id, retry_failed)
+                if not tender:
+                    counts["skipped"] += 1
+                elif not tender.get("form_url"):
+                    tenders.update_one({"_id": tender_id}, {
+                        "$set": {"eligibility_status": STATUS_EMPTY, "eligibility_processed_at": datetime.utcnow()},
+                        "$unset": {"eligibility_started_at": ""}
+                    })
+                    counts[STATUS_EMPTY] += 1
+                else:
+                    claimed.append(tender)
+
+            empty = set()
+            try:
+                empty = _prefetch_layouts(claimed)
+            except Exception as e:
+                print(f"    ⚠️ Concurrent extraction unavailable, falling back per tender: {e}")
+            if empty:
+                tenders.update_many({"_id": {"$in": list(empty)}}, {
+                    "$set": {"eligibility_status": STATUS_EMPTY, "eligibility_processed_at": datetime.utcnow()},
+                    "$unset": {"eligibility_started_at": ""}
+                })
+                counts[STATUS_EMPTY] += len(empty)
+                claimed = [tender for tender in claimed if tender["_id"] not in empty]
+
+            for future in as_completed([pool.submit(work, tender) for tender in claimed]):
+                try:
+                    counts[future.result()] += 1
+                except Exception as e:
+                    counts[STATUS_FAILED] += 1
+                    print(f"    ⚠️ Preprocessing error: {e}")
+
+    return {"total": len(tender_ids), **counts}
+
+
+def reslice_cached_layouts(apply: bool = False) -> dict:
+    """
+    Re-run heading detection over cached layouts, e.g. after editing the
+    heading patterns, without any OCR. With `apply`, tenders whose section
+    changed get the new raw text and lose their structured eligibility, so
+    the next preprocess run re-parses just those.
+    """
+    counts = {"cached": 0, "uncached": 0, "unchanged": 0, "changed": 0, "found": 0, "lost": 0}
+    for tender in tenders.find({"form_url": {"$nin": [None, ""]}}, {"form_url": 1, "raw_eligibility": 1}):
+        paragraphs = layout_cache.paragraphs_for_url(tender["form_url"])
+        if paragraphs is None:
+            counts["uncached"] += 1
+            continue
+        counts["cached"] += 1
+
+        old_text = tender.get("raw_eligibility") or ""
+        new_text = eligibility_section(paragraphs)
+        if new_text == old_text:
+            counts["unchanged"] += 1
+            continue
+        counts["changed"] += 1
+        if not old_text:
+            counts["found"] += 1
+        elif not new_text:
+            counts["lost"] += 1
+
+        if apply:
+            update = {
+                "$set": {"raw_eligibility": new_text, "last_updated": datetime.utcnow()},
+                "$unset": {"structured_eligibility": "", "eligibility_error": ""}
+            }
+            if new_text:
+                update["$unset"]["eligibility_status"] = ""
+            else:
+                update["$set"].update({"eligibility_status": STATUS_EMPTY, "eligibility_processed_at": datetime.utcnow()})
+            tenders.update_one({"_id": tender["_id"]}, update)
+    return counts
+
+
+def eligibility_status_counts() -> dict:
+    return {
+        (row["_id"] or "unprocessed"): row["count"]
+        for row in tenders.aggregate([{"$group": {"_id": "$eligibility_status", "count": {"$sum": 1}}}])
+    }
@@ -0,0 +1,180 @@
+import numpy as np
+from services.embedding_cache import get_embeddings
+from services.company_features import company_features, known_vectors
+
+# Field order matches compute_tender_match_score, so missing_fields come out identically
+FIELD_ORDER = [
+    "pan",
+    "gstin",
+    "registration_on_gem",
+    "experience",
+    "financial_requirements",
+    "blacklisting_or_litigation",
+    "required_documents",
+    "certifications",
+    "other_criteria",
+]
+BOOLEAN_FIELDS = ["pan", "gstin", "registration_on_gem"]
+
+PAIR_THRESHOLD = 0.75
+COVERAGE_THRESHOLD = 0.7
+CRITERIA_THRESHOLD = 0.7
+ELIGIBLE_SCORE = 70
+
+
+def _unit(vectors):
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def compile_eligibility(structured_eligibility: dict) -> dict:
+    """
+    Compile a tender's structured eligibility once into a flat predicate program
+    that can be evaluated against a whole company table.
+    """
+    experience = structured_eligibility.get("experience", {})
+    financial = structured_eligibility.get("financial_requirements", {})
+    other_criteria = structured_eligibility.get("other_criteria", {})
+
+    program = {
+        "required_flags": [
+            field for field in BOOLEAN_FIELDS
+            if structured_eligibility.get(field, {}).get("required", False)
+        ],
+        "min_years": (experience.get("minimum_years", 0) or 0) if experience.get("required", False) else None,
+        "min_turnover": (financial.get("minimum_turnover_amount", 0) or 0) if financial.get("annual_turnover_required", False) else None,
+        "blacklisting": bool(structured_eligibility.get("blacklisting_or_litigation", {}).get("mentioned", False)),
+        "documents": [d.lower() for d in structured_eligibility.get("required_documents", [])],
+        "certifications": [c.lower() for c in structured_eligibility.get("certifications", [])],
+        "criteria_text": " ".join(f"{k}: {v}" for k, v in other_criteria.items()).lower() if other_criteria else None,
+    }
+
+    for key in ("documents", "certifications"):
+        program[f"{key}_vectors"] = _unit(get_embeddings(program[key])) if program[key] else None
+    program["criteria_vector"] = _unit(get_embeddings([program["criteria_text"]]))[0] if program["criteria_text"] else None
+
+    return program
+
+
+def _membership(item_lists, known=None):
+    """Unique lowercased items plus a (companies x items) multiplicity matrix."""
+    vocabulary = {}
+    for items in item_lists:
+        for item in items:
+            vocabulary.setdefault(item.lower(), len(vocabulary))
+
+    matrix = np.zeros((len(item_lists), len(vocabulary)), dtype=np.float32)
+    for row, items in enumerate(item_lists):
+        for item in items:
+            matrix[row, vocabulary[item.lower()]] += 1
+
+    terms = list(vocabulary)
+    if not terms:
+        return matrix, None
+
+    known = known or {}
+    missing = [t for t in terms if t not in known]
+    encoded = dict(zip(missing, _unit(get_embeddings(missing)))) if missing else {}
+    vectors = np.stack([known[t] if t in known else encoded[t] for t in terms])
+    return matrix, vectors
+
+
+def build_company_table(companies) -> dict:
+    """
+    Columnar NumPy table of the company features the eligibility rules read.
+    Stored feature records and their vectors are used when present.
+    """
+    companies = [company_features(c) | {"_id": c.get("_id")} for c in companies]
+    known = {}
+    for c in companies:
+        known.update(known_vectors(c))
+
+    table = {
+        "ids": [str(c.get("_id")) for c in companies],
+        "size": len(companies),
+    }
+
+    for field in BOOLEAN_FIELDS:
+        table[field] = np.array([bool(c.get(field, False)) for c in companies], dtype=bool)
+    table["experience_years"] = np.array([float(c.get("experience_years", 0) or 0) for c in companies])
+    table["annual_turnover"] = np.array([float(c.get("annual_turnover", 0) or 0) for c in companies])
+
+    table["documents"], table["documents_vectors"] = _membership([c.get("documents_available", []) for c in companies], known)
+    table["certifications"], table["certifications_vectors"] = _membership([c.get("certifications", []) for c in companies], known)
+
+    descriptions = [c.get("description", "").lower() for c in companies]
+    missing = [d for d in dict.fromkeys(descriptions) if d not in known]
+    if missing:
+        known.update(zip(missing, _unit(get_embeddings(missing))))
+    table["description_vectors"] = np.stack([known[d] for d in descriptions]) if descriptions else None
+
+    return table
+
+
+def _coverage_passes(program, table, key):
+    tender_vectors = program[f"{key}_vectors"]
+    if tender_vectors is None:
+        return np.ones(table["size"], dtype=bool)
+    if table[f"{key}_vectors"] is None:
+        return np.zeros(table["size"], dtype=bool)
+
+    # Matching (tender item, company item) pairs, counted per company
+    hits_per_term = ((tender_vectors @ table[f"{key}_vectors"].T) > PAIR_THRESHOLD).sum(axis=0)
+    matched_pairs = table[key] @ hits_per_term
+    return matched_pairs / len(program[key]) >= COVERAGE_THRESHOLD
+
+
+def evaluate(program: dict, table: dict) -> dict:
+    """
+    Evaluate one compiled tender against every company in the table at once.
+    Returns per-field pass arrays, matching_score and eligible arrays.
+    """
+    size = table["size"]
+    passes = {}
+
+    for field in BOOLEAN_FIELDS:
+        passes[field] = table[field] if field in program["required_flags"] else np.ones(size, dtype=bool)
+
+    passes["experience"] = (
+        table["experience_years"] >= program["min_years"]
+        if program["min_years"] is not None else np.ones(size, dtype=bool)
+    )
+    passes["financial_requirements"] = (
+        table["annual_turnover"] >= program["min_turnover"]
+        if program["min_turnover"] is not None else np.ones(size, dtype=bool)
+    )
+    passes["blacklisting_or_litigation"] = np.full(size, not program["blacklisting"], dtype=bool)
+    passes["required_documents"] = _coverage_passes(program, table, "documents")
+    passes["certifications"] = _coverage_passes(program, table, "certifications")
+
+    if program["criteria_vector"] is None:
+        passes["other_criteria"] = np.ones(size, dtype=bool)
+    elif table["description_vectors"] is None:
+        passes["other_criteria"] = np.zeros(size, dtype=bool)
+    else:
+        passes["other_criteria"] = (table["description_vectors"] @ program["criteria_vector"]) > CRITERIA_THRESHOLD
+
+    points = np.sum([passes[field] for field in FIELD_ORDER], axis=0)
+    matching_score = np.round(points / len(FIELD_ORDER) * 100, 2)
+
+    return {
+        "passes": passes,
+        "matching_score": matching_score,
+        "eligible": matching_score >= ELIGIBLE_SCORE,
+    }
+
+
+def result_for(evaluation: dict, index: int) -> dict:
+    """Row `index` of an evaluation in compute_tender_match_score's result format."""
+    field_scores = {field: int(evaluation["passes"][field][index]) for field in FIELD_ORDER}
+    return {
+        "matching_score": float(evaluation["matching_score"][index]),
+        "eligible": bool(evaluation["eligible"][index]),
+        "field_scores": field_scores,
+        "missing_fields": [field for field in FIELD_ORDER if not field_scores[field]],
+    }
+
+
+def score_tender_against_companies(structured_eligibility: dict, table: dict):
+    """Compile once, evaluate once, and expand into one result per company."""
+    evaluation = evaluate(compile_eligibility(structured_eligibility), table)
+    return [result_for(evaluation, i) for i in range(table["size"])]
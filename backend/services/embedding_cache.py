@@ -0,0 +1,146 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from services.model_registry import DEFAULT_MODEL_NAME, model_cache_key
+from services.embedding_client import encode_texts, get_client_stats
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "storage/cache/embeddings.sqlite3")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))
+
+
+def normalize_text(text) -> str:
+    """Collapse whitespace; the tokenizer ignores it, so the vectors are identical."""
+    return " ".join(str(text).split())
+
+
+def text_key(model_name: str, text) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_cache_key(model_name)}:{digest}"
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (model name, normalized text hash).
+
+    The memory tier is a per-process LRU; the disk tier is a SQLite file shared
+    by every worker on the box and kept across restarts.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_items: int = EMBEDDING_CACHE_SIZE):
+        self.path = path
+        self.max_items = max_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER, vector BLOB)"
+            )
+        return self._conn
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def get_embeddings(self, texts, model_name: str = DEFAULT_MODEL_NAME) -> np.ndarray:
+        """
+        Return a float32 matrix with one row per input text, encoding only the
+        texts that are in neither tier.
+        """
+        texts = [normalize_text(t) for t in texts]
+        keys = [text_key(model_name, t) for t in texts]
+        found = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            self.memory_hits += sum(1 for key in keys if key in found)
+
+            wanted = {key for key in keys if key not in found}
+            if wanted:
+                conn = self._db()
+                pending = sorted(wanted)
+                for start in range(0, len(pending), 500):
+                    chunk = pending[start:start + 500]
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[key] = vector
+                        self._remember(key, vector)
+                self.disk_hits += sum(1 for key in keys if key in found and key in wanted)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+
+        if missing:
+            vectors = encode_texts(list(missing.values()), model_name)
+            with self._lock:
+                self.misses += sum(1 for key in keys if key in missing)
+                for key, vector in zip(missing, vectors):
+                    found[key] = vector
+                    self._remember(key, vector)
+                conn = self._db()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)",
+                    [(key, int(vector.shape[0]), vector.tobytes()) for key, vector in zip(missing, vectors)]
+                )
+                conn.commit()
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            disk_items = self._db().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "memory_capacity": self.max_items,
+                "disk_items": disk_items,
+                "disk_path": self.path,
+                "encoder": get_client_stats()
+            }
+
+
+embedding_cache = EmbeddingCache()
+
+
+def get_embeddings(texts, model_name: str = DEFAULT_MODEL_NAME) -> np.ndarray:
+    return embedding_cache.get_embeddings(texts, model_name)
+
+
+def cosine_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise cosine similarity between the rows of two embedding matrices."""
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return a @ b.T
+
+
+def get_cache_stats() -> dict:
+    return embedding_cache.stats()
@@ -0,0 +1,108 @@
+import json
+import os
+import socket
+import struct
+import threading
+import time
+import numpy as np
+from services.model_registry import DEFAULT_MODEL_NAME, get_model, model_cache_key
+
+# Empty disables the shared server; every worker then encodes in-process
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "")
+EMBEDDING_SERVER_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", "30"))
+EMBEDDING_SERVER_RETRY_AFTER = float(os.getenv("EMBEDDING_SERVER_RETRY_AFTER", "30"))
+
+HEADER = struct.Struct("!I")
+
+_local = threading.local()
+_server_down_until = 0.0
+_stats = {"remote_batches": 0, "local_batches": 0, "fallbacks": 0}
+
+
+def _recv_exact(sock, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Embedding server closed the connection")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv_frame(sock) -> bytes:
+    (size,) = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    return _recv_exact(sock, size)
+
+
+def _connection():
+    sock = getattr(_local, "sock", None)
+    if sock is None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(EMBEDDING_SERVER_TIMEOUT)
+        sock.connect(EMBEDDING_SERVER_SOCKET)
+        _local.sock = sock
+    return sock
+
+
+def _drop_connection():
+    sock = getattr(_local, "sock", None)
+    if sock is not None:
+        try:
+            sock.close()
+        except OSError:
+            pass
+    _local.sock = None
+
+
+def _encode_remote(texts, model_name: str) -> np.ndarray:
+    request = json.dumps({"model": model_name, "texts": list(texts)}).encode("utf-8")
+
+    for attempt in range(2):
+        try:
+            sock = _connection()
+            sock.sendall(HEADER.pack(len(request)) + request)
+            header = json.loads(_recv_frame(sock))
+            payload = _recv_frame(sock)
+            break
+        except (OSError, ConnectionError):
+            _drop_connection()
+            if attempt:
+                raise
+
+    if header.get("error"):
+        raise RuntimeError(header["error"])
+    if header.get("model_key") != model_cache_key(model_name):
+        raise RuntimeError(f"Embedding server runs {header.get('model_key')}, expected {model_cache_key(model_name)}")
+
+    return np.frombuffer(payload, dtype=np.float32).reshape(header["shape"])
+
+
+def encode_texts(texts, model_name: str = DEFAULT_MODEL_NAME) -> np.ndarray:
+    """
+    Encode through the shared embedding server when one is configured and up,
+    otherwise with the in-process model from the registry.
+    """
+    global _server_down_until
+
+    if EMBEDDING_SERVER_SOCKET and time.monotonic() >= _server_down_until:
+        try:
+            vectors = _encode_remote(texts, model_name)
+            _stats["remote_batches"] += 1
+            return vectors
+        except Exception as e:
+            _server_down_until = time.monotonic() + EMBEDDING_SERVER_RETRY_AFTER
+            _stats["fallbacks"] += 1
+            print(f"⚠️ Embedding server unavailable ({e}); encoding in-process for {EMBEDDING_SERVER_RETRY_AFTER:.0f}s")
+
+    _stats["local_batches"] += 1
+    model = get_model(model_name)
+    return np.asarray(model.encode(list(texts), batch_size=64, convert_to_numpy=True), dtype=np.float32)
+
+
+def get_client_stats() -> dict:
+    return {
+        "socket": EMBEDDING_SERVER_SOCKET or None,
+        "server_available": bool(EMBEDDING_SERVER_SOCKET) and time.monotonic() >= _server_down_until,
+        **_stats
+    }
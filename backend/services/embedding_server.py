@@ -0,0 +1,152 @@
+"""
+Local embedding server
+
+Run once per box so all uvicorn workers share a single model copy:
+
+    cd backend && python -m services.embedding_server
+
+Workers send encode requests over a Unix socket (EMBEDDING_SERVER_SOCKET).
+Requests that arrive within EMBEDDING_SERVER_MAX_WAIT_MS of each other are
+encoded together as one micro-batch of up to EMBEDDING_SERVER_MAX_BATCH texts.
+"""
+
+import asyncio
+import json
+import os
+import struct
+import time
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.model_registry import DEFAULT_MODEL_NAME, get_model, model_cache_key
+
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET") or "/tmp/tendorix-embeddings.sock"
+EMBEDDING_SERVER_MAX_BATCH = int(os.getenv("EMBEDDING_SERVER_MAX_BATCH", "256"))
+EMBEDDING_SERVER_MAX_WAIT_MS = float(os.getenv("EMBEDDING_SERVER_MAX_WAIT_MS", "5"))
+
+HEADER = struct.Struct("!I")
+
+
+async def read_frame(reader) -> bytes:
+    (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return await reader.readexactly(size)
+
+
+def frame(payload: bytes) -> bytes:
+    return HEADER.pack(len(payload)) + payload
+
+
+class MicroBatcher:
+    """Collects pending encode requests per model and runs them as one batch."""
+
+    def __init__(self, max_batch: int, max_wait_ms: float):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.texts = 0
+
+    async def encode(self, model_name: str, texts):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((model_name, texts, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            size = len(pending[0][1])
+            deadline = loop.time() + self.max_wait
+
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[1])
+
+            by_model = {}
+            for item in pending:
+                by_model.setdefault(item[0], []).append(item)
+
+            for model_name, items in by_model.items():
+                texts = [text for _, item_texts, _ in items for text in item_texts]
+                try:
+                    vectors = await loop.run_in_executor(None, self._encode, model_name, texts)
+                except Exception as e:
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                self.batches += 1
+                self.texts += len(texts)
+                offset = 0
+                for _, item_texts, future in items:
+                    if not future.done():
+                        future.set_result(vectors[offset:offset + len(item_texts)])
+                    offset += len(item_texts)
+
+    @staticmethod
+    def _encode(model_name: str, texts):
+        model = get_model(model_name)
+        return np.asarray(model.encode(texts, batch_size=64, convert_to_numpy=True), dtype=np.float32)
+
+
+async def handle_client(reader, writer, batcher: MicroBatcher):
+    try:
+        while True:
+            try:
+                request = json.loads(await read_frame(reader))
+            except asyncio.IncompleteReadError:
+                break
+
+            model_name = request.get("model") or DEFAULT_MODEL_NAME
+            texts = request.get("texts") or []
+            try:
+                vectors = await batcher.encode(model_name, texts) if texts else np.zeros((0, 0), dtype=np.float32)
+                header = {"shape": list(vectors.shape), "model_key": model_cache_key(model_name)}
+                payload = vectors.tobytes()
+            except Exception as e:
+                header = {"error": str(e)}
+                payload = b""
+
+            writer.write(frame(json.dumps(header).encode("utf-8")) + frame(payload))
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(socket_path: str = EMBEDDING_SERVER_SOCKET):
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    batcher = MicroBatcher(EMBEDDING_SERVER_MAX_BATCH, EMBEDDING_SERVER_MAX_WAIT_MS)
+    started = time.perf_counter()
+    get_model(DEFAULT_MODEL_NAME)
+    print(f"🧠 Model ready in {time.perf_counter() - started:.2f}s")
+
+    server = await asyncio.start_unix_server(
+        lambda r, w: handle_client(r, w, batcher),
+        path=socket_path
+    )
+    os.chmod(socket_path, 0o660)
+    print(f"🚀 Embedding server listening on {socket_path} "
+          f"(max batch {batcher.max_batch}, max wait {EMBEDDING_SERVER_MAX_WAIT_MS}ms)")
+
+    batch_task = asyncio.create_task(batcher.run())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve())
@@ -0,0 +1,82 @@
+"""
+Local stand-in for the Azure Document Intelligence layout API
+
+    cd backend && python -m services.fake_document_intelligence
+
+then set AZURE_DOC_INTEL_ENDPOINT=http://127.0.0.1:8765/ (any key works).
+It also serves placeholder PDFs at /documents/<name>.pdf to use as form URLs.
+Each analysis "runs" for FAKE_DOC_INTEL_LATENCY seconds and returns a small
+layout with an eligibility section, so extraction throughput, concurrency and
+rate limits can be measured without an Azure resource.
+"""
+
+import os
+import time
+import uuid
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+FAKE_DOC_INTEL_PORT = int(os.getenv("FAKE_DOC_INTEL_PORT", "8765"))
+FAKE_DOC_INTEL_LATENCY = float(os.getenv("FAKE_DOC_INTEL_LATENCY", "3"))
+
+app = FastAPI(title="Fake Document Intelligence")
+operations = {}
+
+
+def fake_paragraphs(url: str):
+    return [
+        {"role": "title", "content": f"Tender document {url.rsplit('/', 1)[-1]}"},
+        {"role": "sectionHeading", "content": "Scope of Work"},
+        {"content": "Supply and installation of equipment as per the schedule."},
+        {"role": "sectionHeading", "content": "Eligibility Criteria"},
+        {"content": "The bidder must have a valid PAN and GST registration."},
+        {"content": "Minimum 3 years of experience in similar work."},
+        {"content": "Average annual turnover of Rs. 50 lakhs in the last three financial years."},
+        {"content": "ISO 9001 certification is required."},
+        {"role": "sectionHeading", "content": "Submission of Bids"},
+        {"content": "Bids must be submitted online before the deadline."},
+    ]
+
+
+@app.get("/documents/{name}")
+async def document(name: str):
+    # Distinct bytes per name, so each document gets its own layout cache entry
+    return Response(content=b"%PDF-1.4\n% fake tender " + name.encode("utf-8") + b"\n%%EOF\n",
+                    media_type="application/pdf")
+
+
+@app.post("/documentintelligence/documentModels/{model_id}:analyze")
+async def analyze(model_id: str, request: Request):
+    body = await request.json()
+    operation_id = uuid.uuid4().hex
+    # The extractor sends document bytes (base64Source); urlSource is accepted too
+    source = body.get("urlSource") or f"upload-{len(body.get('base64Source', ''))}"
+    operations[operation_id] = {"url": source, "model_id": model_id, "started": time.monotonic()}
+    location = f"{str(request.base_url).rstrip('/')}/documentintelligence/documentModels/{model_id}/analyzeResults/{operation_id}"
+    return Response(status_code=202, headers={"Operation-Location": location, "Retry-After": "1"})
+
+
+@app.get("/documentintelligence/documentModels/{model_id}/analyzeResults/{operation_id}")
+async def analyze_result(model_id: str, operation_id: str):
+    operation = operations.get(operation_id)
+    if not operation:
+        return JSONResponse(status_code=404, content={"error": {"code": "NotFound", "message": "Unknown operation"}})
+
+    if time.monotonic() - operation["started"] < FAKE_DOC_INTEL_LATENCY:
+        return JSONResponse(content={"status": "running"}, headers={"Retry-After": "1"})
+
+    operations.pop(operation_id, None)
+    return JSONResponse(content={
+        "status": "succeeded",
+        "analyzeResult": {
+            "apiVersion": "2024-11-30",
+            "modelId": model_id,
+            "content": "",
+            "paragraphs": fake_paragraphs(operation["url"]),
+        }
+    })
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="127.0.0.1", port=FAKE_DOC_INTEL_PORT)
@@ -1,9 +1,6 @@
-from sentence_transformers import SentenceTransformer, util
+from services.embedding_cache import get_embeddings, cosine_matrix
 import numpy as np
 
-# Load lightweight model for field mapping
-model = SentenceTransformer('all-MiniLM-L6-v2')
-
 def map_fields_by_embedding(gemini_fields: list, backend_fields: list, backend_data: dict, threshold: float = 0.5):
     """
     Maps template fields to backend data fields using embedding similarity.
@@ -24,7 +21,7 @@ def map_fields_by_embedding(gemini_fields: list, backend_fields: list, backend_d
 
     # Embed backend fields
     try:
-        backend_embeddings = model.encode(backend_fields, convert_to_tensor=True)
+        backend_embeddings = get_embeddings(backend_fields)
     except Exception as e:
         print(f"❌ Error encoding backend fields: {e}")
         return mapped_data
@@ -35,10 +32,10 @@ def map_fields_by_embedding(gemini_fields: list, backend_fields: list, backend_d
 
         try:
             # Embed template field label/id
-            query_embedding = model.encode(label, convert_to_tensor=True)
+            query_embedding = get_embeddings([label])
 
             # Compute cosine similarities
-            cosine_scores = util.cos_sim(query_embedding, backend_embeddings)[0].cpu().numpy()
+            cosine_scores = cosine_matrix(query_embedding, backend_embeddings)[0]
             max_score_idx = np.argmax(cosine_scores)
             max_score = cosine_scores[max_score_idx]
 
@@ -89,7 +86,7 @@ def map_fields_with_confidence(gemini_fields: list, backend_fields: list, backen
         return mapped_data, mapping_details
 
     try:
-        backend_embeddings = model.encode(backend_fields, convert_to_tensor=True)
+        backend_embeddings = get_embeddings(backend_fields)
     except Exception as e:
         print(f"❌ Error encoding backend fields: {e}")
         return mapped_data, mapping_details
@@ -99,8 +96,8 @@ def map_fields_with_confidence(gemini_fields: list, backend_fields: list, backen
         label = field.get('label', field_id)
 
         try:
-            query_embedding = model.encode(label, convert_to_tensor=True)
-            cosine_scores = util.cos_sim(query_embedding, backend_embeddings)[0].cpu().numpy()
+            query_embedding = get_embeddings([label])
+            cosine_scores = cosine_matrix(query_embedding, backend_embeddings)[0]
             max_score_idx = np.argmax(cosine_scores)
             max_score = cosine_scores[max_score_idx]
 
@@ -0,0 +1,55 @@
+import hashlib
+import json
+from datetime import datetime
+from core.database import db
+from services.category_vocabulary import get_vocabulary_version
+
+# Cached filter results, keyed by company profile and tender catalog versions
+filter_cache = db.get_collection("filter_cache")
+catalog_meta = db.get_collection("catalog_meta")
+companies = db.get_collection("companies")
+
+
+def get_catalog_version() -> int:
+    meta = catalog_meta.find_one({"_id": "tenders"})
+    return meta["version"] if meta else 0
+
+
+def bump_catalog_version():
+    """Called whenever a tender is inserted or changed."""
+    catalog_meta.update_one(
+        {"_id": "tenders"},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def bump_profile_version(user_id: str):
+    """Called whenever a company profile is saved; drops its cached results."""
+    companies.update_one({"user_id": user_id}, {"$inc": {"profile_version": 1}})
+    profile = companies.find_one({"user_id": user_id}, {"_id": 1})
+    if profile:
+        filter_cache.delete_many({"company_id": str(profile["_id"])})
+
+
+def filter_cache_key(company_profile: dict) -> str:
+    parts = {
+        "company_id": str(company_profile["_id"]),
+        "profile_version": company_profile.get("profile_version", 0),
+        "catalog_version": get_catalog_version(),
+        "vocabulary_version": get_vocabulary_version()
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def get_cached_tender_ids(key: str):
+    entry = filter_cache.find_one({"_id": key}, {"tender_ids": 1})
+    return entry["tender_ids"] if entry else None
+
+
+def store_cached_tender_ids(key: str, company_id, tender_ids):
+    filter_cache.replace_one(
+        {"_id": key},
+        {"company_id": str(company_id), "tender_ids": list(tender_ids), "created_at": datetime.utcnow()},
+        upsert=True
+    )
@@ -0,0 +1,80 @@
+import uuid
+from datetime import datetime
+from core.database import db
+from services.match_pipeline import refresh_company_matches
+from services.match_runs import runs, last_high_water_mark
+from services.match_store import matches
+from services.reverse_matcher import reverse_match_tender
+
+companies = db["companies"]
+tenders = db["filtered_tenders"]
+
+
+def changed_company_ids(since) -> list:
+    """Profiles saved since the mark, plus any flagged stale by a profile update."""
+    query = {}
+    if since is not None:
+        query = {"$or": [
+            {"matches_stale_since": {"$ne": None}},
+            {"updated_at": {"$gte": since}},
+            {"created_at": {"$gte": since}}
+        ]}
+    return [c["_id"] for c in companies.find(query, {"_id": 1})]
+
+
+def changed_tender_ids(since, now) -> list:
+    """Open, preprocessed tenders inserted or re-extracted since the mark."""
+    query = {
+        "$and": [
+            {"$or": [{"deadline_at": {"$gte": now}}, {"deadline_at": None}]},
+            {"structured_eligibility": {"$nin": [None, {}]}},
+        ]
+    }
+    if since is not None:
+        query["$and"].append({"$or": [{"last_updated": {"$gte": since}}, {"created_at": {"$gte": since}}]})
+    return [t["_id"] for t in tenders.find(query, {"_id": 1})]
+
+
+def run_incremental_matching() -> dict:
+    """
+    Recompute only the (company, tender) pairs whose company or tender changed
+    since the last successful run, and drop expired tenders from the matches
+    table. The mark advances to this run's start time only when it succeeds,
+    so anything changed while it ran is picked up next time.
+    """
+    started_at = datetime.utcnow()
+    since = last_high_water_mark()
+    run_id = started_at.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+    runs.insert_one({"_id": run_id, "kind": "incremental", "status": "running", "since": since,
+                     "created_at": started_at, "updated_at": started_at})
+    print(f"🆔 Incremental run {run_id}: changes since {since or 'the beginning'}")
+
+    stats = {"expired_removed": 0, "companies": 0, "tenders": 0, "errors": 0}
+
+    stats["expired_removed"] = matches.delete_many({"deadline_at": {"$lt": started_at}}).deleted_count
+    print(f"🗑️ Removed {stats['expired_removed']} matches for expired tenders")
+
+    for company_id in changed_company_ids(since):
+        result = refresh_company_matches(company_id)
+        if result["success"]:
+            stats["companies"] += 1
+        else:
+            stats["errors"] += 1
+            print(f"❌ Company {company_id}: {result.get('error')}")
+
+    # A changed tender is scored against every candidate company in one batched pass
+    for tender_id in changed_tender_ids(since, started_at):
+        result = reverse_match_tender(tender_id)
+        if result["success"]:
+            stats["tenders"] += 1
+        else:
+            stats["errors"] += 1
+            print(f"❌ Tender {tender_id}: {result.get('error')}")
+
+    status = "failed" if stats["errors"] else "completed"
+    update = {"status": status, "stats": stats, "finished_at": datetime.utcnow(), "updated_at": datetime.utcnow()}
+    if status == "completed":
+        update["high_water_mark"] = started_at
+    runs.update_one({"_id": run_id}, {"$set": update})
+
+    return {"success": status == "completed", "run_id": run_id, "since": since, **stats}
@@ -0,0 +1,253 @@
+import os
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from core.database import db
+
+# Long-running matching work, tracked in Mongo so any worker can report on it
+jobs = db.get_collection("jobs")
+companies = db.get_collection("companies")
+tenders = db.get_collection("filtered_tenders")
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_TENDER_CONCURRENCY = int(os.getenv("JOB_TENDER_CONCURRENCY", "4"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_RESULTS = 1000
+
+ACTIVE_STATUSES = ["queued", "running"]
+# reverse_match jobs score one tender against every company and have no company of their own
+JOB_KINDS = ("match", "batch_process", "reverse_match")
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def submit_job(kind: str, company: dict = None, params: dict = None) -> str:
+    """
+    Queue a job for a company and return its id. An unfinished job of the same
+    kind, company and params is reused instead of starting a duplicate.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind '{kind}'")
+
+    params = dict(sorted((params or {}).items()))
+    company_id = str(company["_id"]) if company else None
+    existing = jobs.find_one(
+        {"kind": kind, "company_id": company_id, "params": params, "status": {"$in": ACTIVE_STATUSES}},
+        {"_id": 1}
+    )
+    if existing:
+        return str(existing["_id"])
+
+    now = datetime.utcnow()
+    job_id = jobs.insert_one({
+        "kind": kind,
+        "company_id": company_id,
+        "user_id": company.get("user_id") if company else None,
+        "params": params,
+        "status": "queued",
+        "cancel_requested": False,
+        "progress": {"total": None, "processed": 0, "matched": 0, "errors": 0},
+        "results": [],
+        "created_at": now,
+        "updated_at": now,
+    }).inserted_id
+
+    _executor.submit(run_job, job_id)
+    return str(job_id)
+
+
+def cancel_job(job_id: str, user_id: str = None) -> bool:
+    query = {"_id": ObjectId(job_id), "status": {"$in": ACTIVE_STATUSES}}
+    if user_id is not None:
+        query["user_id"] = user_id
+    return jobs.update_one(query, {"$set": {"cancel_requested": True, "updated_at": datetime.utcnow()}}).modified_count == 1
+
+
+def get_job(job_id: str, user_id: str = None, results_skip: int = 0, results_limit: int = 100):
+    query = {"_id": ObjectId(job_id)}
+    if user_id is not None:
+        query["user_id"] = user_id
+    job = jobs.find_one(query, {"results": {"$slice": [results_skip, results_limit]}})
+    if job:
+        job["_id"] = str(job["_id"])
+    return job
+
+
+def list_jobs(user_id: str, limit: int = 20):
+    cursor = jobs.find({"user_id": user_id}, {"results": 0}).sort("created_at", -1).limit(limit)
+    return [{**job, "_id": str(job["_id"])} for job in cursor]
+
+
+def _claim(job_id):
+    """Atomically take a queued job, or one whose previous worker stopped heartbeating."""
+    now = datetime.utcnow()
+    return jobs.find_one_and_update(
+        {"_id": job_id, "$or": [
+            {"status": "queued"},
+            {"status": "running", "heartbeat_at": {"$lt": now - timedelta(seconds=JOB_LEASE_SECONDS)}}
+        ]},
+        {"$set": {"status": "running", "worker": _worker_id, "started_at": now, "heartbeat_at": now, "updated_at": now}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _job_tenders(job: dict, company: dict):
+    if job["kind"] == "batch_process":
+        return list(tenders.find({}, {"raw_eligibility": 0}))
+
+    from services.basic_filter import iter_filtered_tenders
+    return list(iter_filtered_tenders(company))
+
+
+def _process_tender(company: dict, tender: dict, preprocess: bool = False) -> dict:
+    from services.match_store import upsert_match
+    from services.tender_matcher import compute_tender_match_score
+
+    # Eligibility comes from the preprocess pipeline; match jobs skip unprocessed
+    # tenders, batch_process jobs preprocess them under the pipeline's claim
+    structured_eligibility = tender.get("structured_eligibility")
+    if not structured_eligibility and preprocess:
+        from services.eligibility_preprocessor import preprocess_if_pending
+        structured_eligibility = preprocess_if_pending(tender)
+    if not structured_eligibility:
+        return None
+    result = compute_tender_match_score(structured_eligibility, company)
+    upsert_match(company, tender, result)
+    return result
+
+
+def run_job(job_id):
+    job = _claim(job_id)
+    if not job:
+        return
+
+    threshold = float(job["params"].get("threshold", 60.0))
+    preprocess = job["kind"] == "batch_process"
+    try:
+        if job["kind"] == "reverse_match":
+            _run_reverse_match(job_id, job)
+            return
+
+        company = companies.find_one({"_id": ObjectId(job["company_id"])})
+        if not company:
+            raise ValueError(f"Company {job['company_id']} not found")
+
+        job_tenders = [t for t in _job_tenders(job, company) if t.get("form_url")]
+        jobs.update_one({"_id": job_id}, {"$set": {"progress.total": len(job_tenders)}})
+
+        cancelled = False
+        pending = iter(job_tenders)
+        with ThreadPoolExecutor(max_workers=JOB_TENDER_CONCURRENCY) as pool:
+            # Keep at most JOB_TENDER_CONCURRENCY tenders in flight so cancellation is prompt
+            futures = {}
+            for tender in pending:
+                futures[pool.submit(_process_tender, company, tender, preprocess)] = tender
+                if len(futures) >= JOB_TENDER_CONCURRENCY:
+                    break
+
+            while futures:
+                future = next(as_completed(futures))
+                tender = futures.pop(future)
+                cancelled = cancelled or _record_progress(job_id, tender, future, threshold)
+
+                if not cancelled:
+                    for tender in pending:
+                        futures[pool.submit(_process_tender, company, tender, preprocess)] = tender
+                        break
+
+        status = "cancelled" if cancelled else "completed"
+        jobs.update_one({"_id": job_id}, {"$set": {
+            "status": status, "finished_at": datetime.utcnow(), "updated_at": datetime.utcnow()
+        }})
+        if status == "completed" and job["kind"] == "match":
+            from services.match_store import matches
+            # Same bookkeeping as refresh_company_matches: drop pairs that left the filtered set
+            matches.delete_many({
+                "company_id": str(company["_id"]),
+                "tender_id": {"$nin": [str(t["_id"]) for t in job_tenders]}
+            })
+            companies.update_one(
+                {"_id": company["_id"], "$or": [
+                    {"matches_stale_since": {"$lte": job["created_at"]}},
+                    {"matches_stale_since": None}
+                ]},
+                {"$unset": {"matches_stale_since": ""}, "$set": {"matches_refreshed_at": datetime.utcnow()}}
+            )
+        print(f"🧾 Job {job_id} {status}")
+
+    except Exception as e:
+        print(f"❌ Job {job_id} failed: {e}")
+        print(traceback.format_exc())
+        jobs.update_one({"_id": job_id}, {"$set": {
+            "status": "failed", "error": str(e), "finished_at": datetime.utcnow(), "updated_at": datetime.utcnow()
+        }})
+
+
+def _keep_alive(job_id, stop: threading.Event):
+    """Heartbeat every third of the lease until stopped, for work with no per-tender progress."""
+    while not stop.wait(JOB_LEASE_SECONDS / 3):
+        now = datetime.utcnow()
+        jobs.update_one({"_id": job_id, "status": "running", "worker": _worker_id},
+                        {"$set": {"heartbeat_at": now, "updated_at": now}})
+
+
+def _run_reverse_match(job_id, job):
+    from services.reverse_matcher import reverse_match_tender
+
+    # Extraction inside the reverse match (OCR with retries) can outlast the lease
+    stop = threading.Event()
+    threading.Thread(target=_keep_alive, args=(job_id, stop), daemon=True).start()
+    try:
+        result = reverse_match_tender(job["params"]["tender_id"])
+    finally:
+        stop.set()
+    status = "completed" if result["success"] else "failed"
+    jobs.update_one({"_id": job_id}, {"$set": {
+        "status": status, "result": result, "error": result.get("error"),
+        "finished_at": datetime.utcnow(), "updated_at": datetime.utcnow()
+    }})
+    print(f"🧾 Job {job_id} {status}")
+
+
+def _record_progress(job_id, tender, future, threshold) -> bool:
+    """Store one tender's outcome and heartbeat; returns True when cancellation was requested."""
+    now = datetime.utcnow()
+    update = {"$inc": {"progress.processed": 1}, "$set": {"heartbeat_at": now, "updated_at": now}}
+
+    try:
+        result = future.result()
+        if result and result["matching_score"] >= threshold:
+            update["$inc"]["progress.matched"] = 1
+            update["$push"] = {"results": {"$each": [{
+                "tender_id": str(tender["_id"]),
+                "title": tender.get("title"),
+                "form_url": tender.get("form_url"),
+                "matching_score": result["matching_score"],
+                "eligible": result["eligible"],
+            }], "$slice": -JOB_MAX_RESULTS}}
+    except Exception as tender_error:
+        update["$inc"]["progress.errors"] = 1
+        print(f"    ⚠️ Error processing tender {tender.get('title')}: {tender_error}")
+
+    job = jobs.find_one_and_update({"_id": job_id}, update, projection={"cancel_requested": 1},
+                                   return_document=ReturnDocument.AFTER)
+    return bool(job and job.get("cancel_requested"))
+
+
+def resume_pending_jobs():
+    """Re-submit jobs left queued, or running on a worker that died, e.g. after a restart."""
+    stale_before = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+    pending = jobs.find({"$or": [
+        {"status": "queued"},
+        {"status": "running", "heartbeat_at": {"$lt": stale_before}}
+    ]}, {"_id": 1})
+    count = 0
+    for job in pending:
+        _executor.submit(run_job, job["_id"])
+        count += 1
+    return count
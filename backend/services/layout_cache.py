@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+LAYOUT_CACHE_PATH = os.getenv("LAYOUT_CACHE_PATH", "storage/cache/layouts.sqlite3")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def paragraph_tuples(paragraphs) -> list:
+    """(role, content) pairs from AnalyzeResult paragraphs; body text has role None."""
+    return [(p.role, p.content or "") for p in paragraphs or []]
+
+
+class LayoutCache:
+    """
+    Layout paragraphs keyed by the SHA-256 of the PDF bytes, so the same
+    document under another URL, or a re-run after the heading patterns change,
+    never goes back to Document Intelligence.
+
+    Paragraphs are stored as zlib-compressed JSON [role, content] pairs in a
+    SQLite file; a second table remembers which hash each URL last served so
+    sections can be re-sliced without downloading anything.
+    """
+
+    def __init__(self, path: str = LAYOUT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS layouts (hash TEXT PRIMARY KEY, paragraphs BLOB, created_at REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, hash TEXT, fetched_at REAL)"
+            )
+        return self._conn
+
+    def get(self, digest: str):
+        """Cached (role, content) pairs for a content hash, or None."""
+        with self._lock:
+            row = self._db().execute("SELECT paragraphs FROM layouts WHERE hash = ?", (digest,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return [tuple(p) for p in json.loads(zlib.decompress(row[0]))]
+
+    def put(self, digest: str, paragraphs):
+        blob = zlib.compress(json.dumps([list(p) for p in paragraphs], ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                "INSERT OR REPLACE INTO layouts (hash, paragraphs, created_at) VALUES (?, ?, ?)",
+                (digest, blob, time.time())
+            )
+            conn.commit()
+
+    def remember_url(self, url: str, digest: str):
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                "INSERT OR REPLACE INTO urls (url, hash, fetched_at) VALUES (?, ?, ?)",
+                (url, digest, time.time())
+            )
+            conn.commit()
+
+    def hash_for_url(self, url: str):
+        with self._lock:
+            row = self._db().execute("SELECT hash FROM urls WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def paragraphs_for_url(self, url: str):
+        """Cached layout of the document a URL last served, without fetching it."""
+        digest = self.hash_for_url(url)
+        return self.get(digest) if digest else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._db()
+            layouts, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(paragraphs)), 0) FROM layouts").fetchone()
+            urls = conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "layouts": layouts,
+                "urls": urls,
+                "compressed_bytes": size,
+                "disk_path": self.path
+            }
+
+
+layout_cache = LayoutCache()
@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from itertools import islice
+from bson import ObjectId
+from core.database import db
+from services.basic_filter import iter_filtered_tenders, load_raw_eligibility
+from services.eligibility_extractor import extract_eligibility_text_from_url
+from services.eligibility_parser import extract_eligibility_json_general
+from services.tender_matcher import compute_tender_match_score
+from services.match_store import matches, upsert_match
+
+tenders = db["filtered_tenders"]
+companies = db["companies"]
+
+
+def ensure_structured_eligibility(tender: dict) -> dict:
+    """
+    Return the tender's structured eligibility, extracting and parsing it
+    (and storing both stages) when it has not been computed yet.
+    """
+    structured_eligibility = tender.get("structured_eligibility")
+    if structured_eligibility:
+        return structured_eligibility
+
+    raw_eligibility = load_raw_eligibility(tender["_id"])
+    if not raw_eligibility:
+        print(f"    Extracting eligibility from {tender.get('form_url')}")
+        raw_eligibility = extract_eligibility_text_from_url(tender["form_url"])
+        if raw_eligibility:
+            tenders.update_one(
+                {"_id": tender["_id"]},
+                {"$set": {"raw_eligibility": raw_eligibility, "last_updated": datetime.utcnow()}}
+            )
+
+    if not raw_eligibility:
+        return {}
+
+    print(f"    Parsing structured eligibility")
+    structured_eligibility = extract_eligibility_json_general(raw_eligibility)
+    if structured_eligibility:
+        tenders.update_one(
+            {"_id": tender["_id"]},
+            {"$set": {"structured_eligibility": structured_eligibility, "last_updated": datetime.utcnow()}}
+        )
+    return structured_eligibility
+
+
+def build_match_data(tender: dict, result: dict, id_field: str = "_id") -> dict:
+    return {
+        id_field: str(tender["_id"]),
+        "title": tender.get("title"),
+        "reference_number": tender.get("reference_number"),
+        "location": tender.get("location"),
+        "business_category": tender.get("business_category", []),
+        "deadline": tender.get("deadline"),
+        "form_url": tender.get("form_url"),
+        "matching_score": result["matching_score"],
+        "field_scores": result["field_scores"],
+        "eligible": result["eligible"],
+        "missing_fields": result["missing_fields"],
+        "emd": tender.get("emd"),
+        "estimated_budget": tender.get("estimated_budget")
+    }
+
+
+def _score_tender(company: dict, tender: dict, extract_missing: bool):
+    """Structured eligibility and match result for one tender, or None when it cannot be scored."""
+    if extract_missing:
+        structured_eligibility = ensure_structured_eligibility(tender)
+    else:
+        structured_eligibility = tender.get("structured_eligibility")
+    if not structured_eligibility:
+        return None
+    return compute_tender_match_score(structured_eligibility, company)
+
+
+def iter_tender_matches(company: dict, threshold: float = 60.0, id_field: str = "_id", stats: dict = None,
+                        store: bool = False, extract_missing: bool = False, concurrency: int = 1,
+                        filtered_ids: list = None, rank: bool = False):
+    """
+    Stream matches for a company: tenders flow from the filter cursor through
+    eligibility scoring and are yielded as soon as they clear the threshold.
+
+    `stats`, when given, is updated in place with filtered/scored/matched/errors counts.
+    `filtered_ids`, when given, collects the id of every tender that passed the
+    filter, whether or not it could be scored.
+    With `rank`, tenders most similar to the profile are scored first; the set is unchanged.
+    With `store`, every scored pair is also written to the matches table.
+    Tenders lacking structured eligibility are skipped: the preprocess pipeline
+    fills it in ahead of time. `extract_missing` runs OCR and the LLM inline instead.
+    With `concurrency` > 1 and `extract_missing`, up to that many tenders are
+    extracted and scored at once and matches are yielded in completion order.
+    Without extraction scoring is pure CPU work and runs inline.
+    """
+    stats = stats if stats is not None else {}
+    for key in ("filtered", "scored", "matched", "errors"):
+        stats.setdefault(key, 0)
+
+    def scorable():
+        for tender in iter_filtered_tenders(company, rank=rank):
+            stats["filtered"] += 1
+            if filtered_ids is not None:
+                filtered_ids.append(str(tender["_id"]))
+            if tender.get("form_url"):
+                print(f"  Processing tender {stats['filtered']}: {tender.get('title', 'Unknown')}")
+                yield tender
+
+    def outcomes():
+        if concurrency <= 1 or not extract_missing:
+            for tender in scorable():
+                try:
+                    yield tender, _score_tender(company, tender, extract_missing), None
+                except Exception as tender_error:
+                    yield tender, None, tender_error
+            return
+
+        pending = scorable()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {pool.submit(_score_tender, company, t, extract_missing): t for t in islice(pending, concurrency)}
+            while futures:
+                done = next(as_completed(futures))
+                tender = futures.pop(done)
+                for t in islice(pending, 1):
+                    futures[pool.submit(_score_tender, company, t, extract_missing)] = t
+                try:
+                    yield tender, done.result(), None
+                except Exception as tender_error:
+                    yield tender, None, tender_error
+
+    for tender, result, tender_error in outcomes():
+        if tender_error is not None:
+            stats["errors"] += 1
+            print(f"    ⚠️ Error processing tender {tender.get('title')}: {str(tender_error)}")
+            continue
+        if result is None:
+            continue
+
+        stats["scored"] += 1
+        if store:
+            try:
+                upsert_match(company, tender, result)
+            except Exception as store_error:
+                stats["errors"] += 1
+                print(f"    ⚠️ Error storing match for {tender.get('title')}: {str(store_error)}")
+
+        if result["matching_score"] >= threshold:
+            stats["matched"] += 1
+            print(f"    ✅ Match found: {result['matching_score']:.1f}% score")
+            yield build_match_data(tender, result, id_field)
+        else:
+            print(f"    ❌ Below threshold: {result['matching_score']:.1f}% score")
+
+
+def mark_matches_stale(company_id):
+    """Flag a company's materialized matches as pending a recompute."""
+    companies.update_one(
+        {"_id": ObjectId(str(company_id))},
+        {"$set": {"matches_stale_since": datetime.utcnow()}}
+    )
+
+
+def finish_refresh(company: dict, filtered_ids, started_at) -> int:
+    """
+    Bookkeeping after every filtered tender was stored for a company: drop
+    pairs that left the filtered set and clear the stale marker unless the
+    profile changed after `started_at`. Returns the number of rows removed.
+    """
+    # A tender that errored or could not be scored this time keeps its previous row
+    removed = matches.delete_many({"company_id": str(company["_id"]), "tender_id": {"$nin": list(filtered_ids)}}).deleted_count
+    companies.update_one(
+        {"_id": company["_id"], "$or": [
+            {"matches_stale_since": {"$lte": started_at}},
+            {"matches_stale_since": None}
+        ]},
+        {"$unset": {"matches_stale_since": ""}, "$set": {"matches_refreshed_at": datetime.utcnow()}}
+    )
+    return removed
+
+
+def refresh_company_matches(company_id, extract_missing: bool = False) -> dict:
+    """
+    Recompute a company's rows in the matches table from precomputed tender
+    eligibility, drop pairs that no longer pass the filter, and clear the
+    stale marker unless the profile changed again meanwhile.
+    """
+    started_at = datetime.utcnow()
+    company = companies.find_one({"_id": ObjectId(str(company_id))})
+    if not company:
+        return {"success": False, "error": f"Company {company_id} not found"}
+
+    stats = {}
+    filtered_ids = []
+    for _ in iter_tender_matches(company, threshold=0, stats=stats, store=True,
+                                 extract_missing=extract_missing, filtered_ids=filtered_ids):
+        pass
+
+    removed = finish_refresh(company, filtered_ids, started_at)
+    print(f"🔄 Refreshed matches for company {company['_id']}: {stats['scored']} scored, {removed} removed")
+    return {"success": True, "company_id": str(company["_id"]), **stats, "removed": removed}
+
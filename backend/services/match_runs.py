@@ -0,0 +1,337 @@
+"""
+Checkpointed batch matching runs, shared by every host that joins them.
+
+A run is one document in match_runs plus one work unit per (company shard,
+tender shard) pair in match_run_units. Workers on any host lease units
+atomically, heartbeat while they work, and record per-company counts when a
+unit is done. The compiled catalog is stored in GridFS so every host scores
+against the same snapshot.
+"""
+
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+import gridfs
+from pymongo import ReturnDocument, UpdateOne
+from core.database import db
+from services.batch_matcher import (
+    MATCH_CATALOG_DIR, MATCH_SHARD_SIZE, MATCH_TENDER_SHARD_SIZE,
+    prepare_catalog, shard_company_ids, shard_tender_ranges, match_company_shard
+)
+from services.match_store import matches
+
+runs = db.get_collection("match_runs")
+units = db.get_collection("match_run_units")
+companies = db.get_collection("companies")
+catalog_files = gridfs.GridFS(db, collection="match_catalogs")
+
+MATCH_RUN_LEASE_SECONDS = int(os.getenv("MATCH_RUN_LEASE_SECONDS", "600"))
+MATCH_RUN_MAX_ATTEMPTS = int(os.getenv("MATCH_RUN_MAX_ATTEMPTS", "3"))
+
+CATALOG_FILES = ("program_vectors.npy", "catalog.pkl")
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def create_run(threshold: float, company_shard_size: int = MATCH_SHARD_SIZE,
+               tender_shard_size: int = MATCH_TENDER_SHARD_SIZE) -> str:
+    """Record a new run; its catalog and units are prepared by prepare_run."""
+    run_id = datetime.utcnow().strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+    now = datetime.utcnow()
+    runs.insert_one({
+        "_id": run_id,
+        "kind": "full",
+        "status": "running",
+        "threshold": threshold,
+        "company_shard_size": company_shard_size,
+        "tender_shard_size": tender_shard_size,
+        "catalog_ready": False,
+        "units_planned": False,
+        "created_at": now,
+        "updated_at": now,
+    })
+    return run_id
+
+
+def get_run(run_id: str):
+    return runs.find_one({"_id": run_id})
+
+
+def latest_running_run():
+    return runs.find_one({"kind": "full", "status": "running", "units_planned": True}, sort=[("created_at", -1)])
+
+
+def last_high_water_mark():
+    """Start time of the latest successful full or incremental run, or None if there was none."""
+    run = runs.find_one({"status": "completed", "high_water_mark": {"$ne": None}}, sort=[("high_water_mark", -1)])
+    return run["high_water_mark"] if run else None
+
+
+def catalog_dir(run_id: str) -> str:
+    return os.path.join(MATCH_CATALOG_DIR, run_id)
+
+
+def prepare_run(run_id: str) -> dict:
+    """
+    Phase one plus planning, each skipped when an earlier attempt finished it:
+    compile the catalog, publish it to GridFS, and create the work units.
+    """
+    run = get_run(run_id)
+    if not run.get("catalog_ready"):
+        directory = catalog_dir(run_id)
+        summary = prepare_catalog(directory)
+        for name in CATALOG_FILES:
+            filename = f"{run_id}/{name}"
+            for stale in catalog_files.find({"filename": filename}):
+                catalog_files.delete(stale._id)
+            with open(os.path.join(directory, name), "rb") as f:
+                catalog_files.put(f, filename=filename)
+        runs.update_one({"_id": run_id}, {"$set": {
+            "catalog_ready": True, "catalog_tenders": summary["tenders"], "updated_at": datetime.utcnow()
+        }})
+        run = get_run(run_id)
+
+    if not run.get("units_planned"):
+        company_ids = [c["_id"] for c in companies.find({"user_id": {"$exists": True, "$ne": None}}, {"_id": 1})]
+        company_shards = shard_company_ids(company_ids, run["company_shard_size"])
+        tender_ranges = shard_tender_ranges(run["catalog_tenders"], run["tender_shard_size"])
+        plan = [(shard, tender_range) for shard in company_shards for tender_range in tender_ranges]
+        if plan:
+            units.bulk_write([
+                UpdateOne(
+                    {"run_id": run_id, "unit": i},
+                    {"$setOnInsert": {"company_ids": shard, "tender_range": tender_range,
+                                      "status": "pending", "attempts": 0}},
+                    upsert=True
+                )
+                for i, (shard, tender_range) in enumerate(plan)
+            ], ordered=False)
+        runs.update_one({"_id": run_id}, {"$set": {
+            "units_planned": True, "total_units": len(plan), "total_companies": len(company_ids),
+            "updated_at": datetime.utcnow()
+        }})
+        run = get_run(run_id)
+        print(f"🧩 Planned {len(plan)} units: {len(company_shards)} company shards x {len(tender_ranges)} tender shards")
+
+    return run
+
+
+def local_catalog(run_id: str) -> str:
+    """The run's catalog directory on this host, fetched from GridFS if another host compiled it."""
+    directory = catalog_dir(run_id)
+    if os.path.exists(os.path.join(directory, "catalog.pkl")):
+        return directory
+
+    os.makedirs(directory, exist_ok=True)
+    # catalog.pkl is fetched last: its presence marks a complete copy
+    for name in CATALOG_FILES:
+        stored = catalog_files.find_one({"filename": f"{run_id}/{name}"})
+        if stored is None:
+            raise FileNotFoundError(f"Catalog for run {run_id} is not published yet")
+        tmp_path = os.path.join(directory, f"{name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            for chunk in iter(lambda: stored.read(1 << 20), b""):
+                f.write(chunk)
+        os.replace(tmp_path, os.path.join(directory, name))
+    return directory
+
+
+def claim_unit(run_id: str, worker: str):
+    """Atomically lease the next pending unit, or one whose lease expired."""
+    now = datetime.utcnow()
+    return units.find_one_and_update(
+        {"run_id": run_id, "attempts": {"$lt": MATCH_RUN_MAX_ATTEMPTS}, "$or": [
+            {"status": "pending"},
+            {"status": "leased", "lease_until": {"$lt": now}}
+        ]},
+        {"$set": {"status": "leased", "worker": worker, "leased_at": now,
+                  "lease_until": now + timedelta(seconds=MATCH_RUN_LEASE_SECONDS)},
+         "$inc": {"attempts": 1}},
+        sort=[("unit", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def heartbeat(unit: dict, progress: dict = None) -> bool:
+    """Extend the lease; False means another worker has taken the unit over."""
+    update = {"lease_until": datetime.utcnow() + timedelta(seconds=MATCH_RUN_LEASE_SECONDS)}
+    if progress:
+        update.update({f"progress.{key}": value for key, value in progress.items()})
+    return units.update_one(
+        {"_id": unit["_id"], "status": "leased", "worker": unit["worker"]},
+        {"$set": update}
+    ).modified_count == 1
+
+
+def complete_unit(unit: dict, results: list):
+    units.update_one(
+        {"_id": unit["_id"], "worker": unit["worker"]},
+        {"$set": {"status": "done", "results": results, "finished_at": datetime.utcnow()},
+         "$unset": {"lease_until": "", "error": ""}}
+    )
+
+
+def fail_unit(unit: dict, error: str):
+    """Release the unit for another attempt, or park it as failed once attempts run out."""
+    status = "failed" if unit["attempts"] >= MATCH_RUN_MAX_ATTEMPTS else "pending"
+    units.update_one(
+        {"_id": unit["_id"], "worker": unit["worker"]},
+        {"$set": {"status": status, "error": error}, "$unset": {"lease_until": ""}}
+    )
+
+
+def work_on_run(run_id: str, worker: str = None) -> int:
+    """
+    Claim and process units of a run until none are left. Match writes are
+    upserts keyed on (company_id, tender_id), so a unit retried after a crash
+    overwrites its earlier partial output instead of duplicating it.
+    """
+    worker = worker or worker_name()
+    run = get_run(run_id)
+    if not run:
+        raise ValueError(f"Run {run_id} not found")
+
+    directory = None
+    processed = 0
+    while True:
+        unit = claim_unit(run_id, worker)
+        if not unit:
+            return processed
+
+        print(f"🔒 {worker} leased unit {unit['unit']} of run {run_id} (attempt {unit['attempts']})")
+        try:
+            directory = directory or local_catalog(run_id)
+            results = match_company_shard(
+                directory, unit["company_ids"], run["threshold"],
+                heartbeat=lambda progress: heartbeat(unit, progress),
+                tender_range=unit.get("tender_range")
+            )
+            complete_unit(unit, results)
+            processed += 1
+        except Exception as e:
+            print(f"❌ Unit {unit['unit']} of run {run_id} failed: {str(e)}")
+            fail_unit(unit, str(e))
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def release_dead_leases(run_id: str) -> int:
+    """Free units leased by processes on this host that no longer exist, without waiting out the lease."""
+    host = socket.gethostname()
+    released = 0
+    for unit in units.find({"run_id": run_id, "status": "leased"}, {"worker": 1}):
+        worker_host, _, pid = (unit.get("worker") or "").rpartition(":")
+        if worker_host == host and pid.isdigit() and not _process_alive(int(pid)):
+            released += units.update_one(
+                {"_id": unit["_id"], "status": "leased", "worker": unit["worker"]},
+                {"$set": {"status": "pending"}, "$unset": {"lease_until": ""}}
+            ).modified_count
+    return released
+
+
+def reset_failed_units(run_id: str) -> int:
+    """Give failed units a fresh set of attempts and reopen the run, used when it is resumed."""
+    reset = units.update_many(
+        {"run_id": run_id, "status": "failed"},
+        {"$set": {"status": "pending", "attempts": 0}, "$unset": {"error": ""}}
+    ).modified_count
+    if reset:
+        runs.update_one({"_id": run_id}, {"$set": {"status": "running", "updated_at": datetime.utcnow()}})
+    return reset
+
+
+def expire_abandoned_units(run_id: str) -> int:
+    """Units whose lease ran out on their final attempt will never be claimed again."""
+    return units.update_many(
+        {"run_id": run_id, "status": "leased", "lease_until": {"$lt": datetime.utcnow()},
+         "attempts": {"$gte": MATCH_RUN_MAX_ATTEMPTS}},
+        {"$set": {"status": "failed", "error": "Lease expired on the final attempt"}, "$unset": {"lease_until": ""}}
+    ).modified_count
+
+
+def run_progress(run_id: str) -> dict:
+    """Unit counts by status, tender progress of leased units, and the workers holding them."""
+    expire_abandoned_units(run_id)
+    counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+    for row in units.aggregate([
+        {"$match": {"run_id": run_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]):
+        counts[row["_id"]] = row["count"]
+
+    leased = list(units.find({"run_id": run_id, "status": "leased"}, {"worker": 1, "progress": 1}))
+    counts["workers"] = sorted({unit["worker"] for unit in leased})
+    counts["tenders_in_flight"] = sum((unit.get("progress") or {}).get("tenders_done", 0) for unit in leased)
+    return counts
+
+
+def _company_results(run_id: str):
+    """Per-company counts summed over every tender shard, plus failures for unfinished units."""
+    by_company = {}
+    errors = {}
+    for unit in units.find({"run_id": run_id}, {"results": 1, "status": 1, "company_ids": 1, "error": 1}):
+        if unit["status"] != "done":
+            for company_id in unit["company_ids"]:
+                errors[str(company_id)] = {"success": False, "error": unit.get("error"), "company_id": str(company_id)}
+            continue
+        for result in unit.get("results", []):
+            total = by_company.setdefault(result["company_id"], {
+                **result, "success": True, "total_filtered": 0, "total_matches": 0
+            })
+            total["total_filtered"] += result["total_filtered"]
+            total["total_matches"] += result["total_matches"]
+
+    user_results = [r for company_id, r in by_company.items() if company_id not in errors]
+    return user_results + list(errors.values()), list(errors.values())
+
+
+def finish_run(run_id: str) -> dict:
+    """
+    Close the run once no unit is outstanding. On success, rows of the run's
+    companies that no unit rewrote are stale and removed, and stale markers
+    set before the run started are cleared. A completed run is left untouched.
+    """
+    run = get_run(run_id)
+    if run["status"] == "completed":
+        # Closed already; running the stale-pair delete again would drop rows written since
+        return {"status": "completed", "progress": run.get("progress"), "user_results": [], "errors": []}
+
+    progress = run_progress(run_id)
+    if progress["pending"] or progress["leased"]:
+        return {"status": "running", "progress": progress}
+
+    status = "failed" if progress["failed"] else "completed"
+    user_results, errors = _company_results(run_id)
+
+    update = {"status": status, "progress": progress, "finished_at": datetime.utcnow(), "updated_at": datetime.utcnow()}
+    if status == "completed":
+        company_ids = units.distinct("company_ids", {"run_id": run_id})
+        removed = matches.delete_many({
+            "company_id": {"$in": [str(i) for i in company_ids]},
+            "updated_at": {"$lt": run["created_at"]}
+        }).deleted_count
+        companies.update_many(
+            {"_id": {"$in": company_ids}, "$or": [
+                {"matches_stale_since": {"$lte": run["created_at"]}},
+                {"matches_stale_since": None}
+            ]},
+            {"$unset": {"matches_stale_since": ""}, "$set": {"matches_refreshed_at": datetime.utcnow()}}
+        )
+        for stored in catalog_files.find({"filename": {"$regex": f"^{run_id}/"}}):
+            catalog_files.delete(stored._id)
+        # Everything changed before the run started is now reflected in the matches table
+        update.update({"high_water_mark": run["created_at"], "stale_removed": removed})
+    runs.update_one({"_id": run_id}, {"$set": update})
+
+    return {"status": status, "progress": progress, "user_results": user_results, "errors": errors}
@@ -0,0 +1,65 @@
+from datetime import datetime
+from pymongo import UpdateOne
+from core.database import db
+
+# One document per (company, tender) pair, kept current by the match pipelines
+matches = db.get_collection("matches")
+
+RESULT_FIELDS = ("matching_score", "eligible", "field_scores", "missing_fields")
+
+
+def match_document(company: dict, tender: dict, result: dict) -> dict:
+    return {
+        "company_id": str(company["_id"]),
+        "user_id": company.get("user_id"),
+        "tender_id": str(tender["_id"]),
+        "form_url": tender.get("form_url"),
+        "title": tender.get("title"),
+        "reference_number": tender.get("reference_number"),
+        "location": tender.get("location"),
+        "business_category": tender.get("business_category", []),
+        "deadline": tender.get("deadline"),
+        "deadline_at": tender.get("deadline_at"),
+        "emd": tender.get("emd"),
+        "estimated_budget": tender.get("estimated_budget"),
+        **{field: result[field] for field in RESULT_FIELDS},
+        "updated_at": datetime.utcnow()
+    }
+
+
+def upsert_matches(documents) -> int:
+    """Idempotent write: re-scoring a pair replaces its previous result."""
+    operations = [
+        UpdateOne(
+            {"company_id": doc["company_id"], "tender_id": doc["tender_id"]},
+            {"$set": doc},
+            upsert=True
+        )
+        for doc in documents
+    ]
+    if not operations:
+        return 0
+    matches.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def upsert_match(company: dict, tender: dict, result: dict):
+    upsert_matches([match_document(company, tender, result)])
+
+
+def find_match(company_id: str, form_url: str):
+    # Rows written before the matches table carry result_json instead of result fields
+    return matches.find_one({"company_id": str(company_id), "form_url": form_url, "matching_score": {"$exists": True}})
+
+
+def purge_legacy_matches() -> int:
+    """
+    Delete cached results written before the matches table existed. They have
+    no tender_id, would collide on the (company_id, tender_id) unique index,
+    and are rebuilt by the next refresh of each company.
+    """
+    return matches.delete_many({"tender_id": {"$exists": False}}).deleted_count
+
+
+def result_from_match(document: dict) -> dict:
+    return {field: document.get(field) for field in RESULT_FIELDS}
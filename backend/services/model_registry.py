@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+
+DEFAULT_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+# "torch" (default) or "onnx-int8" for dynamically quantized ONNX Runtime on CPU
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "storage/cache/onnx")
+
+BACKENDS = ("torch", "onnx-int8")
+
+_models = {}
+_load_stats = {}
+_lock = threading.Lock()
+
+
+def _rss_mb():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def model_cache_key(name: str = DEFAULT_MODEL_NAME, backend: str = None) -> str:
+    """Name used for cached vectors; quantized vectors never mix with torch ones."""
+    backend = backend or EMBEDDING_BACKEND
+    return name if backend == "torch" else f"{name}@{backend}"
+
+
+def _load_onnx_int8(name: str):
+    from sentence_transformers import SentenceTransformer
+
+    # Hub models such as all-MiniLM-L6-v2 ship pre-quantized ONNX files
+    try:
+        return SentenceTransformer(name, backend="onnx", model_kwargs={"file_name": EMBEDDING_ONNX_FILE})
+    except Exception as e:
+        print(f"⚠️ No prebuilt {EMBEDDING_ONNX_FILE} for {name} ({e}); quantizing locally")
+
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    local_dir = os.path.join(EMBEDDING_ONNX_DIR, name.replace("/", "__"))
+    quantized_file = "onnx/model_qint8_avx512_vnni.onnx"
+    if not os.path.exists(os.path.join(local_dir, quantized_file)):
+        exported = SentenceTransformer(name, backend="onnx")
+        exported.save_pretrained(local_dir)
+        export_dynamic_quantized_onnx_model(exported, "avx512_vnni", local_dir)
+    return SentenceTransformer(local_dir, backend="onnx", model_kwargs={"file_name": quantized_file})
+
+
+def get_model(name: str = DEFAULT_MODEL_NAME, backend: str = None):
+    """
+    Return the process-wide encoder for `name`, loading it on first use.
+    Workers that never encode anything never pay for the model.
+    """
+    backend = backend or EMBEDDING_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}', expected one of {BACKENDS}")
+
+    key = model_cache_key(name, backend)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        if key not in _models:
+            from sentence_transformers import SentenceTransformer
+
+            rss_before = _rss_mb()
+            started = time.perf_counter()
+            _models[key] = SentenceTransformer(name) if backend == "torch" else _load_onnx_int8(name)
+            load_seconds = time.perf_counter() - started
+            rss_after = _rss_mb()
+
+            _load_stats[key] = {
+                "backend": backend,
+                "load_seconds": round(load_seconds, 3),
+                "rss_delta_mb": round(rss_after - rss_before, 1) if rss_before is not None else None,
+                "rss_after_mb": round(rss_after, 1) if rss_after is not None else None
+            }
+            print(f"🧠 Loaded embedding model {key} in {load_seconds:.2f}s")
+        return _models[key]
+
+
+def warm_up(names=None):
+    """Load models ahead of the first request (see EMBEDDING_WARMUP)."""
+    for name in names or [DEFAULT_MODEL_NAME]:
+        get_model(name)
+
+
+def check_backend_parity(texts, name: str = DEFAULT_MODEL_NAME, candidate: str = "onnx-int8",
+                         thresholds=(0.5, 0.6, 0.7, 0.75), tolerance: float = 0.02) -> dict:
+    """
+    Compare pairwise cosine similarities from `candidate` against the torch backend.
+
+    A decision flip only counts as a mismatch when the torch score is further
+    than `tolerance` from the threshold; scores sitting on the boundary may
+    legitimately land on either side after quantization.
+    """
+    import numpy as np
+
+    def similarities(backend):
+        vectors = np.asarray(get_model(name, backend).encode(list(texts), batch_size=64), dtype=np.float32)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors @ vectors.T
+
+    timings = {}
+    started = time.perf_counter()
+    reference = similarities("torch")
+    timings["torch"] = time.perf_counter() - started
+    started = time.perf_counter()
+    quantized = similarities(candidate)
+    timings[candidate] = time.perf_counter() - started
+
+    upper = np.triu_indices(len(texts), k=1)
+    ref_scores, cand_scores = reference[upper], quantized[upper]
+    diff = np.abs(ref_scores - cand_scores)
+
+    mismatches = {}
+    for threshold in thresholds:
+        flipped = (ref_scores >= threshold) != (cand_scores >= threshold)
+        mismatches[str(threshold)] = int((flipped & (np.abs(ref_scores - threshold) > tolerance)).sum())
+
+    return {
+        "pairs": int(diff.size),
+        "max_abs_diff": float(diff.max()) if diff.size else 0.0,
+        "mean_abs_diff": float(diff.mean()) if diff.size else 0.0,
+        "decision_mismatches": mismatches,
+        "encode_seconds": {k: round(v, 3) for k, v in timings.items()},
+        "passed": all(count == 0 for count in mismatches.values())
+    }
+
+
+def get_registry_stats() -> dict:
+    rss = _rss_mb()
+    return {
+        "backend": EMBEDDING_BACKEND,
+        "loaded": sorted(_models),
+        "models": dict(_load_stats),
+        "process_rss_mb": round(rss, 1) if rss is not None else None
+    }
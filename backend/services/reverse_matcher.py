@@ -0,0 +1,80 @@
+from datetime import datetime
+from bson import ObjectId
+from core.database import db
+from services.category_vocabulary import add_terms, similar_keywords, normalize_term
+from services.company_features import company_keywords, FEATURES_VERSION
+from services.eligibility_rules import build_company_table, compile_eligibility, evaluate, result_for
+from services.eligibility_preprocessor import preprocess_if_pending
+from services.match_store import matches, match_document, upsert_matches
+
+companies = db["companies"]
+tenders = db["filtered_tenders"]
+
+COMPANY_PROJECTION = {"user_id": 1, "features": 1, "businessCapabilities": 1, "tenderExperience": 1}
+
+
+def candidate_companies(tender: dict, threshold: float = 0.6):
+    """
+    Companies that pass the category filter for this tender, found through the
+    reverse side of the similarity table instead of scoring every profile.
+    """
+    categories = [c for c in tender.get("business_category", []) if normalize_term(c)]
+    if not categories:
+        return []
+
+    add_terms(categories=categories)
+    keywords = similar_keywords(categories, threshold)
+    if not keywords:
+        return []
+
+    # Profiles without a current feature record (missing, or keywords stored
+    # before they were normalized like vocabulary terms) are checked in Python
+    query = {"$or": [
+        {"features.keywords": {"$in": list(keywords)}},
+        {"features.version": {"$ne": FEATURES_VERSION}}
+    ]}
+    return [
+        company for company in companies.find(query, COMPANY_PROJECTION)
+        if keywords.intersection(normalize_term(k) for k in company_keywords(company))
+    ]
+
+
+def reverse_match_tender(tender_id) -> dict:
+    """
+    Score one new or updated tender against every company in a single batched
+    pass and materialize the results in the matches collection.
+    """
+    tender = tenders.find_one({"_id": ObjectId(str(tender_id))}, {"raw_eligibility": 0})
+    if not tender:
+        return {"success": False, "error": f"Tender {tender_id} not found"}
+
+    deadline_at = tender.get("deadline_at")
+    if deadline_at and deadline_at < datetime.utcnow():
+        matches.delete_many({"tender_id": str(tender["_id"])})
+        return {"success": True, "tender_id": str(tender["_id"]), "candidates": 0, "written": 0, "expired": True}
+
+    candidates = candidate_companies(tender)
+    candidate_ids = [str(c["_id"]) for c in candidates]
+
+    # Companies that no longer pass the category filter lose this match
+    matches.delete_many({"tender_id": str(tender["_id"]), "company_id": {"$nin": candidate_ids}})
+
+    if not candidates:
+        print(f"🔁 Reverse match: no candidate companies for {tender.get('title')}")
+        return {"success": True, "tender_id": str(tender["_id"]), "candidates": 0, "written": 0}
+
+    # New tenders are preprocessed here, under the preprocess pipeline's claim;
+    # one held by a running preprocess is picked up by incremental matching later
+    structured_eligibility = preprocess_if_pending(tender)
+    if not structured_eligibility:
+        return {"success": False, "tender_id": str(tender["_id"]), "error": "No structured eligibility"}
+
+    full_candidates = list(companies.find({"_id": {"$in": [c["_id"] for c in candidates]}}))
+    evaluation = evaluate(compile_eligibility(structured_eligibility), build_company_table(full_candidates))
+
+    written = upsert_matches(
+        match_document(company, tender, result_for(evaluation, i))
+        for i, company in enumerate(full_candidates)
+    )
+    print(f"🔁 Reverse match: scored {tender.get('title')} against {written} companies")
+    return {"success": True, "tender_id": str(tender["_id"]), "candidates": len(candidates), "written": written}
@@ -0,0 +1,289 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
+from services.embedding_cache import get_embeddings
+
+try:
+    import hnswlib
+except ImportError:  # brute-force cosine search over the same vectors
+    hnswlib = None
+
+TENDER_INDEX_DIR = os.getenv("TENDER_INDEX_DIR", "storage/index")
+TENDER_INDEX_TOP_K = int(os.getenv("TENDER_INDEX_TOP_K", "500"))
+
+# Evicted labels stay in the arrays until they make up this share of the index
+COMPACT_FRACTION = 0.25
+# Saved versions kept besides the current one, for readers still loading them
+KEEP_VERSIONS = 2
+
+
+def tender_text(tender: dict) -> str:
+    """Text a tender is indexed by: title, scope of work and categories."""
+    parts = [tender.get("title") or "", tender.get("scope_of_work") or ""]
+    parts.extend(tender.get("business_category") or [])
+    return ". ".join(p.strip() for p in parts if p and p.strip())
+
+
+def deadline_timestamp(tender: dict) -> float:
+    """deadline_at (naive UTC) as epoch seconds; NaN when it could not be parsed."""
+    deadline_at = tender.get("deadline_at")
+    if not deadline_at:
+        return float("nan")
+    return deadline_at.replace(tzinfo=timezone.utc).timestamp()
+
+
+class TenderIndex:
+    """
+    Vector index over open tenders, persisted under TENDER_INDEX_DIR.
+
+    Uses HNSW when hnswlib is installed and an exact cosine scan otherwise.
+    Every save writes a complete new version directory and then swaps the
+    CURRENT pointer, so readers never see ids from one save and vectors from
+    another. Writers hold a file lock across reload, change and save, so
+    concurrent ingest workers do not drop each other's vectors.
+    """
+
+    def __init__(self, directory: str = TENDER_INDEX_DIR):
+        self.directory = directory
+        self.current_path = os.path.join(directory, "CURRENT")
+        self.lock_path = os.path.join(directory, ".lock")
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._version = None
+        self._labels = {}  # tender id -> integer label
+        self._ids = []     # integer label -> tender id, None once evicted
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._deadlines = np.zeros(0, dtype=np.float64)
+        self._hnsw = None
+
+    def __len__(self):
+        self._reload_if_changed()
+        return len(self._labels)
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _current_version(self):
+        try:
+            with open(self.current_path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _reload_if_changed(self):
+        version = self._current_version()
+        if version is None or version == self._version:
+            return
+        with self._lock:
+            self._load(version)
+
+    def _load(self, version: str):
+        path = os.path.join(self.directory, version)
+        with open(os.path.join(path, "tender_ids.json")) as f:
+            self._ids = json.load(f)
+        self._labels = {tender_id: label for label, tender_id in enumerate(self._ids) if tender_id is not None}
+        self._vectors = np.load(os.path.join(path, "tender_vectors.npy"))
+        self._deadlines = np.load(os.path.join(path, "tender_deadlines.npy"))
+        self._hnsw = None
+        hnsw_path = os.path.join(path, "tenders.hnsw")
+        if hnswlib is not None and self._ids and os.path.exists(hnsw_path):
+            self._hnsw = hnswlib.Index(space="cosine", dim=self._vectors.shape[1])
+            self._hnsw.load_index(hnsw_path, max_elements=len(self._ids))
+            self._hnsw.set_ef(max(TENDER_INDEX_TOP_K, 50))
+        self._version = version
+
+    def _save(self):
+        version = f"v-{time.time_ns()}-{os.getpid()}"
+        tmp_path = os.path.join(self.directory, f".{version}.tmp")
+        os.makedirs(tmp_path)
+        with open(os.path.join(tmp_path, "tender_ids.json"), "w") as f:
+            json.dump(self._ids, f)
+        np.save(os.path.join(tmp_path, "tender_vectors.npy"), self._vectors)
+        np.save(os.path.join(tmp_path, "tender_deadlines.npy"), self._deadlines)
+        if self._hnsw is not None:
+            self._hnsw.save_index(os.path.join(tmp_path, "tenders.hnsw"))
+        os.rename(tmp_path, os.path.join(self.directory, version))
+
+        pointer = self.current_path + ".tmp"
+        with open(pointer, "w") as f:
+            f.write(version)
+        os.replace(pointer, self.current_path)
+        self._version = version
+        self._prune_versions()
+
+    def _prune_versions(self):
+        versions = sorted(
+            (name for name in os.listdir(self.directory) if name.startswith("v-")),
+            key=lambda name: int(name.split("-")[1])
+        )
+        for name in versions[:-(KEEP_VERSIONS + 1)]:
+            if name != self._version:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def _ensure_hnsw(self, dim: int, capacity: int):
+        if hnswlib is None:
+            return
+        if self._hnsw is None:
+            self._hnsw = hnswlib.Index(space="cosine", dim=dim)
+            self._hnsw.init_index(max_elements=max(capacity, 1024), ef_construction=200, M=16)
+            if len(self._ids):
+                self._hnsw.add_items(self._vectors, np.arange(len(self._ids)))
+                for label, tender_id in enumerate(self._ids):
+                    if tender_id is None:
+                        self._hnsw.mark_deleted(label)
+            self._hnsw.set_ef(max(TENDER_INDEX_TOP_K, 50))
+        elif capacity > self._hnsw.get_max_elements():
+            self._hnsw.resize_index(max(capacity, self._hnsw.get_max_elements() * 2))
+
+    def _add(self, tenders, vectors):
+        if not len(self._ids):
+            self._vectors = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+
+        labels = []
+        new_rows = []
+        new_deadlines = []
+        for tender, vector in zip(tenders, vectors):
+            tender_id = str(tender["_id"])
+            label = self._labels.get(tender_id)
+            if label is None:
+                label = len(self._ids)
+                self._labels[tender_id] = label
+                self._ids.append(tender_id)
+                new_rows.append(vector)
+                new_deadlines.append(deadline_timestamp(tender))
+            else:
+                self._vectors[label] = vector
+                self._deadlines[label] = deadline_timestamp(tender)
+            labels.append(label)
+
+        if new_rows:
+            self._vectors = np.vstack([self._vectors, np.stack(new_rows)])
+            self._deadlines = np.concatenate([self._deadlines, np.asarray(new_deadlines, dtype=np.float64)])
+
+        self._ensure_hnsw(vectors.shape[1], len(self._ids))
+        if self._hnsw is not None:
+            self._hnsw.add_items(vectors, np.asarray(labels))
+
+    def _evict_expired(self, now: float):
+        expired = [
+            label for label, tender_id in enumerate(self._ids)
+            if tender_id is not None and self._deadlines[label] < now
+        ]
+        for label in expired:
+            del self._labels[self._ids[label]]
+            self._ids[label] = None
+            if self._hnsw is not None:
+                self._hnsw.mark_deleted(label)
+
+        if len(self._ids) - len(self._labels) > COMPACT_FRACTION * len(self._ids):
+            keep = [label for label, tender_id in enumerate(self._ids) if tender_id is not None]
+            self._ids = [self._ids[label] for label in keep]
+            self._labels = {tender_id: label for label, tender_id in enumerate(self._ids)}
+            self._vectors = self._vectors[keep] if keep else np.zeros((0, 0), dtype=np.float32)
+            self._deadlines = self._deadlines[keep]
+            self._hnsw = None
+            if keep:
+                self._ensure_hnsw(self._vectors.shape[1], len(self._ids))
+        return len(expired)
+
+    def upsert(self, tenders):
+        """Add or refresh tenders (dicts with an _id), evict expired ones and persist the index."""
+        tenders = [t for t in tenders if t.get("_id") is not None]
+        if not tenders:
+            return 0
+
+        vectors = get_embeddings([tender_text(t) for t in tenders])
+
+        with self._file_lock(), self._lock:
+            version = self._current_version()
+            if version is not None and version != self._version:
+                self._load(version)
+            self._add(tenders, vectors)
+            self._evict_expired(time.time())
+            self._save()
+
+        return len(tenders)
+
+    def search(self, query_text: str, k: int = TENDER_INDEX_TOP_K, allowed_ids=None):
+        """
+        Return up to k ids of open tenders ordered by similarity to the query
+        text, optionally restricted to `allowed_ids`. Deadlines are checked
+        inside the search, so expired tenders never use up the k slots.
+        """
+        self._reload_if_changed()
+        if not self._labels or not query_text:
+            return []
+
+        query = get_embeddings([query_text])[0]
+
+        with self._lock:
+            open_mask = ~(self._deadlines < time.time())
+            if allowed_ids is not None:
+                allowed = np.zeros(len(self._ids), dtype=bool)
+                allowed[[self._labels[i] for i in map(str, allowed_ids) if i in self._labels]] = True
+                open_mask &= allowed
+            open_mask &= np.asarray([tender_id is not None for tender_id in self._ids])
+
+            k = min(k, int(open_mask.sum()))
+            if k <= 0:
+                return []
+
+            if self._hnsw is not None:
+                try:
+                    labels, _ = self._hnsw.knn_query(query, k=k, filter=lambda label: bool(open_mask[label]))
+                    return [self._ids[label] for label in labels[0]]
+                except RuntimeError:
+                    pass  # too few reachable neighbours for k under the filter; scan instead
+
+            norms = np.linalg.norm(self._vectors, axis=1) * max(np.linalg.norm(query), 1e-12)
+            scores = (self._vectors @ query) / np.clip(norms, 1e-12, None)
+            scores[~open_mask] = -np.inf
+            top = np.argpartition(-scores, k - 1)[:k]
+            return [self._ids[label] for label in top[np.argsort(-scores[top])]]
+
+    def rebuild(self, tenders_collection) -> int:
+        """Re-index every open tender in the collection from scratch."""
+        projection = {"title": 1, "scope_of_work": 1, "business_category": 1, "deadline_at": 1}
+        query = {"$or": [{"deadline_at": {"$gte": datetime.utcnow()}}, {"deadline_at": None}]}
+
+        with self._file_lock(), self._lock:
+            self._reset()
+            total = 0
+            batch = []
+            for tender in tenders_collection.find(query, projection):
+                batch.append(tender)
+                if len(batch) >= 256:
+                    self._add(batch, get_embeddings([tender_text(t) for t in batch]))
+                    total += len(batch)
+                    batch = []
+            if batch:
+                self._add(batch, get_embeddings([tender_text(t) for t in batch]))
+                total += len(batch)
+            self._save()
+        return total
+
+
+tender_index = TenderIndex()
+
+
+def index_tender(tender: dict):
+    return tender_index.upsert([tender])
+
+
+def search_tenders(query_text: str, k: int = TENDER_INDEX_TOP_K, allowed_ids=None):
+    return tender_index.search(query_text, k, allowed_ids)
@@ -1,19 +1,56 @@
 # services/tender_inserter.py
 
 from datetime import datetime
-from pymongo import MongoClient
 import traceback
-import os
-from dotenv import load_dotenv
-load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
-client = MongoClient(MONGO_URI)
-db = client["tender_system"]
+from core.database import db
+from services.category_vocabulary import add_terms
+from services.tender_index import index_tender
+from services.filter_cache import bump_catalog_version
+from services.job_queue import submit_job
+
 filtered_tenders = db["filtered_tenders"]
 
-def insert_tender_document(metadata: dict):
+DEADLINE_FORMATS = [
+    "%d-%b-%Y %I:%M %p",
+    "%d-%b-%Y %H:%M",
+    "%d-%b-%Y",
+    "%d-%m-%Y %I:%M %p",
+    "%d-%m-%Y",
+    "%d/%m/%Y %I:%M %p",
+    "%d/%m/%Y",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+]
+
+def parse_deadline(value):
+    """Parse portal deadline strings such as '17-Jun-2025 03:30 PM' into a datetime."""
+    if isinstance(value, datetime):
+        return value
+    if not value or not isinstance(value, str):
+        return None
+    for fmt in DEADLINE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+def backfill_deadline_dates() -> int:
+    """Store deadline_at on tenders inserted before it existed."""
+    updated = 0
+    for tender in filtered_tenders.find({"deadline_at": {"$exists": False}}, {"deadline": 1}):
+        filtered_tenders.update_one(
+            {"_id": tender["_id"]},
+            {"$set": {"deadline_at": parse_deadline(tender.get("deadline"))}}
+        )
+        updated += 1
+    return updated
+
+def insert_tender_document(metadata: dict, reverse_match: bool = True):
     """
     Inserts or updates a tender in the filtered_tenders collection using form_url as the unique key.
+    With reverse_match, a job is queued that scores the tender against every
+    company and writes the results to the matches collection.
     """
     try:
         form_url = metadata.get("form_url")
@@ -31,6 +68,7 @@ def insert_tender_document(metadata: dict):
             "scope_of_work": metadata.get("scope_of_work"),
             "estimated_budget": metadata.get("estimated_budget"),
             "deadline": metadata.get("deadline"),
+            "deadline_at": parse_deadline(metadata.get("deadline")),
             "emd": metadata.get("emd", {}),
             "tender_fee": metadata.get("tender_fee", {}),
             "documents_required": metadata.get("documents_required", []),
@@ -48,10 +86,31 @@ def insert_tender_document(metadata: dict):
                 {"_id": existing["_id"]},
                 {"$set": tender_doc}
             )
-            return str(existing["_id"]), "updated"
+            tender_id, status = str(existing["_id"]), "updated"
         else:
             result = filtered_tenders.insert_one(tender_doc)
-            return str(result.inserted_id), "inserted"
+            tender_id, status = str(result.inserted_id), "inserted"
+
+        bump_catalog_version()
+
+        try:
+            add_terms(categories=tender_doc["business_category"])
+        except Exception:
+            print("⚠️ Failed to update category vocabulary:", traceback.format_exc())
+
+        try:
+            index_tender({**tender_doc, "_id": tender_id})
+        except Exception:
+            print("⚠️ Failed to update tender index:", traceback.format_exc())
+
+        if reverse_match:
+            try:
+                # OCR, parsing and scoring run on the job queue, not in the caller
+                submit_job("reverse_match", params={"tender_id": tender_id})
+            except Exception:
+                print("⚠️ Failed to queue reverse matching:", traceback.format_exc())
+
+        return tender_id, status
 
     except Exception as e:
         print("Error inserting tender:", traceback.format_exc())
@@ -1,13 +1,65 @@
-from sentence_transformers import SentenceTransformer, util
-
-model = SentenceTransformer("all-MiniLM-L6-v2")
+import numpy as np
+from services.embedding_cache import get_embeddings, cosine_matrix
+from services.company_features import company_features, known_vectors
 
 def compute_similarity(text1, text2):
-    emb1 = model.encode(text1, convert_to_tensor=True)
-    emb2 = model.encode(text2, convert_to_tensor=True)
-    return float(util.pytorch_cos_sim(emb1, emb2)[0][0])
+    embeddings = get_embeddings([text1, text2])
+    return float(cosine_matrix(embeddings[:1], embeddings[1:])[0][0])
+
+def _criteria_text(other_criteria):
+    return " ".join(f"{k}: {v}" for k, v in other_criteria.items())
+
+def _texts_to_embed(structured_eligibility, company):
+    texts = []
+    if structured_eligibility.get("required_documents"):
+        texts += [t.lower() for t in structured_eligibility["required_documents"]]
+        texts += [c.lower() for c in company.get("documents_available", [])]
+    if structured_eligibility.get("certifications"):
+        texts += [t.lower() for t in structured_eligibility["certifications"]]
+        texts += [c.lower() for c in company.get("certifications", [])]
+    if structured_eligibility.get("other_criteria"):
+        texts.append(_criteria_text(structured_eligibility["other_criteria"]).lower())
+        texts.append(company.get("description", "").lower())
+    return texts
+
+def _embed_lookup(texts, known=None):
+    """Encode every distinct text not already in `known` once and return text -> unit vector."""
+    lookup = dict(known or {})
+    distinct = [t for t in dict.fromkeys(texts) if t not in lookup]
+    if not distinct:
+        return lookup
+    vectors = get_embeddings(distinct)
+    vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    lookup.update(zip(distinct, vectors))
+    return lookup
+
+def _count_pairs_above(tender_items, company_items, vectors, threshold=0.75):
+    """Number of (tender item, company item) pairs whose similarity exceeds threshold."""
+    if not tender_items or not company_items:
+        return 0
+    tender_matrix = np.stack([vectors[t.lower()] for t in tender_items])
+    company_matrix = np.stack([vectors[c.lower()] for c in company_items])
+    return int(((tender_matrix @ company_matrix.T) > threshold).sum())
+
+def compute_tender_match_scores(structured_eligibilities, company):
+    """
+    Score many tenders against one company, encoding every distinct document,
+    certification and criteria text across all of them in a single batch.
+
+    Companies with a stored feature record are read from it, and its
+    pre-embedded vectors are reused instead of re-encoding the company side.
+    """
+    features = company_features(company)
+    texts = []
+    for structured_eligibility in structured_eligibilities:
+        texts += _texts_to_embed(structured_eligibility, features)
+    vectors = _embed_lookup(texts, known_vectors(features))
+    return [_score_tender(structured_eligibility, features, vectors) for structured_eligibility in structured_eligibilities]
 
 def compute_tender_match_score(structured_eligibility, company):
+    return compute_tender_match_scores([structured_eligibility], company)[0]
+
+def _score_tender(structured_eligibility, company, vectors):
     score = 0
     total = 0
     field_scores = {}
@@ -74,11 +126,7 @@ def compute_tender_match_score(structured_eligibility, company):
         score += 1
         field_scores["required_documents"] = 1
     else:
-        matched_docs = sum(
-            1 for tdoc in tender_docs
-            for cdoc in company_docs
-            if compute_similarity(tdoc.lower(), cdoc.lower()) > 0.75
-        )
+        matched_docs = _count_pairs_above(tender_docs, company_docs, vectors)
         if matched_docs / len(tender_docs) >= 0.7:
             score += 1
             field_scores["required_documents"] = 1
@@ -94,11 +142,7 @@ def compute_tender_match_score(structured_eligibility, company):
         score += 1
         field_scores["certifications"] = 1
     else:
-        matched_certs = sum(
-            1 for tcert in tender_certs
-            for ccert in company_certs
-            if compute_similarity(tcert.lower(), ccert.lower()) > 0.75
-        )
+        matched_certs = _count_pairs_above(tender_certs, company_certs, vectors)
         if matched_certs / len(tender_certs) >= 0.7:
             score += 1
             field_scores["certifications"] = 1
@@ -114,8 +158,8 @@ def compute_tender_match_score(structured_eligibility, company):
         score += 1
         field_scores["other_criteria"] = 1
     else:
-        criteria_text = " ".join(f"{k}: {v}" for k, v in other_criteria.items())
-        sim = compute_similarity(criteria_text.lower(), company_desc.lower())
+        criteria_text = _criteria_text(other_criteria)
+        sim = float(np.dot(vectors[criteria_text.lower()], vectors[company_desc.lower()]))
         if sim > 0.7:
             score += 1
             field_scores["other_criteria"] = 1
@@ -0,0 +1,69 @@
+"""
+Shared fixtures: an in-memory Mongo (mongomock) in place of the configured
+database, and a deterministic bag-of-words encoder in place of the
+SentenceTransformer model, so tests run without a server or model download.
+
+Run from backend/:  pip install -r requirements-dev.txt && python -m pytest -q
+"""
+
+import hashlib
+import os
+import sys
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB_NAME", "tendorix_test")
+os.environ.setdefault("AZURE_DOC_INTEL_ENDPOINT", "http://127.0.0.1:8765/")
+os.environ.setdefault("AZURE_DOC_INTEL_KEY", "test-key")
+os.environ["EMBEDDING_SERVER_SOCKET"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mongomock
+import mongomock.gridfs
+import numpy as np
+import pytest
+
+# Must run before any service module binds `db` at import time
+import core.database
+
+mongomock.gridfs.enable_gridfs_integration()
+core.database.client = mongomock.MongoClient()
+core.database.db = core.database.client[os.environ["MONGO_DB_NAME"]]
+
+EMBEDDING_DIM = 256
+
+
+def fake_encode(texts, model_name=None) -> np.ndarray:
+    """Hashed bag of words: identical texts score 1.0, disjoint ones 0.0."""
+    vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in str(text).lower().split():
+            digest = hashlib.sha256(token.encode("utf-8")).digest()
+            vectors[row, int.from_bytes(digest[:4], "little") % EMBEDDING_DIM] += 1.0
+    return vectors
+
+
+@pytest.fixture(autouse=True)
+def fake_embeddings(monkeypatch, tmp_path):
+    import services.embedding_cache as embedding_cache
+
+    monkeypatch.setattr(embedding_cache, "encode_texts", fake_encode)
+    monkeypatch.setattr(embedding_cache, "embedding_cache",
+                        embedding_cache.EmbeddingCache(path=str(tmp_path / "embeddings.sqlite3")))
+
+
+@pytest.fixture(autouse=True)
+def clean_db(monkeypatch):
+    import services.category_vocabulary as category_vocabulary
+
+    # Vocabulary versions restart at 0 with the database, so the similarity cache must too
+    monkeypatch.setattr(category_vocabulary, "_similarity_cache", {})
+    monkeypatch.setattr(category_vocabulary, "_cache_version", None)
+    yield
+    for name in core.database.db.list_collection_names():
+        core.database.db.drop_collection(name)
+
+
+@pytest.fixture
+def db():
+    return core.database.db
@@ -0,0 +1,20 @@
+from services.category_vocabulary import add_terms, get_vocabulary_version, similar_categories, similar_keywords
+
+
+def test_lookups_read_the_precomputed_table(db):
+    add_terms(categories=["Medical  Equipment", "Road Construction"], keywords=["medical equipment"])
+
+    assert similar_categories(["Medical Equipment"]) == {"medical equipment"}
+    assert similar_keywords(["medical equipment"]) == {"medical equipment"}
+    assert similar_categories(["road construction"]) == set()
+
+
+def test_unknown_keywords_are_not_encoded_on_lookup(db, monkeypatch):
+    add_terms(categories=["water pumps"])
+    version = get_vocabulary_version()
+    monkeypatch.setattr("services.category_vocabulary.get_embeddings",
+                        lambda texts: (_ for _ in ()).throw(AssertionError("encoded on the read path")))
+
+    assert similar_categories(["water pumps"]) == set()
+    assert get_vocabulary_version() == version
+    assert db["category_vocabulary"].count_documents({"kinds": "keyword"}) == 0
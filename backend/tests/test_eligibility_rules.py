@@ -0,0 +1,95 @@
+import pytest
+
+from services.company_features import build_company_features
+from services.eligibility_rules import (
+    build_company_table, compile_eligibility, evaluate, result_for, score_tender_against_companies
+)
+from services.tender_matcher import compute_tender_match_score
+
+
+def _profile(established, turnover, pan=True, gstin=True, gem=False, certifications="", keywords="pumps"):
+    return {
+        "companyDetails": {"dateOfEstablishment": established},
+        "businessCapabilities": {
+            "businessRoles": "supplier",
+            "productServiceKeywords": keywords,
+            "certifications": certifications,
+            "hasNoCertifications": not certifications,
+        },
+        "financialLegalInfo": {
+            "hasPan": pan,
+            "hasGstin": gstin,
+            "annualTurnovers": [{"financialYear": "2023-24", "amount": turnover}],
+        },
+        "geographicDigitalReach": {"registeredOnPortals": gem},
+    }
+
+
+PROFILES = [
+    _profile("2010-01-15", "5 Cr", gem=True, certifications="ISO 9001, ISO 14001", keywords="water pumps"),
+    _profile("2022-06-01", "40 lakhs", gstin=False),
+    _profile("2018-03-10", "1.5 Cr", certifications="ISO 9001"),
+    _profile("", "0", pan=False, gstin=False),
+]
+
+TENDERS = [
+    {},
+    {
+        "pan": {"required": True},
+        "gstin": {"required": True},
+        "registration_on_gem": {"required": True},
+    },
+    {
+        "experience": {"required": True, "minimum_years": 5},
+        "financial_requirements": {"annual_turnover_required": True, "minimum_turnover_amount": 10000000},
+    },
+    {
+        "experience": {"required": False, "minimum_years": 20},
+        "financial_requirements": {"annual_turnover_required": True, "minimum_turnover_amount": None},
+        "blacklisting_or_litigation": {"mentioned": True},
+    },
+    {
+        "required_documents": ["PAN card", "GST registration certificate"],
+        "certifications": ["ISO 9001", "ISO 14001"],
+    },
+    {
+        "certifications": ["ISO 9001"],
+        "other_criteria": {"supplies": "water pumps"},
+    },
+]
+
+
+@pytest.fixture
+def companies():
+    return [
+        {"_id": f"c{i}", "features": build_company_features(profile)}
+        for i, profile in enumerate(PROFILES)
+    ]
+
+
+@pytest.mark.parametrize("tender", TENDERS)
+def test_compiled_rules_match_compute_tender_match_score(companies, tender):
+    evaluation = evaluate(compile_eligibility(tender), build_company_table(companies))
+
+    for i, company in enumerate(companies):
+        assert result_for(evaluation, i) == compute_tender_match_score(tender, company)
+
+
+def test_raw_profiles_without_features_match_too():
+    companies = [
+        {"_id": "r1", "pan": True, "gstin": True, "experience_years": 7, "annual_turnover": 2e7,
+         "certifications": ["ISO 9001"], "documents_available": ["PAN card"], "description": "water pumps"},
+        {"_id": "r2", "pan": False, "experience_years": 1},
+    ]
+    table = build_company_table(companies)
+
+    for tender in TENDERS:
+        results = score_tender_against_companies(tender, table)
+        assert results == [compute_tender_match_score(tender, company) for company in companies]
+
+
+def test_table_reads_derived_experience_years(companies):
+    table = build_company_table(companies)
+    assert table["experience_years"][0] >= 16
+    assert table["experience_years"][3] == 0
+    assert table["ids"] == ["c0", "c1", "c2", "c3"]
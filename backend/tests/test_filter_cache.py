@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import services.basic_filter as basic_filter
+from services.filter_cache import (
+    bump_catalog_version, bump_profile_version, filter_cache, filter_cache_key, get_cached_tender_ids
+)
+
+
+@pytest.fixture
+def uncached_runs(monkeypatch, db):
+    """Replace the category filter with one that returns every open tender and counts its runs."""
+    calls = []
+
+    def fake_uncached(company_profile, batch_size):
+        calls.append(company_profile["_id"])
+        yield from db["filtered_tenders"].find({}, basic_filter.TENDER_FILTER_PROJECTION)
+
+    monkeypatch.setattr(basic_filter, "_iter_filtered_uncached", fake_uncached)
+    return calls
+
+
+@pytest.fixture
+def company(db):
+    company_id = db["companies"].insert_one({"user_id": "u1", "profile_version": 0}).inserted_id
+    return db["companies"].find_one({"_id": company_id})
+
+
+def _insert_tender(db, title, deadline_at=None):
+    return db["filtered_tenders"].insert_one({
+        "title": title, "form_url": f"https://example.com/{title}.pdf", "deadline_at": deadline_at
+    }).inserted_id
+
+
+def test_second_request_is_served_from_the_cache(db, company, uncached_runs):
+    _insert_tender(db, "a")
+    _insert_tender(db, "b")
+
+    first = [t["title"] for t in basic_filter.iter_filtered_tenders(company)]
+    second = [t["title"] for t in basic_filter.iter_filtered_tenders(company)]
+
+    assert sorted(first) == sorted(second) == ["a", "b"]
+    assert len(uncached_runs) == 1
+
+
+def test_catalog_change_invalidates(db, company, uncached_runs):
+    _insert_tender(db, "a")
+    list(basic_filter.iter_filtered_tenders(company))
+
+    _insert_tender(db, "b")
+    bump_catalog_version()
+    titles = [t["title"] for t in basic_filter.iter_filtered_tenders(company)]
+
+    assert sorted(titles) == ["a", "b"]
+    assert len(uncached_runs) == 2
+
+
+def test_profile_save_drops_cached_entries(db, company, uncached_runs):
+    _insert_tender(db, "a")
+    list(basic_filter.iter_filtered_tenders(company))
+    old_key = filter_cache_key(company)
+    assert get_cached_tender_ids(old_key) is not None
+
+    bump_profile_version("u1")
+    updated = db["companies"].find_one({"_id": company["_id"]})
+
+    assert filter_cache.count_documents({"company_id": str(company["_id"])}) == 0
+    assert filter_cache_key(updated) != old_key
+    list(basic_filter.iter_filtered_tenders(updated))
+    assert len(uncached_runs) == 2
+
+
+def test_vocabulary_change_changes_the_key(db, company):
+    before = filter_cache_key(company)
+    db["category_vocabulary_meta"].update_one({"_id": "version"}, {"$inc": {"value": 1}}, upsert=True)
+    assert filter_cache_key(company) != before
+
+
+def test_cache_hit_rechecks_deadlines(db, company, uncached_runs):
+    _insert_tender(db, "open", datetime.utcnow() + timedelta(days=5))
+    closing = _insert_tender(db, "closing", datetime.utcnow() + timedelta(days=5))
+    list(basic_filter.iter_filtered_tenders(company))
+
+    db["filtered_tenders"].update_one({"_id": closing}, {"$set": {"deadline_at": datetime.utcnow() - timedelta(minutes=1)}})
+    titles = [t["title"] for t in basic_filter.iter_filtered_tenders(company)]
+
+    assert titles == ["open"]
+    assert len(uncached_runs) == 1
+
+
+def test_filtered_tender_ids_uses_the_cache(db, company, uncached_runs):
+    tender_id = _insert_tender(db, "a")
+    assert basic_filter.filtered_tender_ids(company) == [tender_id]
+    assert basic_filter.filtered_tender_ids(company) == [tender_id]
+    assert len(uncached_runs) == 1
+
+
+def test_ranking_reorders_without_dropping_tenders(db, company, uncached_runs, monkeypatch):
+    ids = [_insert_tender(db, title) for title in ("a", "b", "c")]
+    monkeypatch.setattr(basic_filter, "TENDER_INDEX_TOP_K", 1)
+    monkeypatch.setattr(basic_filter, "tender_index", [None] * 5)
+    monkeypatch.setattr(basic_filter, "search_tenders", lambda text, k, allowed_ids: [str(ids[2])])
+
+    ranked = [t["title"] for t in basic_filter.iter_filtered_tenders(company, rank=True)]
+
+    assert ranked[0] == "c"
+    assert sorted(ranked) == ["a", "b", "c"]
+    assert sorted(basic_filter.filtered_tender_ids(company)) == sorted(ids)
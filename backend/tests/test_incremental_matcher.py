@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import services.incremental_matcher as incremental_matcher
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """Record which companies and tenders each run recomputes; `fail` makes one of them fail."""
+    seen = {"companies": [], "tenders": [], "fail": set()}
+
+    def refresh(company_id):
+        seen["companies"].append(company_id)
+        return {"success": company_id not in seen["fail"], "error": "boom"}
+
+    def reverse(tender_id):
+        seen["tenders"].append(tender_id)
+        return {"success": tender_id not in seen["fail"], "error": "boom"}
+
+    monkeypatch.setattr(incremental_matcher, "refresh_company_matches", refresh)
+    monkeypatch.setattr(incremental_matcher, "reverse_match_tender", reverse)
+    return seen
+
+
+def _reset(seen):
+    seen["companies"].clear()
+    seen["tenders"].clear()
+
+
+def _open_tender(db, **fields):
+    doc = {"title": "t", "deadline_at": datetime.utcnow() + timedelta(days=10),
+           "structured_eligibility": {"pan": {"required": True}}, "created_at": datetime.utcnow(), **fields}
+    return db["filtered_tenders"].insert_one(doc).inserted_id
+
+
+def test_first_run_processes_everything(db, processed):
+    company_id = db["companies"].insert_one({"user_id": "u1", "created_at": datetime.utcnow()}).inserted_id
+    tender_id = _open_tender(db)
+    _open_tender(db, structured_eligibility={})
+    _open_tender(db, deadline_at=datetime.utcnow() - timedelta(days=1))
+
+    result = incremental_matcher.run_incremental_matching()
+
+    assert result["success"] and result["since"] is None
+    assert processed["companies"] == [company_id]
+    assert processed["tenders"] == [tender_id]
+    run = db["match_runs"].find_one({"_id": result["run_id"]})
+    assert run["status"] == "completed" and run["high_water_mark"] == run["created_at"]
+
+
+def test_next_run_only_processes_changes_after_the_mark(db, processed):
+    old_company = db["companies"].insert_one({"user_id": "u1", "created_at": datetime.utcnow() - timedelta(days=3)}).inserted_id
+    _open_tender(db, created_at=datetime.utcnow() - timedelta(days=3))
+    first = incremental_matcher.run_incremental_matching()
+    _reset(processed)
+
+    stale = db["companies"].insert_one({"user_id": "u2", "created_at": datetime.utcnow() - timedelta(days=3),
+                                        "matches_stale_since": datetime.utcnow() - timedelta(days=2)}).inserted_id
+    updated = db["companies"].insert_one({"user_id": "u3", "created_at": datetime.utcnow() - timedelta(days=3),
+                                          "updated_at": datetime.utcnow() + timedelta(seconds=1)}).inserted_id
+    new_tender = _open_tender(db, created_at=datetime.utcnow() + timedelta(seconds=1))
+    reextracted = _open_tender(db, created_at=datetime.utcnow() - timedelta(days=3),
+                               last_updated=datetime.utcnow() + timedelta(seconds=1))
+
+    second = incremental_matcher.run_incremental_matching()
+
+    mark = db["match_runs"].find_one({"_id": first["run_id"]})["high_water_mark"]
+    assert second["since"] == mark
+    assert old_company not in processed["companies"]
+    assert sorted(processed["companies"]) == sorted([stale, updated])
+    assert sorted(processed["tenders"]) == sorted([new_tender, reextracted])
+
+
+def test_failed_run_does_not_advance_the_mark(db, processed):
+    incremental_matcher.run_incremental_matching()
+    mark = incremental_matcher.last_high_water_mark()
+
+    tender_id = _open_tender(db, created_at=datetime.utcnow() + timedelta(seconds=1))
+    processed["fail"].add(tender_id)
+    failed = incremental_matcher.run_incremental_matching()
+
+    assert not failed["success"] and failed["errors"] == 1
+    assert db["match_runs"].find_one({"_id": failed["run_id"]})["status"] == "failed"
+    assert incremental_matcher.last_high_water_mark() == mark
+
+    # The change is picked up again by the next run
+    _reset(processed)
+    processed["fail"].clear()
+    assert incremental_matcher.run_incremental_matching()["success"]
+    assert processed["tenders"] == [tender_id]
+
+
+def test_expired_matches_are_removed(db, processed):
+    db["matches"].insert_many([
+        {"company_id": "c1", "tender_id": "expired", "deadline_at": datetime.utcnow() - timedelta(hours=1)},
+        {"company_id": "c1", "tender_id": "open", "deadline_at": datetime.utcnow() + timedelta(days=1)},
+        {"company_id": "c1", "tender_id": "undated", "deadline_at": None},
+    ])
+
+    result = incremental_matcher.run_incremental_matching()
+
+    assert result["expired_removed"] == 1
+    assert sorted(m["tender_id"] for m in db["matches"].find()) == ["open", "undated"]
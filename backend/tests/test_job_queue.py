@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import services.job_queue as job_queue
+
+
+class RecordingExecutor:
+    """Stands in for the job thread pool; tests run the queued jobs themselves."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    recorder = RecordingExecutor()
+    monkeypatch.setattr(job_queue, "_executor", recorder)
+    return recorder
+
+
+@pytest.fixture
+def company(db):
+    company_id = db["companies"].insert_one({"user_id": "u1"}).inserted_id
+    return db["companies"].find_one({"_id": company_id})
+
+
+@pytest.fixture
+def tenders(db):
+    docs = [
+        {"title": f"t{i}", "form_url": f"https://example.com/t{i}.pdf", "structured_eligibility": {"score": score}}
+        for i, score in enumerate((90.0, 40.0, 75.0))
+    ]
+    db["filtered_tenders"].insert_many(docs)
+    return docs
+
+
+@pytest.fixture
+def scoring(monkeypatch, tenders):
+    """Filter returns the fixture tenders; the score is read straight from the eligibility."""
+    calls = []
+
+    def fake_score(structured_eligibility, company):
+        calls.append(structured_eligibility)
+        score = structured_eligibility["score"]
+        return {"matching_score": score, "eligible": score >= 70, "field_scores": {}, "missing_fields": []}
+
+    monkeypatch.setattr("services.basic_filter.iter_filtered_tenders", lambda company: iter(tenders))
+    monkeypatch.setattr("services.tender_matcher.compute_tender_match_score", fake_score)
+    return calls
+
+
+def _job(db, job_id):
+    return db["jobs"].find_one({"_id": ObjectId(job_id)})
+
+
+def test_unknown_kind_is_rejected(executor, company):
+    with pytest.raises(ValueError):
+        job_queue.submit_job("export", company)
+    assert executor.submitted == []
+
+
+def test_active_jobs_are_deduplicated_by_params(executor, company):
+    first = job_queue.submit_job("match", company, {"threshold": 60.0, "sort": "score"})
+    same = job_queue.submit_job("match", company, {"sort": "score", "threshold": 60.0})
+    other = job_queue.submit_job("match", company, {"threshold": 80.0})
+
+    assert first == same
+    assert other != first
+    assert len(executor.submitted) == 2
+
+
+def test_finished_jobs_are_not_reused(db, executor, company, scoring):
+    first = job_queue.submit_job("match", company, {"threshold": 60.0})
+    job_queue.run_job(ObjectId(first))
+
+    assert job_queue.submit_job("match", company, {"threshold": 60.0}) != first
+
+
+def test_completed_match_job_refreshes_the_matches_table(db, executor, company, tenders, scoring):
+    db["companies"].update_one({"_id": company["_id"]},
+                               {"$set": {"matches_stale_since": datetime.utcnow() - timedelta(minutes=5)}})
+    db["matches"].insert_one({"company_id": str(company["_id"]), "tender_id": "left-the-filter", "matching_score": 99})
+
+    job_id = job_queue.submit_job("match", company, {"threshold": 60.0})
+    job_queue.run_job(ObjectId(job_id))
+
+    job = _job(db, job_id)
+    assert job["status"] == "completed"
+    assert job["progress"] == {"total": 3, "processed": 3, "matched": 2, "errors": 0}
+    assert sorted(r["title"] for r in job["results"]) == ["t0", "t2"]
+
+    rows = {m["tender_id"] for m in db["matches"].find({"company_id": str(company["_id"])})}
+    assert rows == {str(t["_id"]) for t in tenders}
+
+    refreshed = db["companies"].find_one({"_id": company["_id"]})
+    assert "matches_stale_since" not in refreshed
+    assert refreshed["matches_refreshed_at"] is not None
+
+
+def test_never_refreshed_company_is_marked_refreshed(db, executor, company, scoring):
+    job_id = job_queue.submit_job("match", company)
+    job_queue.run_job(ObjectId(job_id))
+
+    assert db["companies"].find_one({"_id": company["_id"]})["matches_refreshed_at"] is not None
+
+
+def test_marker_set_after_the_job_was_created_survives(db, executor, company, scoring):
+    job_id = job_queue.submit_job("match", company)
+    later = _job(db, job_id)["created_at"] + timedelta(seconds=1)
+    db["companies"].update_one({"_id": company["_id"]}, {"$set": {"matches_stale_since": later}})
+
+    job_queue.run_job(ObjectId(job_id))
+
+    refreshed = db["companies"].find_one({"_id": company["_id"]})
+    assert refreshed["matches_stale_since"] == later
+    assert "matches_refreshed_at" not in refreshed
+
+
+def test_claimed_job_is_not_run_twice(db, executor, company, scoring):
+    job_id = job_queue.submit_job("match", company)
+    job_queue.run_job(ObjectId(job_id))
+    job_queue.run_job(ObjectId(job_id))
+
+    assert len(scoring) == 3
+
+
+def test_cancel_stops_after_the_tender_in_flight(db, executor, company, monkeypatch, scoring):
+    monkeypatch.setattr(job_queue, "JOB_TENDER_CONCURRENCY", 1)
+    job_id = job_queue.submit_job("match", company)
+
+    def cancel_on_first(structured_eligibility, company):
+        job_queue.cancel_job(job_id, "u1")
+        return {"matching_score": 0.0, "eligible": False, "field_scores": {}, "missing_fields": []}
+
+    monkeypatch.setattr("services.tender_matcher.compute_tender_match_score", cancel_on_first)
+    db["companies"].update_one({"_id": company["_id"]}, {"$set": {"matches_stale_since": datetime.utcnow()}})
+    job_queue.run_job(ObjectId(job_id))
+
+    job = _job(db, job_id)
+    assert job["status"] == "cancelled"
+    assert job["progress"]["processed"] == 1
+    # A cancelled job leaves the stale marker for the next refresh
+    assert "matches_stale_since" in db["companies"].find_one({"_id": company["_id"]})
+
+
+def test_cancel_is_scoped_to_the_owner(db, executor, company):
+    job_id = job_queue.submit_job("match", company)
+    assert not job_queue.cancel_job(job_id, "someone-else")
+    assert job_queue.cancel_job(job_id, "u1")
+
+
+def test_missing_company_fails_the_job(db, executor, company, scoring):
+    job_id = job_queue.submit_job("match", company)
+    db["companies"].delete_one({"_id": company["_id"]})
+    job_queue.run_job(ObjectId(job_id))
+
+    job = _job(db, job_id)
+    assert job["status"] == "failed"
+    assert "not found" in job["error"]
+
+
+def test_batch_process_preprocesses_pending_tenders(db, executor, company, monkeypatch, scoring):
+    pending_id = db["filtered_tenders"].insert_one({"title": "pending", "form_url": "https://example.com/p.pdf"}).inserted_id
+    preprocessed = []
+
+    def fake_preprocess(tender):
+        preprocessed.append(tender["_id"])
+        return {"score": 80.0}
+
+    monkeypatch.setattr("services.eligibility_preprocessor.preprocess_if_pending", fake_preprocess)
+    job_id = job_queue.submit_job("batch_process", company)
+    job_queue.run_job(ObjectId(job_id))
+
+    job = _job(db, job_id)
+    assert preprocessed == [pending_id]
+    assert job["progress"]["processed"] == 4
+    assert "pending" in {r["title"] for r in job["results"]}
+
+
+def test_stale_running_jobs_are_resumed(db, executor, company):
+    job_id = job_queue.submit_job("match", company)
+    executor.submitted.clear()
+    db["jobs"].update_one({"_id": ObjectId(job_id)}, {"$set": {
+        "status": "running", "heartbeat_at": datetime.utcnow() - timedelta(seconds=job_queue.JOB_LEASE_SECONDS + 60)
+    }})
+
+    assert job_queue.resume_pending_jobs() == 1
+    assert executor.submitted == [(ObjectId(job_id),)]
+
+
+def test_reverse_match_job_heartbeats_while_it_runs(db, executor, monkeypatch):
+    import time
+
+    monkeypatch.setattr(job_queue, "JOB_LEASE_SECONDS", 0.09)
+    beats = []
+
+    def slow_reverse_match(tender_id):
+        started = _job(db, job_id)["heartbeat_at"]
+        time.sleep(0.2)
+        beats.append(_job(db, job_id)["heartbeat_at"] > started)
+        return {"success": True, "tender_id": tender_id}
+
+    monkeypatch.setattr("services.reverse_matcher.reverse_match_tender", slow_reverse_match)
+    job_id = job_queue.submit_job("reverse_match", params={"tender_id": "t1"})
+    job_queue.run_job(ObjectId(job_id))
+
+    assert beats == [True]
+    assert _job(db, job_id)["status"] == "completed"
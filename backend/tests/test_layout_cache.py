@@ -0,0 +1,132 @@
+from types import SimpleNamespace
+
+import pytest
+
+import services.eligibility_extractor as eligibility_extractor
+import services.eligibility_preprocessor as eligibility_preprocessor
+from services.layout_cache import LayoutCache, content_hash, paragraph_tuples
+
+PARAGRAPHS = [
+    ("title", "Tender for supply of water pumps"),
+    (None, "Scope: 20 submersible pumps"),
+    ("sectionHeading", "Eligibility Criteria"),
+    (None, "Bidder must hold a valid GST registration."),
+    (None, "Minimum turnover of 1 Cr in the last three years."),
+    ("sectionHeading", "Payment Terms"),
+    (None, "Payment within 30 days."),
+]
+ELIGIBILITY_TEXT = "Bidder must hold a valid GST registration.\nMinimum turnover of 1 Cr in the last three years."
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = LayoutCache(path=str(tmp_path / "layouts.sqlite3"))
+    monkeypatch.setattr("services.layout_cache.layout_cache", cache)
+    monkeypatch.setattr(eligibility_extractor, "layout_cache", cache)
+    monkeypatch.setattr(eligibility_preprocessor, "layout_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def document_intelligence(monkeypatch):
+    """Serves fixed PDF bytes per URL and records every layout analysis request."""
+    pdfs = {}
+    analyzed = []
+
+    def fake_get(url, timeout=None):
+        return SimpleNamespace(content=pdfs[url], raise_for_status=lambda: None)
+
+    def begin_analyze_document(model_id, body, polling_interval=None):
+        analyzed.append(body)
+        paragraphs = [SimpleNamespace(role=role, content=content) for role, content in PARAGRAPHS]
+        return SimpleNamespace(result=lambda: SimpleNamespace(paragraphs=paragraphs))
+
+    monkeypatch.setattr(eligibility_extractor.requests, "get", fake_get)
+    monkeypatch.setattr(eligibility_extractor, "get_client",
+                        lambda: SimpleNamespace(begin_analyze_document=begin_analyze_document))
+    return SimpleNamespace(pdfs=pdfs, analyzed=analyzed)
+
+
+def test_round_trip_and_url_lookup(cache):
+    digest = content_hash(b"%PDF-1.7 pumps")
+    assert cache.get(digest) is None
+
+    cache.put(digest, PARAGRAPHS)
+    cache.remember_url("https://example.com/a.pdf", digest)
+
+    assert cache.get(digest) == PARAGRAPHS
+    assert cache.hash_for_url("https://example.com/a.pdf") == digest
+    assert cache.paragraphs_for_url("https://example.com/a.pdf") == PARAGRAPHS
+    assert cache.paragraphs_for_url("https://example.com/unknown.pdf") is None
+    assert cache.stats()["layouts"] == 1 and cache.stats()["hits"] == 2
+
+
+def test_paragraph_tuples_keeps_roles():
+    paragraphs = [SimpleNamespace(role="title", content="Notice"), SimpleNamespace(role=None, content=None)]
+    assert paragraph_tuples(paragraphs) == [("title", "Notice"), (None, "")]
+    assert paragraph_tuples(None) == []
+
+
+def test_eligibility_section_slices_between_headings():
+    assert eligibility_extractor.eligibility_section(PARAGRAPHS) == ELIGIBILITY_TEXT
+    assert eligibility_extractor.eligibility_section([(None, "No headings at all")]) == ""
+    assert eligibility_extractor.eligibility_section(None) == ""
+
+
+def test_same_document_is_analyzed_once(cache, document_intelligence):
+    document_intelligence.pdfs["https://example.com/a.pdf"] = b"%PDF-1.7 pumps"
+    document_intelligence.pdfs["https://mirror.example.com/a.pdf"] = b"%PDF-1.7 pumps"
+
+    first = eligibility_extractor.extract_eligibility_text_from_url("https://example.com/a.pdf")
+    again = eligibility_extractor.extract_eligibility_text_from_url("https://example.com/a.pdf")
+    mirrored = eligibility_extractor.extract_eligibility_text_from_url("https://mirror.example.com/a.pdf")
+
+    assert first == again == mirrored == ELIGIBILITY_TEXT
+    assert len(document_intelligence.analyzed) == 1
+    assert document_intelligence.analyzed[0].bytes_source == b"%PDF-1.7 pumps"
+
+
+def test_changed_document_is_analyzed_again(cache, document_intelligence):
+    document_intelligence.pdfs["https://example.com/a.pdf"] = b"%PDF-1.7 v1"
+    eligibility_extractor.analyze_layout("https://example.com/a.pdf")
+    document_intelligence.pdfs["https://example.com/a.pdf"] = b"%PDF-1.7 v2"
+    eligibility_extractor.analyze_layout("https://example.com/a.pdf")
+
+    assert len(document_intelligence.analyzed) == 2
+    assert cache.hash_for_url("https://example.com/a.pdf") == content_hash(b"%PDF-1.7 v2")
+
+
+def test_reslice_dry_run_and_apply(db, cache):
+    tenders = db["filtered_tenders"]
+    for url, digest in (("https://example.com/same.pdf", "h1"), ("https://example.com/new.pdf", "h2")):
+        cache.remember_url(url, digest)
+    cache.put("h1", PARAGRAPHS)
+    cache.put("h2", PARAGRAPHS)
+
+    same_id = tenders.insert_one({"form_url": "https://example.com/same.pdf", "raw_eligibility": ELIGIBILITY_TEXT,
+                                  "structured_eligibility": {"pan": {"required": True}}}).inserted_id
+    found_id = tenders.insert_one({"form_url": "https://example.com/new.pdf", "raw_eligibility": "",
+                                   "structured_eligibility": {}, "eligibility_status": "no_eligibility"}).inserted_id
+    tenders.insert_one({"form_url": "https://example.com/uncached.pdf"})
+
+    expected = {"cached": 2, "uncached": 1, "unchanged": 1, "changed": 1, "found": 1, "lost": 0}
+    assert eligibility_preprocessor.reslice_cached_layouts() == expected
+    assert tenders.find_one({"_id": found_id})["raw_eligibility"] == ""
+
+    assert eligibility_preprocessor.reslice_cached_layouts(apply=True) == expected
+    found = tenders.find_one({"_id": found_id})
+    assert found["raw_eligibility"] == ELIGIBILITY_TEXT
+    assert "structured_eligibility" not in found and "eligibility_status" not in found
+    assert tenders.find_one({"_id": same_id})["structured_eligibility"] == {"pan": {"required": True}}
+
+
+def test_reslice_marks_lost_sections_empty(db, cache):
+    cache.remember_url("https://example.com/a.pdf", "h1")
+    cache.put("h1", [("title", "Notice inviting tender"), (None, "Details to follow")])
+    tender_id = db["filtered_tenders"].insert_one({"form_url": "https://example.com/a.pdf",
+                                                   "raw_eligibility": "Old text"}).inserted_id
+
+    assert eligibility_preprocessor.reslice_cached_layouts(apply=True)["lost"] == 1
+    tender = db["filtered_tenders"].find_one({"_id": tender_id})
+    assert tender["raw_eligibility"] == ""
+    assert tender["eligibility_status"] == eligibility_preprocessor.STATUS_EMPTY
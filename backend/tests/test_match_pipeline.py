@@ -0,0 +1,53 @@
+import services.match_pipeline as match_pipeline
+
+
+def test_refresh_keeps_rows_of_tenders_that_could_not_be_scored(db, monkeypatch):
+    company_id = db["companies"].insert_one({"user_id": "u1"}).inserted_id
+    tenders = [
+        {"_id": "scored", "form_url": "https://example.com/a.pdf", "structured_eligibility": {"ok": True}},
+        {"_id": "crashes", "form_url": "https://example.com/b.pdf", "structured_eligibility": {"ok": False}},
+        {"_id": "unprocessed", "form_url": "https://example.com/c.pdf"},
+    ]
+
+    def fake_score(structured_eligibility, company):
+        if not structured_eligibility["ok"]:
+            raise RuntimeError("scoring failed")
+        return {"matching_score": 80.0, "eligible": True, "field_scores": {}, "missing_fields": []}
+
+    monkeypatch.setattr(match_pipeline, "iter_filtered_tenders", lambda company, **options: iter(tenders))
+    monkeypatch.setattr(match_pipeline, "compute_tender_match_score", fake_score)
+    db["matches"].insert_many([
+        {"company_id": str(company_id), "tender_id": tender_id, "matching_score": 50.0}
+        for tender_id in ("scored", "crashes", "unprocessed", "left-the-filter")
+    ])
+
+    result = match_pipeline.refresh_company_matches(company_id)
+
+    assert result["success"] and result["errors"] == 1 and result["removed"] == 1
+    rows = {m["tender_id"]: m["matching_score"] for m in db["matches"].find()}
+    assert rows == {"scored": 80.0, "crashes": 50.0, "unprocessed": 50.0}
+
+
+def test_scoring_without_extraction_runs_inline(db, monkeypatch):
+    tenders = [{"_id": f"t{i}", "form_url": f"https://example.com/{i}.pdf", "structured_eligibility": {"ok": True}}
+               for i in range(3)]
+    monkeypatch.setattr(match_pipeline, "iter_filtered_tenders", lambda company, **options: iter(tenders))
+    monkeypatch.setattr(match_pipeline, "compute_tender_match_score",
+                        lambda se, company: {"matching_score": 90.0, "eligible": True, "field_scores": {}, "missing_fields": []})
+    monkeypatch.setattr(match_pipeline, "ThreadPoolExecutor", None)
+
+    found = list(match_pipeline.iter_tender_matches({"_id": "c1"}, concurrency=8))
+
+    assert [m["_id"] for m in found] == ["t0", "t1", "t2"]
+
+
+def test_finish_refresh_clears_the_marker_set_before_the_stream(db):
+    from datetime import datetime, timedelta
+
+    started_at = datetime.utcnow()
+    company_id = db["companies"].insert_one({"matches_stale_since": started_at - timedelta(minutes=1)}).inserted_id
+    db["matches"].insert_many([{"company_id": str(company_id), "tender_id": t} for t in ("kept", "gone")])
+
+    assert match_pipeline.finish_refresh({"_id": company_id}, ["kept"], started_at) == 1
+    company = db["companies"].find_one({"_id": company_id})
+    assert "matches_stale_since" not in company and company["matches_refreshed_at"]
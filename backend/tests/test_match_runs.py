@@ -0,0 +1,201 @@
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+
+import services.match_runs as match_runs
+
+
+@pytest.fixture
+def companies(db):
+    ids = db["companies"].insert_many([
+        {"user_id": "u1", "matches_stale_since": datetime.utcnow() - timedelta(hours=1)},
+        {"user_id": "u2"},
+    ]).inserted_ids
+    return ids
+
+
+@pytest.fixture
+def run_id(db, companies):
+    """A run whose catalog is published and whose units are planned: one unit per company."""
+    run_id = match_runs.create_run(threshold=60.0)
+    db["match_run_units"].insert_many([
+        {"run_id": run_id, "unit": i, "company_ids": [company_id], "tender_range": [0, 10],
+         "status": "pending", "attempts": 0}
+        for i, company_id in enumerate(companies)
+    ])
+    db["match_runs"].update_one({"_id": run_id}, {"$set": {
+        "catalog_ready": True, "catalog_tenders": 10, "units_planned": True, "total_units": len(companies)
+    }})
+    return run_id
+
+
+def _unit(db, run_id, number):
+    return db["match_run_units"].find_one({"run_id": run_id, "unit": number})
+
+
+def _expire_lease(db, unit):
+    db["match_run_units"].update_one({"_id": unit["_id"]}, {"$set": {"lease_until": datetime.utcnow() - timedelta(seconds=1)}})
+
+
+def test_units_are_leased_in_order_once(db, run_id):
+    first = match_runs.claim_unit(run_id, "a:1")
+    second = match_runs.claim_unit(run_id, "b:2")
+
+    assert (first["unit"], first["worker"], first["attempts"]) == (0, "a:1", 1)
+    assert (second["unit"], second["worker"]) == (1, "b:2")
+    assert match_runs.claim_unit(run_id, "c:3") is None
+
+
+def test_expired_lease_is_taken_over(db, run_id):
+    first = match_runs.claim_unit(run_id, "a:1")
+    match_runs.claim_unit(run_id, "a:1")
+    _expire_lease(db, first)
+
+    takeover = match_runs.claim_unit(run_id, "b:2")
+
+    assert takeover["unit"] == 0 and takeover["attempts"] == 2
+    assert not match_runs.heartbeat(first, {"tenders_done": 5})
+    assert match_runs.heartbeat(takeover, {"tenders_done": 5})
+    assert _unit(db, run_id, 0)["progress"] == {"tenders_done": 5}
+
+
+def test_failed_unit_is_retried_until_attempts_run_out(db, run_id, monkeypatch):
+    monkeypatch.setattr(match_runs, "MATCH_RUN_MAX_ATTEMPTS", 2)
+
+    unit = match_runs.claim_unit(run_id, "a:1")
+    match_runs.fail_unit(unit, "boom")
+    assert _unit(db, run_id, 0)["status"] == "pending"
+
+    unit = match_runs.claim_unit(run_id, "a:1")
+    assert unit["unit"] == 0 and unit["attempts"] == 2
+    match_runs.fail_unit(unit, "boom again")
+
+    failed = _unit(db, run_id, 0)
+    assert failed["status"] == "failed" and failed["error"] == "boom again"
+    assert match_runs.claim_unit(run_id, "a:1")["unit"] == 1
+
+
+def test_lease_expired_on_the_final_attempt_is_failed(db, run_id, monkeypatch):
+    monkeypatch.setattr(match_runs, "MATCH_RUN_MAX_ATTEMPTS", 1)
+    unit = match_runs.claim_unit(run_id, "a:1")
+    _expire_lease(db, unit)
+
+    assert match_runs.expire_abandoned_units(run_id) == 1
+    assert _unit(db, run_id, 0)["status"] == "failed"
+
+
+def test_reset_failed_units_reopens_the_run(db, run_id):
+    db["match_run_units"].update_one({"run_id": run_id, "unit": 0}, {"$set": {"status": "failed", "attempts": 3, "error": "x"}})
+    db["match_runs"].update_one({"_id": run_id}, {"$set": {"status": "failed"}})
+
+    assert match_runs.reset_failed_units(run_id) == 1
+
+    unit = _unit(db, run_id, 0)
+    assert (unit["status"], unit["attempts"]) == ("pending", 0)
+    assert "error" not in unit
+    assert match_runs.get_run(run_id)["status"] == "running"
+
+
+def test_release_dead_leases_only_frees_dead_local_workers(db, run_id, monkeypatch):
+    monkeypatch.setattr(match_runs, "_process_alive", lambda pid: pid != 999999)
+    host = socket.gethostname()
+    dead = match_runs.claim_unit(run_id, f"{host}:999999")
+    remote = match_runs.claim_unit(run_id, "some-other-host:999999")
+
+    assert match_runs.release_dead_leases(run_id) == 1
+    assert _unit(db, run_id, dead["unit"])["status"] == "pending"
+    assert _unit(db, run_id, remote["unit"])["status"] == "leased"
+
+
+def _fake_shard(calls, fail_for=()):
+    def match_company_shard(directory, company_ids, threshold, heartbeat=None, tender_range=None):
+        calls.append(company_ids)
+        if any(company_id in fail_for for company_id in company_ids):
+            raise RuntimeError("shard crashed")
+        heartbeat({"tenders_done": tender_range[1]})
+        return [{"company_id": str(c), "total_filtered": 10, "total_matches": 2} for c in company_ids]
+    return match_company_shard
+
+
+def test_resumed_run_skips_finished_units(db, run_id, companies, monkeypatch):
+    calls = []
+    monkeypatch.setattr(match_runs, "local_catalog", lambda run_id: "/tmp/catalog")
+    monkeypatch.setattr(match_runs, "match_company_shard", _fake_shard(calls))
+    db["match_run_units"].update_one({"run_id": run_id, "unit": 0}, {"$set": {"status": "done", "results": []}})
+
+    assert match_runs.work_on_run(run_id, "a:1") == 1
+    assert calls == [[companies[1]]]
+    assert _unit(db, run_id, 1)["status"] == "done"
+
+
+def test_crashing_unit_is_retried_then_failed(db, run_id, companies, monkeypatch):
+    calls = []
+    monkeypatch.setattr(match_runs, "local_catalog", lambda run_id: "/tmp/catalog")
+    monkeypatch.setattr(match_runs, "match_company_shard", _fake_shard(calls, fail_for={companies[0]}))
+
+    assert match_runs.work_on_run(run_id, "a:1") == 1
+    assert calls.count([companies[0]]) == match_runs.MATCH_RUN_MAX_ATTEMPTS
+    assert _unit(db, run_id, 0)["status"] == "failed"
+
+    finished = match_runs.finish_run(run_id)
+    assert finished["status"] == "failed"
+    assert [e["company_id"] for e in finished["errors"]] == [str(companies[0])]
+    assert match_runs.get_run(run_id).get("high_water_mark") is None
+
+
+def test_finish_waits_for_outstanding_units(db, run_id):
+    match_runs.claim_unit(run_id, "a:1")
+    assert match_runs.finish_run(run_id)["status"] == "running"
+    assert match_runs.get_run(run_id)["status"] == "running"
+
+
+def test_completed_run_sets_the_high_water_mark(db, run_id, companies, monkeypatch):
+    monkeypatch.setattr(match_runs, "local_catalog", lambda run_id: "/tmp/catalog")
+    monkeypatch.setattr(match_runs, "match_company_shard", _fake_shard([]))
+    run = match_runs.get_run(run_id)
+    db["matches"].insert_many([
+        {"company_id": str(companies[0]), "tender_id": "old", "updated_at": run["created_at"] - timedelta(days=1)},
+        {"company_id": str(companies[0]), "tender_id": "rewritten", "updated_at": run["created_at"] + timedelta(seconds=1)},
+        {"company_id": "not-in-run", "tender_id": "old", "updated_at": run["created_at"] - timedelta(days=1)},
+    ])
+    late = run["created_at"] + timedelta(seconds=5)
+    db["companies"].update_one({"_id": companies[1]}, {"$set": {"matches_stale_since": late}})
+
+    match_runs.work_on_run(run_id, "a:1")
+    finished = match_runs.finish_run(run_id)
+
+    assert finished["status"] == "completed"
+    assert sorted(r["company_id"] for r in finished["user_results"]) == sorted(map(str, companies))
+    assert match_runs.get_run(run_id)["high_water_mark"] == run["created_at"]
+    assert match_runs.last_high_water_mark() == run["created_at"]
+
+    remaining = {(m["company_id"], m["tender_id"]) for m in db["matches"].find()}
+    assert remaining == {(str(companies[0]), "rewritten"), ("not-in-run", "old")}
+
+    first, second = (db["companies"].find_one({"_id": i}) for i in companies)
+    assert "matches_stale_since" not in first and first["matches_refreshed_at"]
+    # Marked stale after the run started, so the run's output may predate the change
+    assert second["matches_stale_since"] == late
+
+
+def test_no_high_water_mark_before_any_completed_run(db, run_id):
+    assert match_runs.last_high_water_mark() is None
+
+
+def test_finishing_a_completed_run_again_is_a_no_op(db, run_id, companies, monkeypatch):
+    monkeypatch.setattr(match_runs, "local_catalog", lambda run_id: "/tmp/catalog")
+    monkeypatch.setattr(match_runs, "match_company_shard", _fake_shard([]))
+    match_runs.work_on_run(run_id, "a:1")
+    assert match_runs.finish_run(run_id)["status"] == "completed"
+
+    # A row the first finish would have treated as stale must survive a second finish
+    run = match_runs.get_run(run_id)
+    db["matches"].insert_one({"company_id": str(companies[0]), "tender_id": "later",
+                              "updated_at": run["created_at"] - timedelta(seconds=1)})
+
+    again = match_runs.finish_run(run_id)
+
+    assert again["status"] == "completed"
+    assert db["matches"].count_documents({"tender_id": "later"}) == 1
+    assert match_runs.get_run(run_id)["finished_at"] == run["finished_at"]
@@ -0,0 +1,14 @@
+from services.match_store import find_match, purge_legacy_matches, upsert_match
+
+
+def test_legacy_rows_are_not_cache_hits_and_are_purged(db):
+    db["matches"].insert_one({"company_id": "c1", "form_url": "https://example.com/a.pdf",
+                              "result_json": "{}", "structured": {}})
+    assert find_match("c1", "https://example.com/a.pdf") is None
+
+    assert purge_legacy_matches() == 1
+    tender = {"_id": "t1", "form_url": "https://example.com/a.pdf", "title": "a"}
+    upsert_match({"_id": "c1"}, tender, {"matching_score": 80.0, "eligible": True, "field_scores": {}, "missing_fields": []})
+
+    assert find_match("c1", "https://example.com/a.pdf")["matching_score"] == 80.0
+    assert purge_legacy_matches() == 0
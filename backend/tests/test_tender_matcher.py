@@ -0,0 +1,133 @@
+import pytest
+
+from services.company_features import build_company_features, company_features
+from services.tender_matcher import compute_similarity, compute_tender_match_score, compute_tender_match_scores
+
+PROFILE = {
+    "companyDetails": {"dateOfEstablishment": "2015-04-01"},
+    "businessCapabilities": {
+        "businessRoles": "manufacturer",
+        "industrySectors": "medical equipment",
+        "productServiceKeywords": "ventilators, infusion pumps",
+        "certifications": "ISO 9001, ISO 13485",
+    },
+    "financialLegalInfo": {
+        "hasPan": True,
+        "hasGstin": True,
+        "annualTurnovers": [{"financialYear": "2023-24", "amount": "2.5 Cr"}],
+    },
+    "tenderExperience": {"tenderTypesHandled": "supply"},
+    "geographicDigitalReach": {"registeredOnPortals": True, "hasDigitalSignature": True},
+}
+
+TENDERS = [
+    {},
+    {
+        "pan": {"required": True},
+        "gstin": {"required": True},
+        "experience": {"required": True, "minimum_years": 3},
+        "financial_requirements": {"annual_turnover_required": True, "minimum_turnover_amount": 10000000},
+        "required_documents": ["PAN card", "GST registration certificate"],
+        "certifications": ["ISO 9001"],
+    },
+    {
+        "experience": {"required": True, "minimum_years": 50},
+        "financial_requirements": {"annual_turnover_required": True, "minimum_turnover_amount": 500000000},
+        "blacklisting_or_litigation": {"mentioned": True},
+        "certifications": ["CE marking", "BIS licence"],
+        "other_criteria": {"past_supply": "three hospital projects"},
+    },
+    {
+        "registration_on_gem": {"required": True},
+        "required_documents": ["Digital signature certificate", "Import license", "Solvency certificate"],
+        "other_criteria": {"sector": "medical equipment"},
+    },
+]
+
+
+def _reference_score(structured_eligibility, company):
+    """The original per-pair loop, one compute_similarity call per pair."""
+    score = 0
+    total = 9
+    field_scores = {}
+    missing_fields = []
+
+    def passed(field, ok):
+        nonlocal score
+        field_scores[field] = int(ok)
+        score += int(ok)
+        if not ok:
+            missing_fields.append(field)
+
+    for field in ("pan", "gstin", "registration_on_gem"):
+        required = structured_eligibility.get(field, {}).get("required", False)
+        passed(field, not required or company.get(field, False))
+
+    experience = structured_eligibility.get("experience", {})
+    passed("experience", not experience.get("required") or
+           company.get("experience_years", 0) >= (experience.get("minimum_years", 0) or 0))
+
+    financial = structured_eligibility.get("financial_requirements", {})
+    passed("financial_requirements", not financial.get("annual_turnover_required") or
+           company.get("annual_turnover", 0) >= (financial.get("minimum_turnover_amount", 0) or 0))
+
+    passed("blacklisting_or_litigation", not structured_eligibility.get("blacklisting_or_litigation", {}).get("mentioned"))
+
+    for field, company_field in (("required_documents", "documents_available"), ("certifications", "certifications")):
+        wanted = structured_eligibility.get(field, [])
+        if not wanted:
+            passed(field, True)
+            continue
+        matched = sum(
+            1 for w in wanted for c in company.get(company_field, [])
+            if compute_similarity(w.lower(), c.lower()) > 0.75
+        )
+        passed(field, matched / len(wanted) >= 0.7)
+
+    other_criteria = structured_eligibility.get("other_criteria", {})
+    if not other_criteria:
+        passed("other_criteria", True)
+    else:
+        criteria_text = " ".join(f"{k}: {v}" for k, v in other_criteria.items())
+        passed("other_criteria", compute_similarity(criteria_text.lower(), company.get("description", "").lower()) > 0.7)
+
+    final_score = round(score / total * 100, 2)
+    return {"matching_score": final_score, "eligible": final_score >= 70,
+            "field_scores": field_scores, "missing_fields": missing_fields}
+
+
+@pytest.fixture
+def company():
+    return {"_id": "c1", "features": build_company_features(PROFILE)}
+
+
+def test_batch_scores_equal_single_scores(company):
+    batch = compute_tender_match_scores(TENDERS, company)
+    assert batch == [compute_tender_match_score(tender, company) for tender in TENDERS]
+
+
+def test_batch_scores_equal_the_pairwise_reference(company):
+    # The reference reads the same derived record (experience years included) the matcher scores against
+    features = company_features(company)
+    assert features["experience_years"] > 0
+
+    batch = compute_tender_match_scores(TENDERS, company)
+    assert batch == [_reference_score(tender, features) for tender in TENDERS]
+
+
+def test_expected_outcomes(company):
+    empty, strict_met, strict_failed, partial = compute_tender_match_scores(TENDERS, company)
+
+    assert empty["matching_score"] == 100.0 and empty["eligible"]
+    assert strict_met["missing_fields"] == []
+    assert set(strict_failed["missing_fields"]) == {
+        "experience", "financial_requirements", "blacklisting_or_litigation", "certifications", "other_criteria"
+    }
+    assert not strict_failed["eligible"]
+    assert "required_documents" in partial["missing_fields"]
+
+
+def test_raw_profile_without_features_is_scored():
+    raw = {"_id": "c2", "pan": True, "gstin": False, "experience_years": 4, "annual_turnover": 0}
+    result = compute_tender_match_score({"gstin": {"required": True}, "experience": {"required": True, "minimum_years": 3}}, raw)
+    assert result["missing_fields"] == ["gstin"]
@@ -17,5 +17,38 @@ db.filtered_tenders.createIndex({ "location": "text" });
 db.filtered_tenders.createIndex({ "title": "text", "scope_of_work": "text" });
 db.filtered_tenders.createIndex({ "deadline": 1 });
 db.filtered_tenders.createIndex({ "estimated_budget": 1 });
+db.filtered_tenders.createIndex({ "deadline_at": 1 });
+db.filtered_tenders.createIndex({ "business_category": 1, "deadline_at": 1 });
+db.filtered_tenders.createIndex({ "eligibility_status": 1 });
+db.filtered_tenders.createIndex({ "last_updated": 1 });
+db.filtered_tenders.createIndex({ "created_at": 1 });
+db.companies.createIndex({ "updated_at": 1 });
+
+// Category vocabulary and precomputed keyword x category similarity
+db.category_vocabulary.createIndex({ "term": 1 }, { unique: true });
+db.category_similarity.createIndex({ "keyword": 1, "category": 1 }, { unique: true });
+db.category_similarity.createIndex({ "keyword": 1, "score": -1 });
+db.category_similarity.createIndex({ "category": 1, "score": -1 });
+
+// Filter results cache; entries expire after a week
+db.filter_cache.createIndex({ "company_id": 1 });
+db.filter_cache.createIndex({ "created_at": 1 }, { expireAfterSeconds: 604800 });
+
+// Materialized (company, tender) match results; legacy cached results have no
+// tender_id and would collide on the unique index, so they are dropped first
+db.matches.deleteMany({ "tender_id": { $exists: false } });
+db.matches.createIndex({ "company_id": 1, "tender_id": 1 }, { unique: true });
+db.matches.createIndex({ "company_id": 1, "matching_score": -1 });
+db.matches.createIndex({ "tender_id": 1 });
+
+// Background job queue
+db.jobs.createIndex({ "user_id": 1, "created_at": -1 });
+db.jobs.createIndex({ "status": 1, "heartbeat_at": 1 });
+db.jobs.createIndex({ "kind": 1, "company_id": 1, "status": 1 });
+
+// Checkpointed batch matching runs and their work units
+db.match_run_units.createIndex({ "run_id": 1, "unit": 1 }, { unique: true });
+db.match_run_units.createIndex({ "run_id": 1, "status": 1, "lease_until": 1 });
+db.match_runs.createIndex({ "status": 1, "high_water_mark": -1 });
 
 print('Database initialized successfully');
\ No newline at end of file